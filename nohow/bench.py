@@ -0,0 +1,188 @@
+"""Offline benchmarks replaying recorded LLM traffic.
+
+Record a session with `record_llm: ~/nohow-session.jsonl` in `.nohow.yml`,
+then run for instance:
+
+    python -m nohow.bench ~/nohow-session.jsonl --timing none
+    python -m nohow.bench ~/nohow-session.jsonl --timing scaled --speed 4 --only render
+
+Three stages are measured, each over every recorded reply:
+
+- stream:  ChatSession.stream_assistant over the replay backend
+- render:  appending the streamed chunks to a Markdown widget, as the
+           chapter and chat views do
+- persist: saving the replies to a scratch SQLite database
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+from langchain_core.messages import convert_to_messages
+from sqlalchemy import create_engine
+
+from nohow.llm.replay import Recording, ReplayChatModel, load_recordings
+from nohow.llm.telemetry import percentile
+
+STAGES = ("stream", "render", "persist")
+
+
+@dataclass(slots=True)
+class BenchResult:
+    stage: str
+    total: float  # seconds
+    samples: List[float]  # seconds per measured operation
+    unit: str
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "stage": self.stage,
+            "total_s": round(self.total, 4),
+            "count": len(self.samples),
+            "unit": self.unit,
+            "p50_ms": _ms(percentile(self.samples, 50)),
+            "p99_ms": _ms(percentile(self.samples, 99)),
+            "max_ms": _ms(max(self.samples) if self.samples else None),
+        }
+
+
+def _ms(value: float | None) -> float | None:
+    return None if value is None else round(value * 1000, 3)
+
+
+def _replay_model(path: Path, timing: str, speed: float) -> ReplayChatModel:
+    return ReplayChatModel(path=str(path), timing=timing, speed=speed)
+
+
+async def bench_stream(path: Path, timing: str, speed: float) -> BenchResult:
+    """Time between chunks as seen by the chat UI, through ChatSession."""
+    from nohow.prompts.chat_gen import ChatSession
+
+    llm = _replay_model(path, timing, speed)
+    samples: List[float] = []
+    start = time.perf_counter()
+    for recording in load_recordings(path):
+        session = ChatSession(
+            llm=llm,
+            conversation=convert_to_messages(
+                [(m["type"], m["content"]) for m in recording.messages]
+            ),
+        )
+        last = time.perf_counter()
+        async for _ in session.stream_assistant():
+            now = time.perf_counter()
+            samples.append(now - last)
+            last = now
+    return BenchResult("stream", time.perf_counter() - start, samples, "chunk")
+
+
+async def bench_render(path: Path, timing: str, speed: float) -> BenchResult:
+    """Cost of `Markdown.append` per streamed chunk, in a headless app."""
+    from textual.app import App, ComposeResult
+    from textual.widgets import Markdown
+
+    recordings = load_recordings(path)
+    llm = _replay_model(path, timing, speed)
+
+    class RenderApp(App):
+        def compose(self) -> ComposeResult:
+            yield Markdown("")
+
+    samples: List[float] = []
+    app = RenderApp()
+    start = time.perf_counter()
+    async with app.run_test(size=(120, 40)):
+        md = app.query_one(Markdown)
+        for recording in recordings:
+            await md.update("")
+            messages = convert_to_messages(
+                [(m["type"], m["content"]) for m in recording.messages]
+            )
+            async for chunk in llm.astream(messages):
+                if not chunk.content:
+                    continue
+                t0 = time.perf_counter()
+                await md.append(str(chunk.content))
+                samples.append(time.perf_counter() - t0)
+    return BenchResult("render", time.perf_counter() - start, samples, "append")
+
+
+async def bench_persist(path: Path, timing: str, speed: float) -> BenchResult:
+    """Saving each reply as a chapter and as a growing conversation."""
+    from nohow.db.models import (
+        Book,
+        create_conversation,
+        save_chapter_content,
+        update_convo_content,
+    )
+    from nohow.db.utils import get_session, setup_database
+
+    recordings = load_recordings(path)
+    samples: List[float] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        setup_database(db_url=db_url)
+
+        class _App:
+            def get_db(self):
+                return create_engine(db_url)
+
+        app = _App()
+        with get_session(app.get_db()) as session:
+            book = Book(title="bench", toc="")
+            session.add(book)
+            session.commit()
+            book_id = book.id
+        convo = create_conversation(app, book_id, "1")
+        history: List[Dict[str, str]] = []
+
+        start = time.perf_counter()
+        for idx, recording in enumerate(recordings):
+            history.append({"role": "assistant", "content": recording.text})
+            t0 = time.perf_counter()
+            save_chapter_content(app, book_id, str(idx + 1), recording.text)
+            update_convo_content(app, convo.id, json.dumps(history))
+            samples.append(time.perf_counter() - t0)
+        total = time.perf_counter() - start
+    return BenchResult("persist", total, samples, "reply")
+
+
+BENCHES: Dict[str, Callable[[Path, str, float], object]] = {
+    "stream": bench_stream,
+    "render": bench_render,
+    "persist": bench_persist,
+}
+
+
+def run_benchmarks(
+    path: Path, stages: Sequence[str] = STAGES, timing: str = "none", speed: float = 1.0
+) -> List[BenchResult]:
+    return [asyncio.run(BENCHES[stage](path, timing, speed)) for stage in stages]
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recordings", type=Path, help="JSONL file from record_llm")
+    parser.add_argument(
+        "--timing", choices=("original", "scaled", "none"), default="none"
+    )
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--only", choices=STAGES, action="append")
+    args = parser.parse_args()
+
+    for result in run_benchmarks(
+        args.recordings, args.only or STAGES, args.timing, args.speed
+    ):
+        print(json.dumps(result.to_dict()))
+
+
+if __name__ == "__main__":
+    main()
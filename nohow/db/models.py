@@ -1,7 +1,22 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text
+import json
+import time
+from typing import TYPE_CHECKING, List, Sequence
+
+from sqlalchemy import (
+    Column,
+    Float,
+    ForeignKey,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    func,
+)
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
+if TYPE_CHECKING:
+    from nohow.llm.telemetry import LLMCallRecord
 
 
 Base = declarative_base()
@@ -14,6 +29,15 @@ class Book(Base):
     title = Column(String, nullable=False)
     toc = Column(Text, nullable=True)
     toc_tree = Column(Text, nullable=True)
+    # unix timestamp of the last change, orders the book list
+    updated_at = Column(
+        Float,
+        nullable=False,
+        default=time.time,
+        onupdate=time.time,
+        server_default="0",
+        index=True,
+    )
     chapter_contents = relationship(
         "Chapter",
         cascade="all, delete-orphan",
@@ -22,6 +46,22 @@ class Book(Base):
         "Convo",
         cascade="all, delete-orphan",
     )
+    quiz_items = relationship(
+        "QuizItem",
+        cascade="all, delete-orphan",
+    )
+    chapter_chunks = relationship(
+        "ChapterChunk",
+        cascade="all, delete-orphan",
+    )
+    source_documents = relationship(
+        "SourceDocument",
+        cascade="all, delete-orphan",
+    )
+    chapter_summaries = relationship(
+        "ChapterSummary",
+        cascade="all, delete-orphan",
+    )
 
     def get_toc_extract(self, min_line: int, max_line: int) -> str:
         if self.toc:
@@ -54,6 +94,116 @@ class Convo(Base):
     book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
 
 
+class QuizItem(Base):
+    """A generated MCQ of a chapter, reused across quiz sessions."""
+
+    __tablename__ = "quiz_items"
+
+    id = Column(Integer, primary_key=True)
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=False, index=True)
+    toc_address = Column(String, nullable=False, index=True)
+    content_hash = Column(String, nullable=False)  # of the chapter it is about
+    content = Column(Text, nullable=False)  # MCQGen as JSON
+    user_answers = Column(Text, nullable=True)  # last answer, JSON list of indices
+    times_asked = Column(Integer, nullable=False, default=0)
+    times_correct = Column(Integer, nullable=False, default=0)
+
+
+class ChapterSummary(Base):
+    """Short summary and key terms of a chapter, see nohow.prompts.summary."""
+
+    __tablename__ = "chapter_summaries"
+
+    id = Column(Integer, primary_key=True)
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=False, index=True)
+    toc_address = Column(String, nullable=False)
+    content_hash = Column(String, nullable=False)  # of the summarized chapter
+    summary = Column(Text, nullable=False)
+    key_terms = Column(Text, nullable=False, default="[]")  # JSON list
+    model = Column(String, nullable=True)
+
+
+class ChapterChunk(Base):
+    """A chunk of a chapter and its embedding, see nohow.retrieval."""
+
+    __tablename__ = "chapter_chunks"
+
+    id = Column(Integer, primary_key=True)
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=False, index=True)
+    toc_address = Column(String, nullable=False)
+    embedder = Column(String, nullable=False)  # vector space of `vector`
+    content_hash = Column(String, nullable=False)  # of the whole chapter
+    chunk_index = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    vector = Column(LargeBinary, nullable=False)  # float32 array bytes
+
+
+class SourceDocument(Base):
+    """A text file attached to a book to ground its chapters."""
+
+    __tablename__ = "source_documents"
+
+    id = Column(Integer, primary_key=True)
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=False, index=True)
+    path = Column(String, nullable=False)
+    size = Column(Integer, nullable=False, default=0)  # when last indexed
+    mtime = Column(Float, nullable=False, default=0.0)  # when last indexed
+    passage_count = Column(Integer, nullable=False, default=0)
+    passages = relationship(
+        "SourcePassage",
+        cascade="all, delete-orphan",
+    )
+
+
+class SourcePassage(Base):
+    __tablename__ = "source_passages"
+
+    id = Column(Integer, primary_key=True)
+    document_id = Column(
+        Integer, ForeignKey("source_documents.id"), nullable=False, index=True
+    )
+    book_id = Column(Integer, nullable=False, index=True)
+    position = Column(Integer, nullable=False)  # order in the document
+    text = Column(Text, nullable=False)
+    length = Column(Integer, nullable=False)  # number of indexed terms
+
+
+class SourcePosting(Base):
+    """Inverted index entry: a term occurring in a source passage."""
+
+    __tablename__ = "source_postings"
+    # clustered on (book_id, term): a query term is one contiguous range
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    book_id = Column(Integer, primary_key=True)
+    term = Column(String, primary_key=True)
+    passage_id = Column(
+        Integer, ForeignKey("source_passages.id"), primary_key=True, index=True
+    )
+    tf = Column(Integer, nullable=False)  # term frequency in the passage
+    passage_length = Column(Integer, nullable=False)  # for BM25 normalization
+
+
+class LLMCall(Base):
+    """Telemetry of one LLM request (see nohow.llm.telemetry)."""
+
+    __tablename__ = "llm_calls"
+
+    id = Column(Integer, primary_key=True)
+    started_at = Column(Float, nullable=False, index=True)  # unix timestamp
+    request_kind = Column(String, nullable=False)  # chapter, chat, mcq, ...
+    model = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # ok, error, cancelled
+    duration = Column(Float, nullable=False)  # seconds
+    ttft = Column(Float, nullable=True)  # seconds to first token
+    chunk_count = Column(Integer, nullable=False, default=0)
+    output_tokens_per_sec = Column(Float, nullable=True)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    cached_tokens = Column(Integer, nullable=False, default=0)
+    cost = Column(Float, nullable=True)  # USD, when the model price is known
+
+
 def update_convo_content(app, convo_id: int, new_content: str) -> None:
     from nohow.db.utils import get_session
 
@@ -64,9 +214,9 @@ def update_convo_content(app, convo_id: int, new_content: str) -> None:
         session.commit()
 
 
-
 def create_conversation(app, book_id: int, toc_address: str) -> Convo:
     from nohow.db.utils import get_session
+
     with get_session(app.get_db()) as session:
         new_convo = Convo(
             content="",
@@ -76,4 +226,332 @@ def create_conversation(app, book_id: int, toc_address: str) -> Convo:
         session.add(new_convo)
         session.commit()
         session.refresh(new_convo)
-    return new_convo
\ No newline at end of file
+    return new_convo
+
+
+def save_chapter_content(app, book_id: int, toc_address: str, content: str) -> Chapter:
+    """Create or update the chapter stored at `toc_address` of a book."""
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        # find if chapter already exists
+        chapter = (
+            session.query(Chapter)
+            .filter_by(toc_address=toc_address, book_id=book_id)
+            .one_or_none()
+        )
+        if chapter:
+            chapter.content = content
+        else:
+            chapter = Chapter(content=content, toc_address=toc_address, book_id=book_id)
+            session.add(chapter)
+        session.commit()
+        session.refresh(chapter)
+    return chapter
+
+
+def load_chapter_content(app, book_id: int, toc_address: str) -> str:
+    """Content of the chapter at `toc_address`, "" when not generated yet."""
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        content = (
+            session.query(Chapter.content)
+            .filter_by(book_id=book_id, toc_address=toc_address)
+            .scalar()
+        )
+    return content or ""
+
+
+def load_convo_content(app, convo_id: int) -> str:
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        content = session.query(Convo.content).filter_by(id=convo_id).scalar()
+    return content or ""
+
+
+def list_conversations(app, book_id: int) -> List[tuple[int, str]]:
+    """(id, toc address) of the conversations of a book, without their content."""
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        return [
+            (convo_id, str(toc_address))
+            for convo_id, toc_address in session.query(Convo.id, Convo.toc_address)
+            .filter_by(book_id=book_id)
+            .order_by(Convo.id)
+        ]
+
+
+def book_list_version(app) -> tuple[int, float]:
+    """(number of books, latest `updated_at`): changes whenever the list does."""
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        count, latest = session.query(
+            func.count(Book.id), func.max(Book.updated_at)
+        ).one()
+    return int(count), float(latest or 0.0)
+
+
+def list_book_titles(
+    app, updated_since: float | None = None
+) -> List[tuple[int, str, float]]:
+    """(id, title, updated_at) of the books, most recently updated first.
+
+    Without their TOC; `updated_since` keeps the books changed since then.
+    """
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        query = session.query(Book.id, Book.title, Book.updated_at)
+        if updated_since is not None:
+            query = query.filter(Book.updated_at >= updated_since)
+        return [
+            (book_id, str(title), float(updated_at))
+            for book_id, title, updated_at in query.order_by(
+                Book.updated_at.desc(), Book.id.desc()
+            )
+        ]
+
+
+def load_book_chapters(app, book_id: int) -> List[Chapter]:
+    """All generated chapters of a book."""
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        return session.query(Chapter).filter_by(book_id=book_id).all()
+
+
+def load_chapter_summaries(app, book_id: int) -> List[ChapterSummary]:
+    """Stored chapter summaries of a book."""
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        return session.query(ChapterSummary).filter_by(book_id=book_id).all()
+
+
+def load_chapter_summary(app, book_id: int, toc_address: str) -> ChapterSummary | None:
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        return (
+            session.query(ChapterSummary)
+            .filter_by(book_id=book_id, toc_address=toc_address)
+            .one_or_none()
+        )
+
+
+def save_chapter_summary(
+    app,
+    book_id: int,
+    toc_address: str,
+    content_hash: str,
+    summary: str,
+    key_terms: List[str],
+    model: str = "",
+) -> ChapterSummary:
+    """Create or replace the summary of the chapter at `toc_address`."""
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        row = (
+            session.query(ChapterSummary)
+            .filter_by(book_id=book_id, toc_address=toc_address)
+            .one_or_none()
+        )
+        if row is None:
+            row = ChapterSummary(book_id=book_id, toc_address=toc_address)
+            session.add(row)
+        row.content_hash = content_hash
+        row.summary = summary
+        row.key_terms = json.dumps(key_terms)
+        row.model = model
+        session.commit()
+        session.refresh(row)
+    return row
+
+
+def load_quiz_pool(
+    app, book_id: int, toc_address: str, content_hash: str
+) -> List[QuizItem]:
+    """Stored quiz items of a chapter, least asked first.
+
+    Items about another content of the chapter (it was generated again)
+    are deleted.
+    """
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        items = session.query(QuizItem).filter_by(
+            book_id=book_id, toc_address=toc_address
+        )
+        stale = items.filter(QuizItem.content_hash != content_hash)
+        if stale.delete(synchronize_session=False):
+            session.commit()
+        return items.order_by(QuizItem.times_asked, QuizItem.id).all()
+
+
+def add_quiz_item(
+    app, book_id: int, toc_address: str, content_hash: str, content: str
+) -> QuizItem:
+    """Store a generated MCQ (serialized MCQGen) in the chapter pool.
+
+    `content_hash` is the hash of the chapter content it was generated from.
+    """
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        item = QuizItem(
+            book_id=book_id,
+            toc_address=toc_address,
+            content_hash=content_hash,
+            content=content,
+            times_asked=0,
+            times_correct=0,
+        )
+        session.add(item)
+        session.commit()
+        session.refresh(item)
+    return item
+
+
+def record_quiz_answers(app, answers: Sequence[tuple[int, List[int], bool]]) -> None:
+    """Store (quiz_item_id, chosen indices, is_correct) answers of a session."""
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        for item_id, chosen, correct in answers:
+            item = session.query(QuizItem).filter_by(id=item_id).one()
+            item.user_answers = json.dumps(chosen)
+            item.times_asked = (item.times_asked or 0) + 1
+            item.times_correct = (item.times_correct or 0) + int(correct)
+        session.commit()
+
+
+def record_llm_call(app, record: "LLMCallRecord") -> None:
+    """Store the telemetry of a finished LLM request."""
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        session.add(
+            LLMCall(
+                started_at=record.started_at,
+                request_kind=record.request_kind,
+                model=record.model,
+                status=record.status,
+                duration=record.duration,
+                ttft=record.ttft,
+                chunk_count=record.chunk_count,
+                output_tokens_per_sec=record.output_tokens_per_sec,
+                prompt_tokens=record.prompt_tokens,
+                completion_tokens=record.completion_tokens,
+                cached_tokens=record.cached_tokens,
+                cost=record.cost,
+            )
+        )
+        session.commit()
+
+
+def load_llm_calls(app, since: float = 0.0) -> List["LLMCallRecord"]:
+    """Telemetry records of the LLM requests started after `since`."""
+    from nohow.db.utils import get_session
+    from nohow.llm.telemetry import LLMCallRecord
+
+    with get_session(app.get_db()) as session:
+        rows = (
+            session.query(LLMCall)
+            .filter(LLMCall.started_at >= since)
+            .order_by(LLMCall.started_at)
+            .all()
+        )
+        return [
+            LLMCallRecord(
+                request_kind=row.request_kind,
+                model=row.model,
+                status=row.status,
+                started_at=row.started_at,
+                duration=row.duration,
+                ttft=row.ttft,
+                chunk_count=row.chunk_count,
+                prompt_tokens=row.prompt_tokens,
+                completion_tokens=row.completion_tokens,
+                cached_tokens=row.cached_tokens,
+                cost=row.cost,
+            )
+            for row in rows
+        ]
+
+
+def replace_chapter_chunks(
+    app,
+    book_id: int,
+    toc_address: str,
+    embedder: str,
+    chapter_hash: str,
+    chunks: Sequence[str],
+    vectors: Sequence[bytes],
+) -> None:
+    """Store the chunks (and their vectors) of a chapter, dropping the old ones."""
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        session.query(ChapterChunk).filter_by(
+            book_id=book_id, toc_address=toc_address, embedder=embedder
+        ).delete()
+        session.add_all(
+            ChapterChunk(
+                book_id=book_id,
+                toc_address=toc_address,
+                embedder=embedder,
+                content_hash=chapter_hash,
+                chunk_index=idx,
+                text=text,
+                vector=vector,
+            )
+            for idx, (text, vector) in enumerate(zip(chunks, vectors))
+        )
+        session.commit()
+
+
+def load_chapter_chunks(app, book_id: int, embedder: str) -> List[ChapterChunk]:
+    """Stored chunks of a book for one embedder, grouped by chapter."""
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        return (
+            session.query(ChapterChunk)
+            .filter_by(book_id=book_id, embedder=embedder)
+            .order_by(ChapterChunk.toc_address, ChapterChunk.chunk_index)
+            .all()
+        )
+
+
+def list_source_documents(app, book_id: int) -> List[SourceDocument]:
+    """Source documents attached to a book."""
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        return (
+            session.query(SourceDocument)
+            .filter_by(book_id=book_id)
+            .order_by(SourceDocument.id)
+            .all()
+        )
+
+
+def delete_source_document(app, document_id: int) -> None:
+    """Detach a source document and drop its passages from the index."""
+    from nohow.db.utils import get_session
+
+    with get_session(app.get_db()) as session:
+        passage_ids = session.query(SourcePassage.id).filter_by(
+            document_id=document_id
+        )
+        session.query(SourcePosting).filter(
+            SourcePosting.passage_id.in_(passage_ids.scalar_subquery())
+        ).delete(synchronize_session=False)
+        session.query(SourcePassage).filter_by(document_id=document_id).delete()
+        session.query(SourceDocument).filter_by(id=document_id).delete()
+        session.commit()
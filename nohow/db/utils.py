@@ -1,13 +1,51 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateColumn
 from .models import Base
 
 def setup_database(db_url='sqlite:///local.db'):
     """Set up the database and create tables."""
     engine = create_engine(db_url)
     Base.metadata.create_all(engine)
+    add_missing_columns(engine)
     return engine
 
+# Columns added to a table that older databases already have, by table.
+# create_all only creates missing tables. SQLite can only add a column
+# that is not UNIQUE nor a PRIMARY KEY, and has a server_default when it
+# is NOT NULL.
+MIGRATED_COLUMNS = {
+    "books": ["updated_at"],
+}
+
+def add_missing_columns(engine, migrated=MIGRATED_COLUMNS):
+    """Add the migrated columns (and their indexes) missing from a database."""
+    inspector = inspect(engine)
+    tables = Base.metadata.tables
+    with engine.begin() as connection:
+        for table_name, names in migrated.items():
+            table = tables[table_name]
+            columns = {c["name"] for c in inspector.get_columns(table_name)}
+            for name in names:
+                if name in columns:
+                    continue
+                column = table.columns[name]
+                if column.primary_key or column.unique or (
+                    not column.nullable and column.server_default is None
+                ):
+                    raise ValueError(
+                        f"Cannot add {table_name}.{name} to an existing database: "
+                        "it must be nullable or have a server_default, "
+                        "and not be unique or a primary key"
+                    )
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {ddl}")
+            indexes = {i["name"] for i in inspector.get_indexes(table_name)}
+            for index in table.indexes:
+                migrated_index = {c.name for c in index.columns} <= set(names)
+                if migrated_index and index.name not in indexes:
+                    index.create(connection)
+
 def get_session(engine):
     """Get a new session for interacting with the database."""
     Session = sessionmaker(bind=engine)
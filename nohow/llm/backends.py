@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+
+
+@dataclass(frozen=True)
+class LLMSpec:
+    """Everything needed to build a chat model client for a backend."""
+
+    backend: str = "openai"
+    model_name: str = "gpt-3.5-turbo"
+    api_key: str = ""
+    base_url: str = ""
+    temperature: float = 0.7
+    max_tokens: Optional[int] = None
+    options: Dict[str, Any] = field(default_factory=dict, hash=False, compare=False)
+
+    def cache_key(self) -> str:
+        """A stable key identifying the client this spec builds."""
+        return json.dumps(
+            [
+                self.backend,
+                self.model_name,
+                self.api_key,
+                self.base_url,
+                self.temperature,
+                self.max_tokens,
+                self.options,
+            ],
+            sort_keys=True,
+            default=str,
+        )
+
+
+BackendFactory = Callable[[LLMSpec, List[BaseCallbackHandler]], BaseChatModel]
+
+_BACKENDS: Dict[str, BackendFactory] = {}
+
+
+def register_backend(name: str) -> Callable[[BackendFactory], BackendFactory]:
+    """Register a factory building a chat model for the `backend:` config value."""
+
+    def decorator(factory: BackendFactory) -> BackendFactory:
+        _BACKENDS[name] = factory
+        return factory
+
+    return decorator
+
+
+def available_backends() -> List[str]:
+    return sorted(_BACKENDS)
+
+
+def create_llm(
+    spec: LLMSpec, callbacks: Optional[List[BaseCallbackHandler]] = None
+) -> BaseChatModel:
+    """Build the chat model described by `spec`."""
+    try:
+        factory = _BACKENDS[spec.backend]
+    except KeyError:
+        raise ValueError(
+            f"Unknown LLM backend {spec.backend!r}, "
+            f"expected one of: {', '.join(available_backends())}"
+        ) from None
+    return factory(spec, list(callbacks or []))
+
+
+@register_backend("openai")
+def _openai_backend(
+    spec: LLMSpec, callbacks: List[BaseCallbackHandler]
+) -> BaseChatModel:
+    """OpenAI, or any OpenAI-compatible endpoint when `base_url` is set."""
+    from langchain_openai import ChatOpenAI
+
+    kwargs: Dict[str, Any] = dict(spec.options)
+    if spec.base_url:
+        kwargs["base_url"] = spec.base_url
+    if spec.max_tokens:
+        kwargs["max_tokens"] = spec.max_tokens
+    return ChatOpenAI(
+        model=spec.model_name,
+        temperature=spec.temperature,
+        api_key=spec.api_key or None,  # None falls back to env var OPENAI_API_KEY
+        stream_usage=True,  # usage (incl. cached tokens) on streamed replies
+        callbacks=callbacks,
+        **kwargs,
+    )
+
+
+@register_backend("fake")
+def _fake_backend(spec: LLMSpec, callbacks: List[BaseCallbackHandler]) -> BaseChatModel:
+    """Local deterministic stand-in, see `nohow.llm.fake`."""
+    from nohow.llm.fake import FakeStreamingChatModel
+
+    return FakeStreamingChatModel(
+        model_name=spec.model_name or "fake",
+        callbacks=callbacks,
+        **spec.options,
+    )
+
+
+@register_backend("replay")
+def _replay_backend(
+    spec: LLMSpec, callbacks: List[BaseCallbackHandler]
+) -> BaseChatModel:
+    """Serves the replies recorded with `record_llm:`, see `nohow.llm.replay`."""
+    from nohow.llm.replay import ReplayChatModel
+
+    options = dict(spec.options)
+    if "path" not in options:
+        raise ValueError("The replay backend needs backend_options.path")
+    return ReplayChatModel(
+        model_name=spec.model_name or "replay",
+        callbacks=callbacks,
+        **options,
+    )
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+DEFAULT_FAKE_TEXT = """This is a locally generated stand-in answer.
+
+It is produced by the **fake** backend so the application can run without a
+network connection or an API key. The text streams at a fixed rate:
+
+- tokens arrive one word at a time
+- the first token is delayed to mimic the provider latency
+- the content is always the same for the same request
+
+```python
+def hello() -> str:
+    return "world"
+```
+
+Switch `backend` back to `openai` in `.nohow.yml` to use a real model.
+"""
+
+_TOKEN_RE = re.compile(r"\s*\S+|\s+")
+
+
+def split_tokens(text: str) -> List[str]:
+    """Split text into word-ish tokens, whitespace kept with the following word."""
+    return _TOKEN_RE.findall(text)
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """Deterministic chat model streaming canned text at a configurable rate.
+
+    Configured from `.nohow.yml`:
+
+        backend: fake
+        backend_options:
+          text: "..."            # reply text (default: a short markdown answer)
+          responses: ["...", ...] # or replies used in turn, cycling
+          tokens_per_sec: 40     # output rate, 0 for no delay
+          ttft: 0.5              # seconds before the first token
+    """
+
+    model_name: str = "fake"
+    text: str = DEFAULT_FAKE_TEXT
+    responses: List[str] = []
+    tokens_per_sec: float = 40.0
+    ttft: float = 0.3
+
+    _calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"model_name": self.model_name}
+
+    def _next_text(self) -> str:
+        if self.responses:
+            text = self.responses[self._calls % len(self.responses)]
+        else:
+            text = self.text
+        self._calls += 1
+        return text
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    @staticmethod
+    def _usage(messages: List[BaseMessage], tokens: List[str]) -> dict[str, int]:
+        prompt_tokens = sum(len(split_tokens(str(m.content))) for m in messages)
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = self._next_text()
+        tokens = split_tokens(text)
+        time.sleep(self.ttft + self._token_delay() * len(tokens))
+        message = AIMessage(
+            content=text,
+            usage_metadata=self._usage(messages, tokens),
+            response_metadata={"model_name": self.model_name},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = self._next_text()
+        tokens = split_tokens(text)
+        await asyncio.sleep(self.ttft + self._token_delay() * len(tokens))
+        message = AIMessage(
+            content=text,
+            usage_metadata=self._usage(messages, tokens),
+            response_metadata={"model_name": self.model_name},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        tokens = split_tokens(self._next_text())
+        time.sleep(self.ttft)
+        for token in tokens:
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+            time.sleep(self._token_delay())
+        yield self._final_chunk(messages, tokens)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = split_tokens(self._next_text())
+        await asyncio.sleep(self.ttft)
+        for token in tokens:
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(self._token_delay())
+        yield self._final_chunk(messages, tokens)
+
+    def _final_chunk(
+        self, messages: List[BaseMessage], tokens: List[str]
+    ) -> ChatGenerationChunk:
+        """Empty chunk carrying usage, like OpenAI's `stream_usage` chunk."""
+        return ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="",
+                usage_metadata=self._usage(messages, tokens),
+                response_metadata={"model_name": self.model_name},
+            )
+        )
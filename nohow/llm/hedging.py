@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Optional, TypeVar
+
+from nohow.utils import ConfigSection
+
+T = TypeVar("T")
+
+
+class StreamTimeoutError(TimeoutError):
+    """Raised when a stream misses its time-to-first-token or inter-token deadline."""
+
+
+@dataclass(frozen=True, slots=True)
+class StreamPolicy(ConfigSection):
+    """Deadlines and retry settings for streamed LLM requests.
+
+    - ttft_timeout: seconds to wait for the first token before sending a
+      hedged duplicate request (None disables the deadline)
+    - inter_token_timeout: seconds allowed between two tokens once the stream
+      started (None disables the deadline)
+    - max_hedges: how many duplicate requests may be sent for one stream
+    - max_retries: how many times a failed request is retried before its
+      first token arrived
+    - backoff_base / backoff_max: exponential backoff (with full jitter)
+      between retries, in seconds
+    """
+
+    ttft_timeout: Optional[float] = 20.0
+    inter_token_timeout: Optional[float] = 60.0
+    max_hedges: int = 1
+    max_retries: int = 2
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+
+    def backoff(self, retry: int) -> float:
+        """Delay before retry number `retry` (1-based)."""
+        cap = min(self.backoff_max, self.backoff_base * (2 ** (retry - 1)))
+        return random.uniform(0, cap)
+
+
+_EMPTY = object()
+
+
+async def _first_item(iterator: AsyncIterator[T]) -> Any:
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return _EMPTY
+
+
+async def _discard(task: asyncio.Task, iterator: AsyncIterator[Any]) -> None:
+    """Cancel an attempt and close its stream (and the underlying connection)."""
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    aclose = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception:
+            pass
+
+
+async def _race_first_item(
+    factory: Callable[[], AsyncIterator[T]], policy: StreamPolicy
+) -> tuple[AsyncIterator[T], Any]:
+    """Start attempts until one yields its first item, return it with its stream."""
+    attempts: Dict[asyncio.Task, AsyncIterator[T]] = {}
+    hedges = 0
+    retries = 0
+
+    def launch() -> None:
+        iterator = aiter(factory())
+        attempts[asyncio.ensure_future(_first_item(iterator))] = iterator
+
+    launch()
+    try:
+        while True:
+            done, _ = await asyncio.wait(
+                attempts,
+                timeout=policy.ttft_timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                if hedges >= policy.max_hedges:
+                    raise StreamTimeoutError(
+                        f"No token received after {policy.ttft_timeout}s "
+                        f"({hedges + 1} requests)"
+                    )
+                hedges += 1
+                launch()
+                continue
+
+            error: BaseException | None = None
+            for task in done:
+                iterator = attempts.pop(task)
+                exc = task.exception()
+                if exc is None:
+                    return iterator, task.result()
+                error = exc
+            if attempts:
+                # a hedge is still running, let it have its chance
+                continue
+            assert error is not None
+            if retries >= policy.max_retries:
+                raise error
+            retries += 1
+            await asyncio.sleep(policy.backoff(retries))
+            launch()
+    finally:
+        for task, iterator in attempts.items():
+            await _discard(task, iterator)
+
+
+async def hedged_astream(
+    factory: Callable[[], AsyncIterator[T]], policy: Optional[StreamPolicy] = None
+) -> AsyncIterator[T]:
+    """Stream from `factory()` with deadlines, hedging and retries.
+
+    `factory` must start a new, independent request each time it is called.
+    While no token has arrived, a missed time-to-first-token deadline sends a
+    duplicate request; the first request to produce a token wins and the
+    others are cancelled. Requests failing before their first token are
+    retried with exponential backoff. Once tokens flow, a missed inter-token
+    deadline raises `StreamTimeoutError` (the partial output was already
+    handed to the caller, so the request is not replayed).
+    """
+    policy = policy or StreamPolicy()
+    iterator, first = await _race_first_item(factory, policy)
+    try:
+        if first is _EMPTY:
+            return
+        yield first
+        while True:
+            try:
+                item = await asyncio.wait_for(
+                    iterator.__anext__(), timeout=policy.inter_token_timeout
+                )
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise StreamTimeoutError(
+                    f"Stream stalled: no token for {policy.inter_token_timeout}s"
+                ) from None
+            yield item
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    BaseCallbackHandler,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import (
+    ChatGeneration,
+    ChatGenerationChunk,
+    ChatResult,
+    LLMResult,
+)
+
+from nohow.llm.telemetry import REQUEST_KIND_KEY
+from nohow.llm.usage import usage_from_llm_result
+
+RECORDING_VERSION = 1
+
+TIMING_MODES = ("original", "scaled", "none")
+
+
+def serialize_messages(messages: List[BaseMessage]) -> List[Dict[str, Any]]:
+    return [{"type": m.type, "content": m.content} for m in messages]
+
+
+def request_key(messages: List[Dict[str, Any]]) -> str:
+    """Hash identifying a request by its messages (serialized form)."""
+    payload = json.dumps(messages, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+@dataclass(slots=True)
+class Recording:
+    """One recorded LLM call: its request and its chunks with their timing.
+
+    Each chunk is `(delay, text)`, the delay being the seconds elapsed since
+    the previous chunk (since the request for the first one, i.e. the TTFT).
+    """
+
+    messages: List[Dict[str, Any]]
+    chunks: List[Tuple[float, str]]
+    model: str = ""
+    request_kind: str = "other"
+    status: str = "ok"
+    duration: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    recorded_at: float = 0.0
+    key: str = ""
+
+    def __post_init__(self) -> None:
+        if not self.key:
+            self.key = request_key(self.messages)
+
+    @property
+    def text(self) -> str:
+        return "".join(text for _, text in self.chunks)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "version": RECORDING_VERSION,
+                "recorded_at": self.recorded_at,
+                "model": self.model,
+                "request_kind": self.request_kind,
+                "status": self.status,
+                "key": self.key,
+                "messages": self.messages,
+                "chunks": [[round(delay, 6), text] for delay, text in self.chunks],
+                "duration": round(self.duration, 6),
+                "usage": {
+                    "prompt_tokens": self.prompt_tokens,
+                    "completion_tokens": self.completion_tokens,
+                    "cached_tokens": self.cached_tokens,
+                },
+            },
+            ensure_ascii=False,
+        )
+
+    @classmethod
+    def from_json(cls, line: str) -> "Recording":
+        data = json.loads(line)
+        usage = data.get("usage") or {}
+        return cls(
+            messages=data["messages"],
+            chunks=[(float(delay), text) for delay, text in data["chunks"]],
+            model=data.get("model", ""),
+            request_kind=data.get("request_kind", "other"),
+            status=data.get("status", "ok"),
+            duration=float(data.get("duration", 0.0)),
+            prompt_tokens=int(usage.get("prompt_tokens", 0)),
+            completion_tokens=int(usage.get("completion_tokens", 0)),
+            cached_tokens=int(usage.get("cached_tokens", 0)),
+            recorded_at=float(data.get("recorded_at", 0.0)),
+            key=data.get("key", ""),
+        )
+
+
+def load_recordings(path: Path | str) -> List[Recording]:
+    """Read a JSONL recording file, skipping blank lines."""
+    with open(Path(path).expanduser(), "r", encoding="utf-8") as f:
+        return [Recording.from_json(line) for line in f if line.strip()]
+
+
+@dataclass(slots=True)
+class _PendingRun:
+    messages: List[Dict[str, Any]]
+    model: str
+    request_kind: str
+    started: float
+    last_chunk: float
+    chunks: List[Tuple[float, str]] = field(default_factory=list)
+
+
+class StreamRecorder(BaseCallbackHandler):
+    """Appends every chat model call, with its streamed chunks and their
+    timing, to a JSONL file that the `replay` backend can serve back.
+
+    Enabled with `record_llm: path/to/file.jsonl` in `.nohow.yml`.
+    """
+
+    run_inline = True  # chunk timestamps must be taken on the streaming task
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path).expanduser()
+        self._runs: Dict[UUID, _PendingRun] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[BaseMessage]],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        metadata = metadata or {}
+        params = kwargs.get("invocation_params") or {}
+        now = time.perf_counter()
+        self._runs[run_id] = _PendingRun(
+            messages=serialize_messages(messages[0] if messages else []),
+            model=str(params.get("model") or params.get("model_name") or ""),
+            request_kind=str(metadata.get(REQUEST_KIND_KEY) or "other"),
+            started=now,
+            last_chunk=now,
+        )
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.get(run_id)
+        if run is None or not token:
+            return
+        now = time.perf_counter()
+        run.chunks.append((now - run.last_chunk, token))
+        run.last_chunk = now
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.get(run_id)
+        if run is not None and not run.chunks:
+            # not streamed: keep the whole reply as one chunk
+            text = response.generations[0][0].text if response.generations else ""
+            run.chunks.append((time.perf_counter() - run.started, text))
+        self._write(run_id, "ok", *usage_from_llm_result(response))
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        status = "cancelled" if isinstance(error, asyncio.CancelledError) else "error"
+        self._write(run_id, status, 0, 0, 0)
+
+    def _write(
+        self,
+        run_id: UUID,
+        status: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int,
+    ) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        duration = time.perf_counter() - run.started
+        recording = Recording(
+            messages=run.messages,
+            chunks=run.chunks,
+            model=run.model,
+            request_kind=run.request_kind,
+            status=status,
+            duration=duration,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+            recorded_at=time.time() - duration,
+        )
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(recording.to_json() + "\n")
+
+
+class ReplayChatModel(BaseChatModel):
+    """Chat model serving the replies of a `StreamRecorder` file.
+
+    A request is answered with a recording of the same messages (in turn,
+    when recorded several times); unknown requests get the recordings in
+    file order, unless `strict` is set. Configured from `.nohow.yml`:
+
+        backend: replay
+        backend_options:
+          path: ~/nohow-session.jsonl
+          timing: original   # original, scaled (by `speed`) or none
+          speed: 2.0         # with timing: scaled, replay twice as fast
+          strict: false      # raise on requests missing from the file
+    """
+
+    model_name: str = "replay"
+    path: str
+    timing: str = "original"
+    speed: float = 1.0
+    strict: bool = False
+
+    _by_key: Dict[str, Deque[Recording]] = {}
+    _in_order: Deque[Recording] = deque()
+
+    def model_post_init(self, context: Any) -> None:
+        if self.timing not in TIMING_MODES:
+            raise ValueError(
+                f"Unknown replay timing {self.timing!r}, expected one of: "
+                f"{', '.join(TIMING_MODES)}"
+            )
+        recordings = [r for r in load_recordings(self.path) if r.status == "ok"]
+        if not recordings:
+            raise ValueError(f"No successful recordings in {self.path}")
+        self._by_key = {}
+        for recording in recordings:
+            self._by_key.setdefault(recording.key, deque()).append(recording)
+        self._in_order = deque(recordings)
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"model_name": self.model_name, "path": self.path}
+
+    def _pick(self, messages: List[BaseMessage]) -> Recording:
+        candidates = self._by_key.get(request_key(serialize_messages(messages)))
+        if candidates is None:
+            if self.strict:
+                raise KeyError("request not found in the replay recordings")
+            candidates = self._in_order
+        recording = candidates[0]
+        candidates.rotate(-1)
+        return recording
+
+    def _delay(self, seconds: float) -> float:
+        if self.timing == "none":
+            return 0.0
+        if self.timing == "scaled" and self.speed > 0:
+            return seconds / self.speed
+        return seconds
+
+    @staticmethod
+    def _usage(recording: Recording) -> dict[str, Any]:
+        return {
+            "input_tokens": recording.prompt_tokens,
+            "output_tokens": recording.completion_tokens,
+            "total_tokens": recording.prompt_tokens + recording.completion_tokens,
+            "input_token_details": {"cache_read": recording.cached_tokens},
+        }
+
+    def _result(self, recording: Recording) -> ChatResult:
+        message = AIMessage(
+            content=recording.text,
+            usage_metadata=self._usage(recording),
+            response_metadata={"model_name": recording.model or self.model_name},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _final_chunk(self, recording: Recording) -> ChatGenerationChunk:
+        return ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="",
+                usage_metadata=self._usage(recording),
+                response_metadata={"model_name": recording.model or self.model_name},
+            )
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        recording = self._pick(messages)
+        time.sleep(self._delay(sum(delay for delay, _ in recording.chunks)))
+        return self._result(recording)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        recording = self._pick(messages)
+        await asyncio.sleep(self._delay(sum(delay for delay, _ in recording.chunks)))
+        return self._result(recording)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        recording = self._pick(messages)
+        for delay, text in recording.chunks:
+            time.sleep(self._delay(delay))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+        yield self._final_chunk(recording)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        recording = self._pick(messages)
+        for delay, text in recording.chunks:
+            await asyncio.sleep(self._delay(delay))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+        yield self._final_chunk(recording)
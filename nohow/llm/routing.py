@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from dataclasses import replace
+from typing import Any, Dict, List, Mapping, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+
+from nohow.llm.backends import LLMSpec, create_llm
+
+# request kinds that can be routed, see `request_config`
+TASK_KINDS = ("chapter", "chat", "mcq", "summary")
+
+_ROUTE_FIELDS = ("backend", "model_name", "base_url", "temperature", "max_tokens")
+
+
+def parse_routes(
+    config: Optional[Mapping[str, Any]], errors: Optional[List[str]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """Validate the `routes:` section of `.nohow.yml`.
+
+        routes:
+          mcq: {model_name: gpt-5-nano, temperature: 0.3, max_tokens: 2000}
+          summary: {model_name: gpt-5-nano}
+
+    Each route overrides the top-level model settings for one task kind;
+    `options` entries are merged into `backend_options`.
+
+    An invalid route raises `ValueError`, unless `errors` is given: then
+    the message is appended to it and the route is skipped, so that kind
+    uses the default model.
+    """
+    routes: Dict[str, Dict[str, Any]] = {}
+    for kind, values in (config or {}).items():
+        try:
+            routes[kind] = _parse_route(kind, values)
+        except ValueError as e:
+            if errors is None:
+                raise
+            errors.append(str(e))
+    return routes
+
+
+def _parse_route(kind: str, values: Any) -> Dict[str, Any]:
+    if kind not in TASK_KINDS:
+        raise ValueError(
+            f"Unknown route {kind!r}, expected one of: {', '.join(TASK_KINDS)}"
+        )
+    if values is not None and not isinstance(values, Mapping):
+        raise ValueError(f"Route {kind!r} must be a mapping of settings")
+    values = dict(values or {})
+    if "model" in values:  # accept the provider's spelling too
+        values["model_name"] = values.pop("model")
+    unknown = set(values) - set(_ROUTE_FIELDS) - {"options"}
+    if unknown:
+        raise ValueError(
+            f"Unknown setting(s) {', '.join(sorted(unknown))} in route {kind!r}"
+        )
+    return values
+
+
+class LLMRouter:
+    """Chat model per task kind, built from the default spec and the routes.
+
+    Clients are cached by spec, so kinds resolving to the same settings
+    share one client (and its connection pool). Invalid routes don't stop
+    the app: they are skipped and listed in `errors`.
+    """
+
+    def __init__(
+        self,
+        default: LLMSpec,
+        routes: Optional[Mapping[str, Any]] = None,
+        callbacks: Optional[List[BaseCallbackHandler]] = None,
+    ) -> None:
+        self.default = default
+        self.errors: List[str] = []
+        self.routes = parse_routes(routes, self.errors)
+        self.callbacks = list(callbacks or [])
+        self._clients: Dict[str, BaseChatModel] = {}
+
+    def spec_for(self, kind: str) -> LLMSpec:
+        route = self.routes.get(kind)
+        if not route:
+            return self.default
+        overrides = {k: v for k, v in route.items() if k in _ROUTE_FIELDS}
+        spec = replace(self.default, **overrides)
+        if route.get("options"):
+            spec = replace(spec, options={**self.default.options, **route["options"]})
+        return spec
+
+    def llm_for(self, kind: str) -> BaseChatModel:
+        """The (cached) chat model serving requests of `kind`."""
+        spec = self.spec_for(kind)
+        key = spec.cache_key()
+        client = self._clients.get(key)
+        if client is None:
+            client = create_llm(spec, callbacks=self.callbacks)
+            self._clients[key] = client
+        return client
+
+    @property
+    def default_llm(self) -> BaseChatModel:
+        return self.llm_for("default")
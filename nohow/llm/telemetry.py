@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+
+from nohow.llm.usage import usage_from_llm_result
+
+# metadata key telling the telemetry which feature issued the request
+REQUEST_KIND_KEY = "request_kind"
+
+
+def request_config(kind: str) -> RunnableConfig:
+    """Runnable config tagging every LLM call of a run with its request kind."""
+    return {"metadata": {REQUEST_KIND_KEY: kind}, "tags": [kind]}
+
+
+@dataclass(slots=True)
+class LLMCallRecord:
+    """Measurements of one chat model call."""
+
+    request_kind: str
+    model: str
+    status: str  # "ok", "error" or "cancelled"
+    started_at: float
+    duration: float
+    ttft: Optional[float]
+    chunk_count: int
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    cost: Optional[float] = None
+
+    @property
+    def output_tokens_per_sec(self) -> Optional[float]:
+        """Output rate once streaming started (whole call when not streamed)."""
+        generating = self.duration - (self.ttft or 0.0)
+        tokens = self.completion_tokens or self.chunk_count
+        if generating <= 0 or not tokens:
+            return None
+        return tokens / generating
+
+
+@dataclass(slots=True)
+class _RunState:
+    started: float
+    request_kind: str
+    model: str
+    first_token: Optional[float] = None
+    chunks: int = 0
+
+
+@dataclass(slots=True)
+class ModelPrice:
+    """USD prices per million tokens."""
+
+    input: float = 0.0
+    output: float = 0.0
+    cached_input: Optional[float] = None
+
+    def cost(self, prompt_tokens: int, completion_tokens: int, cached: int) -> float:
+        cached_price = self.input if self.cached_input is None else self.cached_input
+        return (
+            (prompt_tokens - cached) * self.input
+            + cached * cached_price
+            + completion_tokens * self.output
+        ) / 1_000_000
+
+
+def prices_from_config(
+    config: Optional[Dict[str, Dict[str, float]]],
+) -> Dict[str, ModelPrice]:
+    """Parse the `pricing:` section of `.nohow.yml` ({model: {input, output, cached_input}})."""
+    return {
+        model: ModelPrice(
+            **{
+                k: v
+                for k, v in (values or {}).items()
+                if k in ("input", "output", "cached_input")
+            }
+        )
+        for model, values in (config or {}).items()
+    }
+
+
+class TelemetryCallback(BaseCallbackHandler):
+    """Times every chat model call and hands an `LLMCallRecord` to `sink`.
+
+    The request kind comes from the run metadata (see `request_config`).
+    Until a sink is set, records are only kept in `recent`.
+    """
+
+    run_inline = True  # timestamps must be taken on the streaming task
+
+    def __init__(
+        self,
+        sink: Optional[Callable[[LLMCallRecord], None]] = None,
+        prices: Optional[Dict[str, ModelPrice]] = None,
+        keep_recent: int = 100,
+    ) -> None:
+        self.sink = sink
+        self.prices: Dict[str, ModelPrice] = prices or {}
+        self.recent: List[LLMCallRecord] = []
+        self._keep_recent = keep_recent
+        self._runs: Dict[UUID, _RunState] = {}
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        tags: Optional[List[str]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        metadata = metadata or {}
+        params = kwargs.get("invocation_params") or {}
+        model = (
+            params.get("model")
+            or params.get("model_name")
+            or metadata.get("ls_model_name")
+            or "unknown"
+        )
+        self._runs[run_id] = _RunState(
+            started=time.perf_counter(),
+            request_kind=str(metadata.get(REQUEST_KIND_KEY) or "other"),
+            model=str(model),
+        )
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        state = self._runs.get(run_id)
+        if state is None or not token:
+            return
+        if state.first_token is None:
+            state.first_token = time.perf_counter()
+        state.chunks += 1
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        prompt_tokens, completion_tokens, cached_tokens = usage_from_llm_result(
+            response
+        )
+        self._finish(run_id, "ok", prompt_tokens, completion_tokens, cached_tokens)
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        status = "cancelled" if isinstance(error, asyncio.CancelledError) else "error"
+        self._finish(run_id, status, 0, 0, 0)
+
+    def _finish(
+        self,
+        run_id: UUID,
+        status: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int,
+    ) -> None:
+        state = self._runs.pop(run_id, None)
+        if state is None:
+            return
+        now = time.perf_counter()
+        price = self.prices.get(state.model)
+        record = LLMCallRecord(
+            request_kind=state.request_kind,
+            model=state.model,
+            status=status,
+            started_at=time.time() - (now - state.started),
+            duration=now - state.started,
+            ttft=(
+                None if state.first_token is None else state.first_token - state.started
+            ),
+            chunk_count=state.chunks,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+            cost=(
+                price.cost(prompt_tokens, completion_tokens, cached_tokens)
+                if price
+                else None
+            ),
+        )
+        self.recent.append(record)
+        del self.recent[: -self._keep_recent]
+        if self.sink is not None:
+            self.sink(record)
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100) of `values`, None when empty."""
+    data = sorted(v for v in values if v is not None)
+    if not data:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(data)))
+    return data[rank - 1]
+
+
+@dataclass(slots=True)
+class TelemetrySummary:
+    """Percentiles of the calls sharing a model or a request kind."""
+
+    group: str
+    count: int
+    errors: int
+    ttft: Dict[int, Optional[float]] = field(default_factory=dict)
+    duration: Dict[int, Optional[float]] = field(default_factory=dict)
+    tokens_per_sec: Dict[int, Optional[float]] = field(default_factory=dict)
+    avg_prompt_tokens: float = 0.0
+    avg_completion_tokens: float = 0.0
+    total_cost: Optional[float] = None
+
+
+def summarize(
+    records: Sequence[LLMCallRecord],
+    key: Callable[[LLMCallRecord], str],
+    quantiles: Sequence[int] = (50, 90, 99),
+) -> List[TelemetrySummary]:
+    """Group records with `key` and compute latency percentiles per group."""
+    groups: Dict[str, List[LLMCallRecord]] = {}
+    for record in records:
+        groups.setdefault(key(record), []).append(record)
+
+    summaries = []
+    for group, items in sorted(groups.items()):
+        ok = [r for r in items if r.status == "ok"]
+        costs = [r.cost for r in ok if r.cost is not None]
+        summaries.append(
+            TelemetrySummary(
+                group=group,
+                count=len(items),
+                errors=len(items) - len(ok),
+                ttft={q: percentile([r.ttft for r in ok], q) for q in quantiles},
+                duration={
+                    q: percentile([r.duration for r in ok], q) for q in quantiles
+                },
+                tokens_per_sec={
+                    q: percentile([r.output_tokens_per_sec for r in ok], q)
+                    for q in quantiles
+                },
+                avg_prompt_tokens=(
+                    sum(r.prompt_tokens for r in ok) / len(ok) if ok else 0.0
+                ),
+                avg_completion_tokens=(
+                    sum(r.completion_tokens for r in ok) / len(ok) if ok else 0.0
+                ),
+                total_cost=sum(costs) if costs else None,
+            )
+        )
+    return summaries
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Mapping, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+
+def extract_token_usage(usage: Optional[Mapping[str, Any]]) -> tuple[int, int, int]:
+    """Return (prompt_tokens, completion_tokens, cached_prompt_tokens).
+
+    Accepts either LangChain `usage_metadata` (input_tokens/output_tokens with
+    `input_token_details.cache_read`) or a raw OpenAI `token_usage` dict
+    (prompt_tokens/completion_tokens with `prompt_tokens_details.cached_tokens`).
+    Missing values count as 0.
+    """
+    if not usage:
+        return 0, 0, 0
+    if "input_tokens" in usage or "output_tokens" in usage:
+        details = usage.get("input_token_details") or {}
+        return (
+            int(usage.get("input_tokens") or 0),
+            int(usage.get("output_tokens") or 0),
+            int(details.get("cache_read") or 0),
+        )
+    details = usage.get("prompt_tokens_details") or {}
+    return (
+        int(usage.get("prompt_tokens") or 0),
+        int(usage.get("completion_tokens") or 0),
+        int(details.get("cached_tokens") or 0),
+    )
+
+
+def usage_from_llm_result(response: LLMResult) -> tuple[int, int, int]:
+    """Find the token usage of a finished chat model run."""
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            usage = getattr(message, "usage_metadata", None)
+            if usage:
+                return extract_token_usage(usage)
+    llm_output = response.llm_output or {}
+    return extract_token_usage(llm_output.get("token_usage"))
+
+
+@dataclass(slots=True)
+class PromptCacheStats:
+    """Running totals of prompt tokens served from the provider prefix cache."""
+
+    requests: int = 0
+    requests_with_hits: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    last_prompt_tokens: int = 0
+    last_cached_tokens: int = 0
+
+    def record(self, prompt_tokens: int, cached_tokens: int) -> None:
+        self.requests += 1
+        if cached_tokens:
+            self.requests_with_hits += 1
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached_tokens
+        self.last_prompt_tokens = prompt_tokens
+        self.last_cached_tokens = cached_tokens
+
+    @property
+    def hit_ratio(self) -> float:
+        """Share of prompt tokens that were read from the cache (0..1)."""
+        if not self.prompt_tokens:
+            return 0.0
+        return self.cached_tokens / self.prompt_tokens
+
+    def summary(self) -> str:
+        return (
+            f"{self.cached_tokens}/{self.prompt_tokens} prompt tokens cached "
+            f"({self.hit_ratio:.0%}), {self.requests_with_hits}/{self.requests} requests hit"
+        )
+
+
+class PromptCacheCallback(BaseCallbackHandler):
+    """Records cached prompt token counts reported in the response metadata."""
+
+    def __init__(self, stats: PromptCacheStats) -> None:
+        self.stats = stats
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        prompt_tokens, _, cached_tokens = usage_from_llm_result(response)
+        if prompt_tokens or cached_tokens:
+            self.stats.record(prompt_tokens, cached_tokens)
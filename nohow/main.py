@@ -4,9 +4,18 @@ import yaml
 from pathlib import Path
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
 
 from nohow.db.utils import setup_database
+from nohow.llm.backends import LLMSpec
+from nohow.llm.hedging import StreamPolicy
+from nohow.llm.replay import StreamRecorder
+from nohow.llm.routing import LLMRouter
+from nohow.retrieval.service import ChapterRetrieval, RetrievalConfig
+from nohow.retrieval.sources import SourceLibrary, SourcesConfig
+from nohow.llm.telemetry import TelemetryCallback, prices_from_config
+from nohow.llm.usage import PromptCacheCallback, PromptCacheStats
+from nohow.db.models import record_llm_call
 from nohow.prompts.utils import (
     new_message_of_type,
 )  # noqua, this force slow import early
@@ -19,10 +28,48 @@ from nohow.textual_comp.screens.config import ConfigScreen
 from nohow.textual_comp.screens.tocedit import TOCEditScreen
 from nohow.textual_comp.screens.tocreader import TOCReaderScreen
 from nohow.textual_comp.screens.booklist import BookListScreen
+from nohow.textual_comp.screens.stats import StatsScreen
+from nohow.textual_comp.widgets.chapter_render import ChapterRenderCache
+from nohow.textual_comp.widgets.chat_streams import ChatStreams
+from nohow.textual_comp.widgets.panes import ReaderConfig
 
 DEFAULT_CONFIG = {
     "model_name": "gpt-3.5-turbo",
     "aiprovider_key": "",
+    # "openai" (also any OpenAI-compatible endpoint through base_url) or "fake"
+    "backend": "openai",
+    "base_url": "",
+    # extra keyword arguments for the backend, e.g. the fake backend's
+    # text / tokens_per_sec / ttft
+    "backend_options": {},
+    # deadlines / hedging / retries for streamed replies, see StreamPolicy
+    "streaming": {},
+    # USD per million tokens, used for the cost column of the stats screen:
+    # {model_name: {input: 0.25, output: 2.0, cached_input: 0.025}}
+    "pricing": {},
+    # JSONL file receiving every LLM request and its timed chunks, for replay
+    "record_llm": "",
+    # per task kind (chapter, chat, mcq, summary) overrides of the model
+    # settings, e.g. {mcq: {model_name: gpt-5-nano, max_tokens: 2000}}
+    "routes": {},
+    # chat grounding on the other chapters of the book, see RetrievalConfig:
+    # {enabled: true, embedder: hashing, top_k: 4, chunk_words: 200}
+    "retrieval": {},
+    # grounding of chapter generation on the source documents attached to a
+    # book, see SourcesConfig: {token_budget: 1500, top_k: 8}
+    "sources": {},
+    # generation of all the chapters of a book (ctrl+g in the reader), see
+    # BookPlanConfig: {max_concurrency: 4, chapter_length: 1000}
+    "book_plan": {},
+    # chapter and chat panes kept mounted by the reader, the least recently
+    # viewed ones are unmounted, and the rendered chapters cached in memory
+    # and in <config dir>/render_cache (chapters of virtualize_from characters
+    # or more are only rendered as they are scrolled); chat replies of
+    # different conversations stream concurrently, max_streams at a time,
+    # see ReaderConfig:
+    # {live_panes: 8, render_cache: 32, render_cache_on_disk: true,
+    #  virtualize_from: 30000, max_streams: 3}
+    "reader": {},
 }
 
 
@@ -32,14 +79,85 @@ class AppContext:
     def __init__(self) -> None:
         self.model_name: str | None = None
         self.aiprovider_key: str | None = None
-        self.llm: ChatOpenAI | None = None
+        self.backend: str = "openai"
+        self.base_url: str = ""
+        self.backend_options: dict = {}
+        self.streaming: dict = {}
+        self.pricing: dict = {}
+        self.record_llm: str = ""
+        self.routes: dict = {}
+        self.llm: BaseChatModel | None = None
+        self.router: LLMRouter | None = None
+        self.retrieval: dict = {}
+        self._chapter_retrieval: ChapterRetrieval | None = None
+        self.sources: dict = {}
+        self._source_library: SourceLibrary | None = None
+        self.book_plan: dict = {}
+        self.reader: dict = {}
+        self.prompt_cache_stats = PromptCacheStats()
+        self.telemetry = TelemetryCallback()
+
+    def llm_spec(self) -> LLMSpec:
+        """Describe the configured chat model."""
+        return LLMSpec(
+            backend=self.backend,
+            model_name=self.model_name or "",
+            api_key=self.aiprovider_key or "",
+            base_url=self.base_url or "",
+            temperature=0.7,
+            options=dict(self.backend_options or {}),
+        )
+
+    @property
+    def stream_policy(self) -> StreamPolicy:
+        """Deadlines and retries applied to streamed replies."""
+        return StreamPolicy.from_config(self.streaming)
+
+    def build_llm(self) -> BaseChatModel:
+        """Create the chat models from the current configuration.
+
+        Returns the default model; the models of the routed task kinds are
+        created on first use, see `llm_for`.
+        """
+        self.telemetry.prices = prices_from_config(self.pricing)
+        callbacks = [PromptCacheCallback(self.prompt_cache_stats), self.telemetry]
+        if self.record_llm:
+            callbacks.append(StreamRecorder(self.record_llm))
+        self.router = LLMRouter(self.llm_spec(), self.routes, callbacks=callbacks)
+        return self.router.default_llm
+
+    def llm_for(self, kind: str) -> BaseChatModel:
+        """The chat model configured for a task kind (chapter, chat, mcq, summary)."""
+        if self.router is None:
+            self.llm = self.build_llm()
+        assert self.router is not None
+        return self.router.llm_for(kind)
+
+    @property
+    def chapter_retrieval(self) -> ChapterRetrieval | None:
+        """The chapter vector indexes, None when retrieval is disabled."""
+        config = RetrievalConfig.from_config(self.retrieval)
+        if not config.enabled:
+            return None
+        if self._chapter_retrieval is None or self._chapter_retrieval.config != config:
+            self._chapter_retrieval = ChapterRetrieval(config)
+        return self._chapter_retrieval
+
+    @property
+    def source_library(self) -> SourceLibrary:
+        """Search over the source documents attached to the books.
+
+        One library is shared, so documents attached from several workers
+        are indexed one at a time.
+        """
+        config = SourcesConfig.from_config(self.sources)
+        if self._source_library is None or self._source_library.config != config:
+            self._source_library = SourceLibrary(config)
+        return self._source_library
 
     def to_yaml(self, path: Path) -> None:
         """Save application context to a yaml file."""
-        config = {
-            "model_name": self.model_name,
-            "aiprovider_key": self.aiprovider_key,
-        }
+        config = {key: getattr(self, key) for key in DEFAULT_CONFIG}
         with open(str(path), "w", encoding="utf-8") as f:
             yaml.safe_dump(config, f)
 
@@ -57,9 +175,7 @@ class AppContext:
         c = cls()
         for key, value in config.items():
             setattr(c, key, value)
-        c.llm = ChatOpenAI(
-            model=c.model_name, temperature=0.7, api_key=c.aiprovider_key
-        )  # uses env var OPENAI_API_KEY
+        c.llm = c.build_llm()
         return c
 
 
@@ -68,6 +184,7 @@ class NohowApp(App):
 
     BINDINGS = [
         ("ctrl+o", "show_config", "Config"),
+        ("ctrl+t", "show_stats", "LLM Stats"),
         ("j", "app.focus_next", "Focus Next"),
         ("k", "app.focus_previous", "Focus Previous"),
     ]
@@ -83,14 +200,19 @@ class NohowApp(App):
                 yaml.safe_dump(DEFAULT_CONFIG, f)
 
         self.db_path = cfg_dir / "nohow.db"
-        if not self.db_path.exists():
-            # create empty db file
-            setup_database(db_url=f"sqlite:///{self.db_path}")
+        # creates the db file, or the tables missing from an older db
+        setup_database(db_url=f"sqlite:///{self.db_path}")
 
         self.app_context = context or AppContext.from_yaml(yaml_config)
+        self.app_context.telemetry.sink = lambda record: record_llm_call(self, record)
         self.yaml_config_path = yaml_config
+        reader_config = ReaderConfig.from_config(self.app_context.reader)
+        self.render_cache = ChapterRenderCache.from_config(
+            reader_config, cfg_dir / "render_cache"
+        )
         self.db_path = self.db_path
         super().__init__()
+        self.chat_streams = ChatStreams.from_config(self, reader_config)
 
     def get_db(self):
         db_url = f"sqlite:///{self.db_path}"  # str(self.db_path)
@@ -99,11 +221,20 @@ class NohowApp(App):
 
     def on_mount(self) -> None:
         self.push_screen(BookListScreen())
+        router = self.app_context.router
+        for error in router.errors if router else []:
+            self.notify(
+                f"{error}; using the default model", title="Invalid route", severity="error"
+            )
 
     def action_show_config(self) -> None:
         """Show the configuration screen."""
         self.push_screen(ConfigScreen())
 
+    def action_show_stats(self) -> None:
+        """Show the LLM latency statistics screen."""
+        self.push_screen(StatsScreen())
+
 
 def get_nohow_dir() -> Path:
 
@@ -171,6 +171,21 @@ class TocTreeNode:
     def conversation_key(self) -> str:
         return ".".join(str(i) for i in self.index)
 
+    def path_to(self, index: Sequence[int]) -> List["TocTreeNode"]:
+        """Nodes from this one down to the node at `index`, [] if not found."""
+        if list(self.index) == list(index):
+            return [self]
+        for c in self.children:
+            path = c.path_to(index)
+            if path:
+                return [self] + path
+        return []
+
+    def titles_to(self, index: Sequence[int]) -> List[str]:
+        """Titles from the node at `index` up to this one, without the ROOT."""
+        # the level 0 node is the synthetic ROOT of the tree
+        return [n.title for n in reversed(self.path_to(index)) if n.level > 0]
+
     def flatten_preorder(self) -> List[tuple[int, str, int, int]]:
         return [(n.level, n.title, n.start_line, n.end_line) for n in self.preorder()]
 
@@ -0,0 +1,383 @@
+"""Dependency-ordered generation of every chapter of a book.
+
+A chapter is written with the summaries of its parent chapter and of its
+preceding siblings in the prompt, so it can only start once those are
+written and summarized. These dependencies form a DAG over the TOC; the
+chapters are generated concurrently as soon as their dependencies are done,
+longest remaining chain first.
+
+The critical path (longest dependency chain) bounds the speedup over
+generating the chapters one by one: N chapters never take less than the
+time of the critical path.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import time
+from dataclasses import dataclass, field, replace
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from nohow.llm.hedging import hedged_astream
+from nohow.llm.telemetry import request_config
+from nohow.mkdutils import TocTreeNode
+from nohow.prompts.chap_gen import ChapterInputs, build_chain
+from nohow.prompts.summary import (
+    ChapterSummaryGen,
+    format_chapter_summaries,
+    refresh_chapter_summary,
+    summary_from_row,
+)
+from nohow.retrieval.index import content_hash
+from nohow.utils import ConfigSection
+
+
+@dataclass(frozen=True, slots=True)
+class BookPlanConfig(ConfigSection):
+    """The `book_plan:` section of `.nohow.yml`."""
+
+    max_concurrency: int = 4  # chapters generated at the same time
+    chapter_length: int = 1000  # words per generated chapter
+
+
+@dataclass(frozen=True, slots=True)
+class PlanNode:
+    address: str  # toc address, see TocTreeNode.conversation_key
+    node: TocTreeNode
+    depends_on: Tuple[str, ...]  # parent first, then the preceding siblings
+    titles: Tuple[str, ...]  # chapter title up to the top level chapter
+
+
+@dataclass(frozen=True, slots=True)
+class PlanReport:
+    chapter_count: int
+    critical_path: Tuple[str, ...]  # addresses, first to last
+    max_width: int  # most chapters that can be generated at the same time
+
+    @property
+    def speedup_bound(self) -> float:
+        """Best speedup over sequential generation, for equal chapter times."""
+        if not self.critical_path:
+            return 1.0
+        return self.chapter_count / len(self.critical_path)
+
+    def describe(self) -> str:
+        return (
+            f"{self.chapter_count} chapters, critical path of "
+            f"{len(self.critical_path)} chapters, up to {self.max_width} at once "
+            f"(at most {self.speedup_bound:.1f}x faster than one by one)"
+        )
+
+
+class BookPlan:
+    """DAG of the chapters of a book, in TOC preorder (a topological order)."""
+
+    def __init__(self, nodes: Sequence[PlanNode]) -> None:
+        self.nodes: Dict[str, PlanNode] = {n.address: n for n in nodes}
+        self._dependents: Dict[str, List[str]] = {a: [] for a in self.nodes}
+        for n in nodes:
+            for dep in n.depends_on:
+                self._dependents[dep].append(n.address)
+
+    @classmethod
+    def from_toc(cls, root: TocTreeNode) -> "BookPlan":
+        nodes: List[PlanNode] = []
+
+        def visit(
+            node: TocTreeNode, parent: Optional[str], titles: Tuple[str, ...]
+        ) -> None:
+            preceding: List[str] = []
+            for child in node.children:
+                address = child.conversation_key()
+                child_titles = (child.title,) + titles
+                deps = ([parent] if parent else []) + preceding
+                nodes.append(PlanNode(address, child, tuple(deps), child_titles))
+                visit(child, address, child_titles)
+                preceding.append(address)
+
+        # the level 0 node is the synthetic ROOT of the tree, not a chapter
+        visit(root, None, ())
+        return cls(nodes)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def dependents(self, address: str) -> List[str]:
+        return self._dependents[address]
+
+    def critical_path(
+        self, durations: Optional[Mapping[str, float]] = None
+    ) -> Tuple[List[str], float]:
+        """Longest dependency chain and its length.
+
+        Every chapter counts 1 unless `durations` gives its measured time.
+        """
+        weight = (lambda a: 1.0) if durations is None else durations.get
+        finish: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for address, node in self.nodes.items():
+            before = max(node.depends_on, key=finish.__getitem__, default=None)
+            finish[address] = (finish[before] if before else 0.0) + (
+                weight(address) or 0.0
+            )
+            previous[address] = before
+        end = max(finish, key=finish.__getitem__, default=None)
+        if end is None:
+            return [], 0.0
+        path: List[str] = []
+        address: Optional[str] = end
+        while address is not None:
+            path.append(address)
+            address = previous[address]
+        return path[::-1], finish[end]
+
+    def remaining_chain(self) -> Dict[str, int]:
+        """Chapters on the longest chain starting at each chapter."""
+        rank: Dict[str, int] = {}
+        for address in reversed(self.nodes):
+            rank[address] = 1 + max(
+                (rank[d] for d in self._dependents[address]), default=0
+            )
+        return rank
+
+    def max_width(self) -> int:
+        """Most chapters ready at the same step when chapters take equal time."""
+        depth: Dict[str, int] = {}
+        widths: Dict[int, int] = {}
+        for address, node in self.nodes.items():
+            depth[address] = 1 + max((depth[d] for d in node.depends_on), default=0)
+            widths[depth[address]] = widths.get(depth[address], 0) + 1
+        return max(widths.values(), default=0)
+
+    def report(self) -> PlanReport:
+        path, _ = self.critical_path()
+        return PlanReport(len(self.nodes), tuple(path), self.max_width())
+
+
+@dataclass(slots=True)
+class PlanRun:
+    """Outcome of a plan execution."""
+
+    plan: BookPlan
+    wall_time: float = 0.0  # seconds
+    durations: Dict[str, float] = field(default_factory=dict)
+    failed: Dict[str, str] = field(default_factory=dict)  # address -> error
+    kept: List[str] = field(default_factory=list)  # already written, not generated
+
+    @property
+    def skipped(self) -> List[str]:
+        """Chapters not generated because a dependency failed."""
+        return [
+            a
+            for a in self.plan.nodes
+            if a not in self.durations and a not in self.failed
+        ]
+
+    @property
+    def speedup(self) -> float:
+        """Measured speedup over generating the same chapters one by one."""
+        work = sum(self.durations.values())
+        return work / self.wall_time if self.wall_time > 0 else 1.0
+
+    def describe(self) -> str:
+        path, length = self.plan.critical_path(self.durations)
+        generated = [a for a in self.durations if a not in self.kept]
+        text = (
+            f"{len(generated)} chapters in {self.wall_time:.1f}s "
+            f"({self.speedup:.1f}x faster than one by one); critical path "
+            f"{' > '.join(path)} took {length:.1f}s"
+        )
+        if self.failed:
+            text += f"; {len(self.failed)} failed, {len(self.skipped)} skipped"
+        if self.kept:
+            text += f"; {len(self.kept)} already written"
+        return text
+
+
+async def run_plan(
+    plan: BookPlan,
+    run_node: Callable[[PlanNode], Awaitable[None]],
+    max_concurrency: int = 4,
+) -> PlanRun:
+    """Run `run_node` for every chapter once its dependencies are done.
+
+    Ready chapters start longest remaining chain first. The dependents of a
+    failed chapter are skipped.
+    """
+    rank = plan.remaining_chain()
+    order = {address: i for i, address in enumerate(plan.nodes)}
+    waiting = {a: len(n.depends_on) for a, n in plan.nodes.items()}
+    ready = [(-rank[a], order[a], a) for a, count in waiting.items() if not count]
+    heapq.heapify(ready)
+    running: Dict[asyncio.Task, Tuple[str, float]] = {}
+    result = PlanRun(plan)
+    start = time.perf_counter()
+    try:
+        while ready or running:
+            while ready and len(running) < max(1, max_concurrency):
+                _, _, address = heapq.heappop(ready)
+                task = asyncio.create_task(run_node(plan.nodes[address]))
+                running[task] = (address, time.perf_counter())
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                address, started = running.pop(task)
+                error = task.exception()
+                if error is not None:
+                    result.failed[address] = str(error) or type(error).__name__
+                    continue
+                result.durations[address] = time.perf_counter() - started
+                for dependent in plan.dependents(address):
+                    waiting[dependent] -= 1
+                    if not waiting[dependent]:
+                        heapq.heappush(
+                            ready, (-rank[dependent], order[dependent], dependent)
+                        )
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+    result.wall_time = time.perf_counter() - start
+    return result
+
+
+# called with the address, the content and the summary of each chapter done
+ChapterCallback = Callable[[str, str, Optional[ChapterSummaryGen]], None]
+
+
+class BookGenerator:
+    """Generates, saves, indexes and summarizes the chapters of a book plan.
+
+    Chapters that already have content are kept. They are only summarized
+    when a missing chapter builds on them and their summary is missing or
+    stale (`stale_summaries`).
+    """
+
+    def __init__(
+        self,
+        app,
+        book,
+        plan: BookPlan,
+        chapter_length: int = 1000,
+        on_chapter: Optional[ChapterCallback] = None,
+    ) -> None:
+        from nohow.db.models import load_book_chapters, load_chapter_summaries
+
+        self.app = app
+        self.book = book
+        self.plan = plan
+        self.chapter_length = chapter_length
+        self.on_chapter = on_chapter
+        self.contents: Dict[str, str] = {
+            str(c.toc_address): str(c.content or "")
+            for c in load_book_chapters(app, book.id)
+        }
+        rows = load_chapter_summaries(app, book.id)
+        self.summaries: Dict[str, ChapterSummaryGen] = {
+            str(row.toc_address): summary_from_row(row) for row in rows
+        }
+        # content hash of the chapter each summary was made from
+        self._summarized: Dict[str, str] = {
+            str(row.toc_address): str(row.content_hash) for row in rows
+        }
+        self._to_summarize: Set[str] = set()
+
+    def missing(self) -> List[str]:
+        """Chapters of the plan without content yet."""
+        return [a for a in self.plan.nodes if not self.contents.get(a, "").strip()]
+
+    def stale_summaries(self) -> List[str]:
+        """Written chapters a missing chapter depends on, to summarize first."""
+        missing = set(self.missing())
+        needed = {
+            dep
+            for address in missing
+            for dep in self.plan.nodes[address].depends_on
+            if dep not in missing
+        }
+        return [
+            a
+            for a in self.plan.nodes
+            if a in needed
+            and self._summarized.get(a) != content_hash(self.contents.get(a, ""))
+        ]
+
+    async def run(self, max_concurrency: int = 4) -> PlanRun:
+        kept = [a for a in self.plan.nodes if a not in self.missing()]
+        self._to_summarize = set(self.stale_summaries())
+        result = await run_plan(self.plan, self.run_node, max_concurrency)
+        result.kept = kept
+        return result
+
+    def chapter_inputs(self, plan_node: PlanNode) -> ChapterInputs:
+        node = plan_node.node
+        return ChapterInputs(
+            book_title=str(self.book.title),
+            chapter_title=node.title,
+            book_toc=self.book.get_toc_extract(node.start_line - 1, node.end_line),
+            chapter_length=self.chapter_length,
+            book_outline=str(self.book.toc or ""),
+            prior_chapters=format_chapter_summaries(
+                self.summaries, plan_node.depends_on
+            ),
+        )
+
+    async def run_node(self, plan_node: PlanNode) -> None:
+        from nohow.db.models import save_chapter_content
+
+        context = self.app.app_context
+        address = plan_node.address
+        content = self.contents.get(address, "")
+        if not content.strip():
+            source_passages = await asyncio.to_thread(
+                context.source_library.chapter_material,
+                self.app,
+                self.book.id,
+                list(plan_node.titles),
+            )
+            inputs = replace(
+                self.chapter_inputs(plan_node), source_passages=source_passages
+            )
+            chain = build_chain(context.llm_for("chapter"))
+            parts: List[str] = []
+            async for chunk in hedged_astream(
+                lambda: chain.astream(
+                    inputs.to_dict(), config=request_config("chapter")
+                ),
+                context.stream_policy,
+            ):
+                parts.append(chunk)
+            content = "".join(parts)
+            save_chapter_content(self.app, self.book.id, address, content)
+            self.contents[address] = content
+            retrieval = context.chapter_retrieval
+            if retrieval is not None:
+                await asyncio.to_thread(
+                    retrieval.index_chapter, self.app, self.book.id, address, content
+                )
+        elif address not in self._to_summarize:
+            return  # kept, and no missing chapter needs its summary
+
+        summary = await refresh_chapter_summary(
+            self.app,
+            context.llm_for("summary"),
+            self.book.id,
+            address,
+            str(self.book.title),
+            plan_node.node.title,
+            content,
+        )
+        if summary is not None:
+            self.summaries[address] = summary
+        if self.on_chapter is not None:
+            self.on_chapter(address, content, summary)
@@ -12,10 +12,16 @@ from langchain_core.prompts import (
     HumanMessagePromptTemplate,
 )
 from langchain_core.output_parsers import StrOutputParser
-from typing import AsyncIterator, Dict, Iterator, Optional
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+from contextlib import aclosing
 
 # If you prefer the legacy import paths, keep it modern:
 from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
+
+from nohow.llm.hedging import StreamPolicy, hedged_astream
+from nohow.llm.telemetry import request_config
+from nohow.prompts.json_stream import JsonArrayStreamParser
 
 SYSTEM_TEXT = """You are a highly qualified subject-matter specialist and professional book author.
 
@@ -28,16 +34,26 @@ Follow these rules strictly:
 """
 
 
+# The human message is laid out so that everything that is identical for every
+# chapter of a book (title, full table of contents) comes first and the
+# chapter specific part comes last. Providers cache prompts by prefix, so
+# consecutive chapter generations of the same book reuse the cached prefix.
 PROMPT_TEXT = """You are writing a book titled "{book_title}".
 
-Generate the chapter titled "{chapter_title}" based on the following table of contents:
+The complete table of contents of the book is:
+
+{book_outline}
+
+---
+
+Generate the chapter titled "{chapter_title}" based on the following part of the table of contents:
 
 {book_toc}
 
 Requirements:
 - Cover all relevant points implied by the chapter title and table of contents.
 - Target length: approximately {chapter_length} words.
-
+{prior_chapters}{source_material}
 """
 
 
@@ -47,6 +63,9 @@ class ChapterInputs:
     chapter_title: str
     book_toc: str
     chapter_length: int  # keep it int: less ambiguity than int|str
+    book_outline: str = ""  # full book TOC, shared by every chapter of the book
+    source_passages: str = ""  # excerpts of the book sources for this chapter
+    prior_chapters: str = ""  # summaries of the chapters this one follows
 
     def to_dict(self) -> dict[str, object]:
         return {
@@ -54,25 +73,263 @@ class ChapterInputs:
             "chapter_title": self.chapter_title,
             "book_toc": self.book_toc,
             "chapter_length": self.chapter_length,
+            "book_outline": self.book_outline or self.book_toc,
+            "prior_chapters": (
+                PRIOR_CHAPTERS_TEXT.format(summaries=self.prior_chapters)
+                if self.prior_chapters
+                else ""
+            ),
+            "source_material": (
+                SOURCE_MATERIAL_TEXT.format(passages=self.source_passages)
+                if self.source_passages
+                else ""
+            ),
         }
 
 
+# Appended at the very end of the prompts (chapter specific, so it must not
+# break the shared prefix).
+SOURCE_MATERIAL_TEXT = """
+Source material: excerpts of the documents the book is based on. Rely on them
+for facts, terminology and examples where they are relevant:
+
+{passages}
+"""
+
+# Chapter specific as well, see SOURCE_MATERIAL_TEXT.
+PRIOR_CHAPTERS_TEXT = """
+Already written: summaries of the enclosing chapter and of the chapters just
+before this one. Build on them and do not repeat what they cover:
+
+{summaries}
+"""
+
+# Long chapters are planned first, then their sections are written
+# concurrently. Both prompts share the book prefix of PROMPT_TEXT.
+OUTLINE_PROMPT_TEXT = """You are writing a book titled "{book_title}".
+
+The complete table of contents of the book is:
+
+{book_outline}
+
+---
+
+Plan the chapter titled "{chapter_title}" based on the following part of the table of contents:
+
+{book_toc}
+
+Split the chapter into exactly {section_count} consecutive sections that together cover all relevant points.
+Respond ONLY with a JSON array, one object per section, in reading order:
+[{{"title": "section title", "points": ["key point", "..."]}}]
+{prior_chapters}{source_material}
+"""
+
+SECTION_PROMPT_TEXT = """You are writing a book titled "{book_title}".
+
+The complete table of contents of the book is:
+
+{book_outline}
+
+---
+
+You are writing the chapter titled "{chapter_title}" based on the following part of the table of contents:
+
+{book_toc}
+
+The chapter is made of these sections, written separately:
+
+{section_plan}
+
+Write ONLY section {section_number}: "{section_title}".
+Requirements:
+- Cover these points: {section_points}
+- Do not cover material belonging to the other sections.
+- Start with the section title in bold on its own line.
+- Target length: approximately {section_length} words.
+{prior_chapters}{source_material}
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class SectionPlan:
+    title: str
+    points: tuple[str, ...] = ()
+
+
+def build_prompt() -> ChatPromptTemplate:
+    """Prompt used for chapter generation (stable prefix first, chapter last)."""
+    return ChatPromptTemplate.from_messages(
+        [
+            SystemMessagePromptTemplate.from_template(SYSTEM_TEXT),
+            HumanMessagePromptTemplate.from_template(PROMPT_TEXT),
+        ]
+    )
+
+
 def build_chain(
-    llm: ChatOpenAI,
+    llm: BaseChatModel,
 ) -> Runnable:
     """
     Build and return a runnable chain:
-      inputs (dict) -> formatted prompt -> OpenAI chat model -> string output
+      inputs (dict) -> formatted prompt -> chat model -> string output
     """
 
+    prompt = build_prompt()
+    chain = prompt | llm | StrOutputParser()
+    return chain
+
+
+def _build_chain_for(llm: BaseChatModel, prompt_text: str) -> Runnable:
     prompt = ChatPromptTemplate.from_messages(
         [
             SystemMessagePromptTemplate.from_template(SYSTEM_TEXT),
-            HumanMessagePromptTemplate.from_template(PROMPT_TEXT),
+            HumanMessagePromptTemplate.from_template(prompt_text),
         ]
     )
-    chain = prompt | llm | StrOutputParser()
-    return chain
+    return prompt | llm | StrOutputParser()
+
+
+def parse_section_plan(text: str) -> List[SectionPlan]:
+    """Sections of an outline reply, skipping malformed entries."""
+    sections = []
+    for item in JsonArrayStreamParser().feed(text):
+        if not isinstance(item, dict) or not str(item.get("title", "")).strip():
+            continue
+        points = item.get("points") or []
+        if not isinstance(points, list):
+            points = [points]
+        sections.append(
+            SectionPlan(
+                title=str(item["title"]).strip(),
+                points=tuple(str(p) for p in points),
+            )
+        )
+    return sections
+
+
+async def aplan_sections(
+    llm: BaseChatModel,
+    inputs: ChapterInputs,
+    section_count: int,
+    policy: Optional[StreamPolicy] = None,
+) -> List[SectionPlan]:
+    """Ask the model for a short outline of the chapter.
+
+    The outline is streamed under the same deadlines and hedging as the
+    sections.
+    """
+    chain = _build_chain_for(llm, OUTLINE_PROMPT_TEXT)
+    outline_inputs = {**inputs.to_dict(), "section_count": section_count}
+    stream = hedged_astream(
+        lambda: chain.astream(outline_inputs, config=request_config("chapter")),
+        policy,
+    )
+    async with aclosing(stream) as chunks:
+        text = "".join([chunk async for chunk in chunks])
+    return parse_section_plan(text)
+
+
+async def ordered_merge(
+    factories: List[Callable[[], AsyncIterator[str]]], max_concurrency: int = 4
+) -> AsyncIterator[str]:
+    """Run the streams concurrently but yield their chunks in list order.
+
+    The chunks of the stream being yielded are passed through live; the
+    chunks of later streams are buffered until every earlier stream ended.
+    An error of a stream is raised when its turn comes.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    queues: List[asyncio.Queue] = [asyncio.Queue() for _ in factories]
+    done = object()
+
+    async def run(
+        factory: Callable[[], AsyncIterator[str]], queue: asyncio.Queue
+    ) -> None:
+        try:
+            async with semaphore:
+                async for chunk in factory():
+                    queue.put_nowait(chunk)
+        except Exception as e:
+            queue.put_nowait(e)
+        finally:
+            queue.put_nowait(done)
+
+    tasks = [
+        asyncio.create_task(run(factory, queue))
+        for factory, queue in zip(factories, queues)
+    ]
+    try:
+        for queue in queues:
+            while (item := await queue.get()) is not done:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def astream_chapter_by_sections(
+    llm: BaseChatModel,
+    inputs: ChapterInputs,
+    section_count: int = 4,
+    policy: Optional[StreamPolicy] = None,
+    max_concurrency: int = 4,
+) -> AsyncIterator[str]:
+    """Stream a long chapter written as concurrently generated sections.
+
+    An outline is requested first, then every section is generated by its
+    own request and streamed back in document order. Falls back to a single
+    stream when the outline is unusable.
+    """
+    sections = await aplan_sections(llm, inputs, section_count, policy)
+    if len(sections) < 2:
+        stream = hedged_astream(
+            lambda: build_chain(llm).astream(
+                inputs.to_dict(), config=request_config("chapter")
+            ),
+            policy,
+        )
+        async with aclosing(stream) as chunks:
+            async for chunk in chunks:
+                yield chunk
+        return
+
+    chain = _build_chain_for(llm, SECTION_PROMPT_TEXT)
+    plan = "\n".join(f"{i}. {s.title}" for i, s in enumerate(sections, 1))
+    section_length = max(100, inputs.chapter_length // len(sections))
+
+    def section_stream(number: int, section: SectionPlan):
+        section_inputs = {
+            **inputs.to_dict(),
+            "section_plan": plan,
+            "section_number": number,
+            "section_title": section.title,
+            "section_points": "; ".join(section.points) or section.title,
+            "section_length": section_length,
+        }
+
+        async def stream() -> AsyncIterator[str]:
+            if number > 1:
+                yield "\n\n"
+            chunks = hedged_astream(
+                lambda: chain.astream(section_inputs, config=request_config("chapter")),
+                policy,
+            )
+            async with aclosing(chunks) as parts:
+                async for part in parts:
+                    yield part
+
+        return stream
+
+    merged = ordered_merge(
+        [section_stream(i, s) for i, s in enumerate(sections, 1)],
+        max_concurrency=max_concurrency,
+    )
+    async with aclosing(merged) as chunks:
+        async for chunk in chunks:
+            yield chunk
 
 
 def invoke_chain(
@@ -3,9 +3,15 @@ from langchain.messages import AnyMessage, HumanMessage, AIMessage, SystemMessag
 
 import asyncio
 from dataclasses import dataclass, field
-from typing import AsyncIterator, List, Optional
+from typing import TYPE_CHECKING, AsyncIterator, Callable, List, Optional, Sequence
 
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
+
+from nohow.llm.hedging import StreamPolicy, hedged_astream
+from nohow.llm.telemetry import request_config
+
+if TYPE_CHECKING:
+    from nohow.retrieval.index import RetrievedChunk
 
 
 @dataclass(slots=True)
@@ -17,22 +23,57 @@ class ChatSession:
         and finally appends AIMessage to conversation
     """
 
-    llm: ChatOpenAI
+    llm: BaseChatModel
     conversation: List[AnyMessage] = field(default_factory=list)
+    policy: StreamPolicy = field(default_factory=StreamPolicy)
+    # passages of other chapters relevant to a question, see nohow.retrieval
+    retriever: Optional[Callable[[str], Sequence[RetrievedChunk]]] = None
 
     def append_user(self, text: str) -> None:
         self.conversation.append(HumanMessage(content=text))
 
+    def append_assistant(self, text: str) -> None:
+        """Record an assistant reply, e.g. the kept part of a cancelled stream."""
+        self.conversation.append(AIMessage(content=text))
+
+    async def request_messages(self) -> List[AnyMessage]:
+        """The conversation as sent to the model.
+
+        With a retriever, the passages relevant to the last question are put
+        in front of it for this request only: they are not kept in the
+        conversation, so the prompt does not grow with every retrieval and
+        the earlier messages stay a cacheable prefix.
+        """
+        last = self.conversation[-1] if self.conversation else None
+        if self.retriever is None or not isinstance(last, HumanMessage):
+            return self.conversation
+        question = str(last.content)
+        chunks = await asyncio.to_thread(self.retriever, question)
+        if not chunks:
+            return self.conversation
+        passages = "\n\n".join(f"[{c.toc_address}] {c.text}" for c in chunks)
+        grounded = HumanMessage(
+            content=RETRIEVED_CONTEXT_TEMPLATE.format(
+                passages=passages, question=question
+            )
+        )
+        return [*self.conversation[:-1], grounded]
+
     async def stream_assistant(self) -> AsyncIterator[str]:
         """
         Streams the assistant reply based on current conversation state.
         At the end, appends the completed AIMessage to the conversation.
         """
         parts: list[str] = []
+        messages = await self.request_messages()
 
         # LangChain streaming: yields AIMessageChunk objects (usually),
         # but we only expose strings to the UI.
-        async for chunk in self.llm.astream(self.conversation):
+        stream = hedged_astream(
+            lambda: self.llm.astream(messages, config=request_config("chat")),
+            self.policy,
+        )
+        async for chunk in stream:
             # chunk is typically an AIMessageChunk; robustly extract text:
             text = getattr(chunk, "content", None)
             if not isinstance(text, str):
@@ -70,9 +111,16 @@ class ChatSession:
         return serialized
 
     @staticmethod
-    def create_from_serialized(llm, serialized: List[dict[str, str]]) -> ChatSession:
+    def create_from_serialized(
+        llm,
+        serialized: List[dict[str, str]],
+        policy: Optional[StreamPolicy] = None,
+        retriever: Optional[Callable[[str], Sequence[RetrievedChunk]]] = None,
+    ) -> ChatSession:
         """Create a ChatSession from a serialized list of dicts."""
-        session = ChatSession(llm=llm)
+        session = ChatSession(
+            llm=llm, policy=policy or StreamPolicy(), retriever=retriever
+        )
         session.conversation = ChatSession.unserialize_conversation(serialized)
         return session
 
@@ -95,9 +143,14 @@ class ChatSession:
         return conversation
 
 
-def make_chat_session(llm: ChatOpenAI, chapter_content: str) -> ChatSession:
+def make_chat_session(
+    llm: BaseChatModel,
+    chapter_content: str,
+    policy: Optional[StreamPolicy] = None,
+    retriever: Optional[Callable[[str], Sequence[RetrievedChunk]]] = None,
+) -> ChatSession:
 
-    session = ChatSession(llm=llm)
+    session = ChatSession(llm=llm, policy=policy or StreamPolicy(), retriever=retriever)
 
     # format the Default System message
     formatted_system = DEFAULT_SYSTEM_TEMPLATE.format(chapter_content=chapter_content)
@@ -107,16 +160,27 @@ def make_chat_session(llm: ChatOpenAI, chapter_content: str) -> ChatSession:
 
 
 # --- Example system seed (system + your "prompting style") ---
+# The instructions come first and the chapter last: the system message is the
+# prefix of every request of the conversation, and keeping the static rules in
+# front lets the provider prompt cache share them across chapters too.
 DEFAULT_SYSTEM_TEMPLATE = """You are a helpful assistant.
-You speak naturally in a chat and express yourself in markdown. 
+You speak naturally in a chat and express yourself in markdown.
 
-You are a specialized and qualified book Author and you wrote the following 
-chapter of your book:
+You are a specialized and qualified book Author.
+Your task is to help the user with their requests about the chapter of your book given below.
+Answer user questions, provide explanation and help user understand your chapter content.
 
-{chapter_content}
+Here is the chapter you wrote:
 
-Now your task is to help the user with their requests about this chapter.
-Answer user questions, provide explanation and help user understand your chapter content.
+{chapter_content}
 """
 
+# Wraps the last question of a request when passages were retrieved for it.
+RETRIEVED_CONTEXT_TEMPLATE = """Passages from other chapters of the book that may help with my question:
 
+{passages}
+
+---
+
+{question}
+"""
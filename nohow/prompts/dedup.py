@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import List, Sequence, Set, Tuple
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_NON_WORD_RE = re.compile(r"[^\w]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and keep only words separated by single spaces."""
+    return _NON_WORD_RE.sub(" ", text.lower()).strip()
+
+
+def shingles(text: str, k: int = 5) -> Set[str]:
+    """Character k-shingles of the normalized text.
+
+    Character shingles are robust to small rewordings ("an" vs "one", plural
+    forms), which is what near-duplicate questions usually differ by.
+    """
+    norm = normalize_text(text)
+    if len(norm) <= k:
+        return {norm} if norm else set()
+    return {norm[i : i + k] for i in range(len(norm) - k + 1)}
+
+
+def _hash(shingle: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little"
+    )
+
+
+class MinHasher:
+    """MinHash signatures estimating the Jaccard similarity of shingle sets."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1, k: int = 5) -> None:
+        self.k = k
+        # deterministic permutation parameters (a*x + b) mod p
+        params: List[Tuple[int, int]] = []
+        state = seed
+        for _ in range(num_perm):
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            a = (state >> 3) % (_MERSENNE_PRIME - 1) + 1
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            b = (state >> 3) % _MERSENNE_PRIME
+            params.append((a, b))
+        self._params = params
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        hashes = [_hash(s) for s in shingles(text, self.k)]
+        if not hashes:
+            return tuple(_MAX_HASH for _ in self._params)
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._params
+        )
+
+    @staticmethod
+    def similarity(sig_a: Sequence[int], sig_b: Sequence[int]) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        if not sig_a:
+            return 0.0
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+class NearDuplicateFilter:
+    """Keeps texts whose similarity to every kept text stays below a threshold."""
+
+    def __init__(self, threshold: float = 0.6, hasher: MinHasher | None = None) -> None:
+        self.threshold = threshold
+        self.hasher = hasher or MinHasher()
+        self._signatures: List[Tuple[int, ...]] = []
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def add(self, text: str) -> bool:
+        """Keep `text` unless it is a near-duplicate; return whether it was kept."""
+        sig = self.hasher.signature(text)
+        for kept in self._signatures:
+            if self.hasher.similarity(sig, kept) >= self.threshold:
+                return False
+        self._signatures.append(sig)
+        return True
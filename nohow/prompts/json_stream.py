@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+from typing import Any, List
+
+
+class JsonArrayStreamParser:
+    """Incrementally extract the objects of a JSON array from streamed text.
+
+    Text is fed chunk by chunk as it arrives from the model. Each object
+    element of the (first) JSON array is decoded and returned as soon as its
+    closing brace is seen, so consumers can use items before the response is
+    complete. Text before the array (prose, a code fence, a `{"items":`
+    wrapper) and after it is ignored; an element that fails to decode is
+    skipped, and a truncated tail only loses the unfinished element.
+    """
+
+    def __init__(self) -> None:
+        self._in_array = False
+        self._done = False
+        self._depth = 0  # nesting depth inside the current element
+        self._in_string = False
+        self._escape = False
+        self._current: List[str] = []
+        self.skipped = 0  # elements that could not be decoded
+
+    @property
+    def done(self) -> bool:
+        """True once the closing bracket of the array was seen."""
+        return self._done
+
+    def feed(self, text: str) -> List[Any]:
+        """Consume a chunk of text, return the elements completed by it."""
+        items: List[Any] = []
+        for ch in text:
+            if self._done:
+                break
+            if not self._in_array:
+                if ch == "[":
+                    self._in_array = True
+                continue
+
+            if self._depth == 0:
+                # between elements of the array
+                if ch == "{":
+                    self._depth = 1
+                    self._current = [ch]
+                elif ch == "]":
+                    self._done = True
+                continue
+
+            self._current.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    raw = "".join(self._current)
+                    self._current = []
+                    try:
+                        items.append(json.loads(raw))
+                    except json.JSONDecodeError:
+                        self.skipped += 1
+        return items
@@ -1,11 +1,18 @@
-from typing import List, Set
-from pydantic import BaseModel, Field, conlist, field_validator, conset
+from contextlib import aclosing
+from typing import AsyncIterator, List, Sequence, Set
+from pydantic import BaseModel, Field, ValidationError, conlist, field_validator, conset
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
+from langchain_core.runnables import Runnable
 from langchain_openai import ChatOpenAI
 
+import asyncio
 import json
 
+from nohow.prompts.dedup import NearDuplicateFilter
+from nohow.prompts.json_stream import JsonArrayStreamParser
+from nohow.llm.telemetry import request_config
+
 
 your_chapter_text = """
 You are a helpful assistant.
@@ -212,16 +219,24 @@ class MCQGen(BaseModel):
         # We'll validate indices at the wrapper level below, or use a model_validator.
         return v
 
+    def is_correct(self, answers: List[int]) -> bool:
+        """True when exactly the correct choices were selected."""
+        return set(self.correct_answers) == set(answers)
 
-def gen_mcqs_from_chain_result(result: str) -> List[MCQGen]:
+
+def mcq_from_item(item) -> MCQGen | None:
+    """Validate one decoded JSON element, None if it is not a valid MCQ."""
     try:
-        res = json.loads(result)  # validate JSON structure
-    except json.JSONDecodeError as e:
-        return []
-    else:
-        res_list = res["items"] if "items" in res else res  # handle direct list
+        return MCQGen(**item)
+    except (TypeError, ValidationError):
+        return None
+
 
-        return [MCQGen(**item) for item in res_list]
+def gen_mcqs_from_chain_result(result: str) -> List[MCQGen]:
+    """Parse a complete model answer; a malformed tail only loses its item."""
+    parser = JsonArrayStreamParser()
+    mcqs = [mcq_from_item(item) for item in parser.feed(result)]
+    return [mcq for mcq in mcqs if mcq is not None]
 
 
 class MCQGenList(BaseModel):
@@ -242,7 +257,7 @@ class MCQForm(BaseModel):
 
         correct_count = 0
         for mcq, user_ans in zip(self.items, ua):
-            if set(mcq.correct_answers) == user_ans:
+            if mcq.is_correct(user_ans):
                 correct_count += 1
 
         score_ratio = correct_count / len(self.items)
@@ -275,90 +290,190 @@ Global constraints:
 - Do not invent facts not supported by the chapter.
 """
 
+# The prompt starts with the parts that do not change between batches
+# (format instructions, chapter content) so the provider prompt cache can
+# reuse them; the per-batch request comes last.
 PROMPT_TEXT = """
-Create {num_questions} MCQs based ONLY on the chapter content below.
-
-Guidelines:
-- Questions should cover key concepts, definitions, cause/effect, and practical implications.
-- Avoid trivial wording and avoid "All of the above"/"None of the above".
-- Keep each choice concise and unambiguous.
-- Use up to 4 choices per question (2-4).
+{format_instructions}
 
 Chapter content:
 {chapter_content}
 
-{format_instructions}
+Create {num_questions} MCQs based ONLY on the chapter content above.
 
-"""
-
-PROMPT_TEXT_WITH_EXCLUSION = """
-Create {num_questions} NEW MCQs based ONLY on the chapter content below.
-
-Hard constraints:
-- Do NOT repeat any question from the Existing questions list.
-- Do NOT create near-duplicates (same concept/tested point with only minor rewording).
-- If an Existing question already covers a concept, choose a different concept from the chapter.
-- If you cannot produce {num_questions} truly non-overlapping questions, produce fewer rather than repeating.
-
-Quality guidelines:
-- Cover key concepts, definitions, cause/effect, and practical implications.
-- Mix difficulty (some recall, some application).
+Guidelines:
+- Questions should cover key concepts, definitions, cause/effect, and practical implications.
 - Avoid trivial wording and avoid "All of the above"/"None of the above".
 - Keep each choice concise and unambiguous.
-- Use 2 to 4 choices per question (max 4).
-- correct_answers must be 0-based indices into choices.
+- Use up to 4 choices per question (2-4).
+{focus}
+"""
 
-Existing questions (do not repeat these, and avoid near-duplicates):
-{existing_questions}
+FOCUS_TEXT = """- Focus on part {part} of {parts} of the chapter (split it into {parts} parts of similar length), so that the questions do not overlap with the other parts.
+"""
 
-Chapter content:
-{chapter_content}
 
-{format_instructions}
-"""
+def build_mcq_chain(llm) -> Runnable:
+    """inputs (chapter_content, num_questions, focus) -> raw JSON string."""
+    parser = PydanticOutputParser(pydantic_object=MCQGenList)
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", SYSTEM_TEXT),
+            ("human", PROMPT_TEXT),
+        ]
+    ).partial(format_instructions=parser.get_format_instructions())
+    return prompt | llm | StrOutputParser()
+
+
+def _batch_inputs(chapter_text: str, missing: int, generate_by: int) -> List[dict]:
+    """Split `missing` questions into batches, each focused on a chapter part."""
+    sizes = [generate_by] * (missing // generate_by)
+    if missing % generate_by:
+        sizes.append(missing % generate_by)
+    return [
+        {
+            "chapter_content": chapter_text,
+            "num_questions": size,
+            "focus": (
+                FOCUS_TEXT.format(part=idx + 1, parts=len(sizes))
+                if len(sizes) > 1
+                else ""
+            ),
+        }
+        for idx, size in enumerate(sizes)
+    ]
+
+
+async def astream_mcqs(chain: Runnable, inputs: dict) -> AsyncIterator[MCQGen]:
+    """Stream one batch, yielding each MCQ as soon as its JSON object closes."""
+    parser = JsonArrayStreamParser()
+    async for chunk in chain.astream(inputs, config=request_config("mcq")):
+        for item in parser.feed(chunk):
+            mcq = mcq_from_item(item)
+            if mcq is not None:
+                yield mcq
+
+
+async def _merge_batches(
+    chain: Runnable, batches: List[dict]
+) -> AsyncIterator[MCQGen | BaseException]:
+    """Run the batches concurrently, yield their MCQs (or errors) as they come."""
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def run(inputs: dict) -> None:
+        try:
+            async for mcq in astream_mcqs(chain, inputs):
+                await queue.put(mcq)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(done)
+
+    tasks = [asyncio.create_task(run(inputs)) for inputs in batches]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is done:
+                remaining -= 1
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def astream_mcqs_from_chapter(
+    llm,
+    chapter_text: str,
+    total_count: int,
+    generate_by: int = 3,
+    max_rounds: int = 3,
+    similarity_threshold: float = 0.6,
+    exclude: Sequence[str] = (),
+) -> AsyncIterator[MCQGen]:
+    """Stream `total_count` distinct MCQs generated by concurrent batch requests.
+
+    All the batches needed are sent at once and each question is yielded as
+    soon as its JSON object is complete. Near-duplicate questions (MinHash
+    over question text, also against `exclude`) are dropped locally and only
+    the shortfall is requested again, for at most `max_rounds` rounds.
+    """
+    chain = build_mcq_chain(llm)
+    seen = NearDuplicateFilter(threshold=similarity_threshold)
+    for question in exclude:
+        seen.add(question)
+    produced = 0
+
+    for _ in range(max_rounds):
+        missing = total_count - produced
+        if missing <= 0:
+            break
+        batches = _batch_inputs(chapter_text, missing, generate_by)
+        errors: List[BaseException] = []
+        round_produced = 0
+        async with aclosing(_merge_batches(chain, batches)) as items:
+            async for item in items:
+                if isinstance(item, BaseException):
+                    errors.append(item)
+                    continue
+                if not seen.add(item.question):
+                    continue
+                produced += 1
+                round_produced += 1
+                yield item
+                if produced >= total_count:
+                    return
+        if not round_produced and len(errors) == len(batches):
+            raise errors[0]
+
+
+async def agenerate_mcqs_from_chapter(
+    llm,
+    chapter_text: str,
+    total_count: int,
+    generate_by: int = 3,
+    max_rounds: int = 3,
+    similarity_threshold: float = 0.6,
+) -> List[MCQGen]:
+    """Collect the questions of `astream_mcqs_from_chapter` into a list."""
+    return [
+        mcq
+        async for mcq in astream_mcqs_from_chapter(
+            llm,
+            chapter_text,
+            total_count=total_count,
+            generate_by=generate_by,
+            max_rounds=max_rounds,
+            similarity_threshold=similarity_threshold,
+        )
+    ]
 
 
 def generate_mcqs_from_chapter(
     llm, chapter_text: str, total_count: int, generate_by: int = 3
 ) -> List[MCQGen]:
-    parser = PydanticOutputParser(pydantic_object=MCQGenList)
-    out_instr = parser.get_format_instructions()
-
-    all_mcqs: List[MCQGen] = []
-
-    while len(all_mcqs) < total_count:
-        # print(f"Generating MCQ batch {batch_idx+1}/{batch_count}...")
-        if not all_mcqs:
-            prompt = (
-                ChatPromptTemplate.from_messages(
-                    [
-                        ("system", SYSTEM_TEXT),
-                        ("human", PROMPT_TEXT),
-                    ]
-                )
-                .partial(format_instructions=out_instr)
-                .partial(num_questions=generate_by)
-            )
-        else:
-            # prepare existing questions list
-            existing_questions = "\n".join(f"- {mcq.question}" for mcq in all_mcqs)
-            prompt = (
-                ChatPromptTemplate.from_messages(
-                    [
-                        ("system", SYSTEM_TEXT),
-                        ("human", PROMPT_TEXT_WITH_EXCLUSION),
-                    ]
-                )
-                .partial(format_instructions=out_instr)
-                .partial(num_questions=min(generate_by, total_count - len(all_mcqs)))
-                .partial(existing_questions=existing_questions)
-            )
-
-        chain = prompt | llm | StrOutputParser()
-        result = chain.invoke({"chapter_content": chapter_text})
-        mcqs = gen_mcqs_from_chain_result(result)
-        all_mcqs.extend(mcqs)
-    return all_mcqs
+    """Blocking version of `agenerate_mcqs_from_chapter`, for sync callers only.
+
+    Raises `RuntimeError` when called from a running event loop; await
+    `agenerate_mcqs_from_chapter` there instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError(
+            "generate_mcqs_from_chapter() cannot run inside an event loop, "
+            "await agenerate_mcqs_from_chapter() instead"
+        )
+    return asyncio.run(
+        agenerate_mcqs_from_chapter(
+            llm, chapter_text, total_count=total_count, generate_by=generate_by
+        )
+    )
 
 
 async def demo():
@@ -368,7 +483,7 @@ async def demo():
         temperature=0.9,
         api_key="",
     )  # pick your model
-    mcqs = generate_mcqs_from_chapter(
+    mcqs = await agenerate_mcqs_from_chapter(
         llm=llm, chapter_text=your_chapter_text, total_count=5, generate_by=3
     )
     for idx, mcq in enumerate(mcqs):
@@ -393,6 +508,4 @@ async def demo():
 
 
 if __name__ == "__main__":
-    import asyncio
-
     asyncio.run(demo())
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import List, Mapping, Optional, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import (
+    ChatPromptTemplate,
+    HumanMessagePromptTemplate,
+    SystemMessagePromptTemplate,
+)
+from pydantic import BaseModel, Field
+
+from nohow.llm.telemetry import request_config
+from nohow.prompts.json_stream import JsonArrayStreamParser
+
+SYSTEM_TEXT = """You summarize book chapters for a table of contents preview.
+Respond ONLY with JSON, no code fence and no commentary."""
+
+# instructions first, the chapter last (see chap_gen.PROMPT_TEXT on prefixes)
+PROMPT_TEXT = """Summarize the chapter below in at most {max_words} words and list
+its {term_count} most important key terms.
+Respond with: [{{"summary": "...", "key_terms": ["...", "..."]}}]
+
+Book: {book_title}
+Chapter: {chapter_title}
+
+{chapter_content}
+"""
+
+
+# a reply wrapped in a Markdown code fence, with or without a language
+_FENCE_RE = re.compile(r"^\s*```[\w-]*\s*\n(.*?)\n?```\s*$", re.DOTALL)
+
+
+class ChapterSummaryGen(BaseModel):
+    summary: str = Field(..., description="Short summary of the chapter")
+    key_terms: List[str] = Field(default_factory=list)
+
+
+def build_summary_chain(llm: BaseChatModel):
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            SystemMessagePromptTemplate.from_template(SYSTEM_TEXT),
+            HumanMessagePromptTemplate.from_template(PROMPT_TEXT),
+        ]
+    )
+    return prompt | llm | StrOutputParser()
+
+
+def parse_summary(text: str) -> Optional[ChapterSummaryGen]:
+    """Read the model reply; plain prose is kept as the summary."""
+    items = JsonArrayStreamParser().feed(text)
+    if not items:
+        # a bare object instead of the requested one-element array
+        fenced = _FENCE_RE.match(text)
+        try:
+            items = [json.loads(fenced.group(1) if fenced else text)]
+        except json.JSONDecodeError:
+            items = []
+    for item in items:
+        if isinstance(item, dict) and str(item.get("summary", "")).strip():
+            terms = item.get("key_terms") or []
+            if not isinstance(terms, list):
+                terms = [terms]
+            return ChapterSummaryGen(
+                summary=str(item["summary"]).strip(),
+                key_terms=[str(t).strip() for t in terms if str(t).strip()],
+            )
+    text = text.strip()
+    return ChapterSummaryGen(summary=text) if text else None
+
+
+async def asummarize_chapter(
+    llm: BaseChatModel,
+    book_title: str,
+    chapter_title: str,
+    chapter_content: str,
+    max_words: int = 60,
+    term_count: int = 6,
+) -> Optional[ChapterSummaryGen]:
+    chain = build_summary_chain(llm)
+    text = await chain.ainvoke(
+        {
+            "book_title": book_title,
+            "chapter_title": chapter_title,
+            "chapter_content": chapter_content,
+            "max_words": max_words,
+            "term_count": term_count,
+        },
+        config=request_config("summary"),
+    )
+    return parse_summary(text)
+
+
+async def refresh_chapter_summary(
+    app,
+    llm: BaseChatModel,
+    book_id: int,
+    toc_address: str,
+    book_title: str,
+    chapter_title: str,
+    content: str,
+) -> Optional[ChapterSummaryGen]:
+    """Summarize a saved chapter and store the summary.
+
+    Returns None when the stored summary is still valid for the content.
+    """
+    from nohow.db.models import load_chapter_summary, save_chapter_summary
+    from nohow.retrieval.index import content_hash
+
+    chapter_hash = content_hash(content)
+    stored = load_chapter_summary(app, book_id, toc_address)
+    if not content.strip() or (stored and stored.content_hash == chapter_hash):
+        return None
+    summary = await asummarize_chapter(llm, book_title, chapter_title, content)
+    if summary is None:
+        return None
+    save_chapter_summary(
+        app,
+        book_id,
+        toc_address,
+        chapter_hash,
+        summary.summary,
+        summary.key_terms,
+        model=str(getattr(llm, "model_name", "")),
+    )
+    return summary
+
+
+def summary_from_row(row) -> ChapterSummaryGen:
+    """Summary of a stored `ChapterSummary` row."""
+    return ChapterSummaryGen(
+        summary=str(row.summary), key_terms=json.loads(row.key_terms or "[]")
+    )
+
+
+def format_chapter_summaries(
+    summaries: Mapping[str, ChapterSummaryGen], addresses: Sequence[str]
+) -> str:
+    """Summaries of the given chapters as compact prompt context."""
+    lines: List[str] = []
+    for address in addresses:
+        summary = summaries.get(address)
+        if summary is None:
+            continue
+        line = f"[{address}] {summary.summary}"
+        if summary.key_terms:
+            line += f" (key terms: {', '.join(summary.key_terms)})"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def summary_tooltip(summary: ChapterSummaryGen) -> str:
+    if not summary.key_terms:
+        return summary.summary
+    return f"{summary.summary}\n\nKey terms: {', '.join(summary.key_terms)}"
+
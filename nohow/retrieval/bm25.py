@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import heapq
+import math
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+STOPWORDS = frozenset(
+    """a about above after again against all am an and any are as at be because
+    been before being below between both but by can could did do does doing down
+    during each few for from further had has have having he her here hers him his
+    how i if in into is it its itself just me more most my no nor not of off on
+    once only or other our ours out over own same she should so some such than
+    that the their theirs them then there these they this those through to too
+    under until up very was we were what when where which while who whom why will
+    with would you your yours chapter introduction part section""".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens, without stopwords and single letters."""
+    return [
+        t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS
+    ]
+
+
+def iter_passages(
+    path: Path | str, max_words: int = 150, encoding: str = "utf-8"
+) -> Iterator[str]:
+    """Stream the passages of a text file without loading it whole.
+
+    Lines are accumulated until a blank line ends a paragraph once
+    `max_words` is reached; paragraphs longer than twice `max_words` are
+    cut at line ends.
+    """
+    lines: List[str] = []
+    words = 0
+    with open(path, "r", encoding=encoding, errors="replace") as f:
+        for line in f:
+            if not line.strip():
+                if words >= max_words:
+                    yield "".join(lines).strip()
+                    lines, words = [], 0
+                elif lines:
+                    lines.append("\n")
+                continue
+            lines.append(line)
+            words += len(line.split())
+            if words >= 2 * max_words:
+                yield "".join(lines).strip()
+                lines, words = [], 0
+    if words:
+        yield "".join(lines).strip()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+def bm25_top_k(
+    postings: Iterable[Tuple[str, int, int, int]],
+    query_weights: Mapping[str, float],
+    passage_count: int,
+    avg_length: float,
+    k: int,
+    k1: float = 1.2,
+    b: float = 0.75,
+) -> List[Tuple[float, int]]:
+    """Best `k` passages for a weighted query, as (score, passage_id).
+
+    `postings` holds (term, passage_id, term_frequency, passage_length)
+    rows of the query terms; document frequencies are derived from them.
+    """
+    by_term: Dict[str, List[Tuple[int, int, int]]] = {}
+    for term, passage_id, tf, length in postings:
+        by_term.setdefault(term, []).append((passage_id, tf, length))
+
+    scores: Counter = Counter()
+    avg_length = avg_length or 1.0
+    for term, rows in by_term.items():
+        df = len(rows)
+        idf = math.log(1 + (passage_count - df + 0.5) / (df + 0.5))
+        weight = query_weights.get(term, 0.0) * idf
+        for passage_id, tf, length in rows:
+            norm = k1 * (1 - b + b * length / avg_length)
+            scores[passage_id] += weight * tf * (k1 + 1) / (tf + norm)
+    return heapq.nlargest(k, ((s, pid) for pid, s in scores.items()))
+
+
+def weighted_query(titles: Sequence[str], decay: float = 0.5) -> Dict[str, float]:
+    """Query terms of a chapter title and its ancestors.
+
+    `titles` goes from the chapter up to the root; each level up weighs
+    `decay` times less, so broader context only breaks ties.
+    """
+    weights: Dict[str, float] = {}
+    level_weight = 1.0
+    for title in titles:
+        for term in set(tokenize(title)):
+            weights[term] = max(weights.get(term, 0.0), level_weight)
+        level_weight *= decay
+    return weights
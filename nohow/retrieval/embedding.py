@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class HashingEmbedder(Embeddings):
+    """Local embedding: signed feature hashing of words and word bigrams.
+
+    No model and no network; similar texts share vocabulary, which is enough
+    to find the chapter passages a question is about. Vectors are L2
+    normalized, so a dot product is the cosine similarity.
+    """
+
+    def __init__(self, dim: int = 512) -> None:
+        self.dim = dim
+
+    @property
+    def name(self) -> str:
+        return f"hashing-{self.dim}"
+
+    def _features(self, text: str) -> List[str]:
+        words = _WORD_RE.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8)
+                h = int.from_bytes(digest.digest(), "little")
+                vectors[row, h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+
+def embedder_name(embedder: Embeddings) -> str:
+    """Identifies the vector space, stored with the vectors."""
+    name = getattr(embedder, "name", None)
+    if name:
+        return str(name)
+    model = getattr(embedder, "model", None) or getattr(embedder, "model_name", "")
+    return f"{type(embedder).__name__}:{model}"
+
+
+def embed_texts(embedder: Embeddings, texts: List[str]) -> np.ndarray:
+    """Normalized float32 matrix of the embeddings of `texts`."""
+    if isinstance(embedder, HashingEmbedder):
+        return embedder.embed_array(texts)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    vectors = np.asarray(embedder.embed_documents(texts), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+EmbedderFactory = Callable[[Dict[str, Any]], Embeddings]
+
+_EMBEDDERS: Dict[str, EmbedderFactory] = {
+    "hashing": lambda options: HashingEmbedder(dim=int(options.get("dim", 512))),
+}
+
+
+def register_embedder(name: str) -> Callable[[EmbedderFactory], EmbedderFactory]:
+    """Register a factory for the `retrieval.embedder` config value."""
+
+    def decorator(factory: EmbedderFactory) -> EmbedderFactory:
+        _EMBEDDERS[name] = factory
+        return factory
+
+    return decorator
+
+
+def create_embedder(name: str, options: Optional[Dict[str, Any]] = None) -> Embeddings:
+    try:
+        factory = _EMBEDDERS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown embedder {name!r}, expected one of: {', '.join(sorted(_EMBEDDERS))}"
+        ) from None
+    return factory(dict(options or {}))
+
+
+@register_embedder("openai")
+def _openai_embedder(options: Dict[str, Any]) -> Embeddings:
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(**options)
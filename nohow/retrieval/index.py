@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def chunk_text(text: str, max_words: int = 200, overlap: int = 40) -> List[str]:
+    """Split text into chunks of about `max_words`, on paragraph boundaries.
+
+    Paragraphs longer than `max_words` are split by words, consecutive
+    pieces sharing `overlap` words.
+    """
+    pieces: List[List[str]] = []
+    step = max(1, max_words - overlap)
+    for paragraph in _PARAGRAPH_RE.split(text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if len(words) <= max_words:
+            pieces.append(words)
+        else:
+            for start in range(0, len(words) - overlap, step):
+                pieces.append(words[start : start + max_words])
+
+    chunks: List[str] = []
+    current: List[str] = []
+    for words in pieces:
+        if current and len(current) + len(words) > max_words:
+            chunks.append(" ".join(current))
+            current = []
+        current.extend(words)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+@dataclass(frozen=True, slots=True)
+class RetrievedChunk:
+    toc_address: str
+    text: str
+    score: float
+
+
+class BookIndex:
+    """In-memory vectors of the chapter chunks of one book.
+
+    Rows are grouped by chapter; updating a chapter replaces its rows.
+    """
+
+    def __init__(self, dim: int = 0) -> None:
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._addresses: List[str] = []
+        self._texts: List[str] = []
+        self.hashes: Dict[str, str] = {}  # toc_address -> indexed content hash
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def update_chapter(
+        self,
+        toc_address: str,
+        chunks: Sequence[str],
+        vectors: np.ndarray,
+        chapter_hash: str = "",
+    ) -> None:
+        keep = [i for i, a in enumerate(self._addresses) if a != toc_address]
+        if len(keep) != len(self._addresses):
+            self._vectors = self._vectors[keep]
+            self._addresses = [self._addresses[i] for i in keep]
+            self._texts = [self._texts[i] for i in keep]
+        if len(chunks):
+            vectors = np.asarray(vectors, dtype=np.float32)
+            if len(self._texts) == 0:
+                self._vectors = vectors.copy()
+            else:
+                self._vectors = np.vstack([self._vectors, vectors])
+            self._addresses.extend([toc_address] * len(chunks))
+            self._texts.extend(chunks)
+        self.hashes[toc_address] = chapter_hash
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 4,
+        exclude_address: Optional[str] = None,
+        min_score: float = 0.0,
+    ) -> List[RetrievedChunk]:
+        """The `k` chunks most similar to the (normalized) query vector."""
+        if not self._texts or k <= 0:
+            return []
+        scores = self._vectors @ np.asarray(query, dtype=np.float32)
+        if exclude_address is not None:
+            mask = np.fromiter(
+                (a == exclude_address for a in self._addresses),
+                dtype=bool,
+                count=len(self._addresses),
+            )
+            scores = np.where(mask, -np.inf, scores)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            RetrievedChunk(self._addresses[i], self._texts[i], float(scores[i]))
+            for i in top
+            if scores[i] > min_score
+        ]
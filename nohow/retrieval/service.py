@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from nohow.db.models import (
+    load_book_chapters,
+    load_chapter_chunks,
+    replace_chapter_chunks,
+)
+from nohow.retrieval.embedding import create_embedder, embed_texts, embedder_name
+from nohow.retrieval.index import BookIndex, RetrievedChunk, chunk_text, content_hash
+from nohow.utils import ConfigSection
+
+Retriever = Callable[[str], List[RetrievedChunk]]
+
+
+@dataclass(frozen=True, slots=True)
+class RetrievalConfig(ConfigSection):
+    """The `retrieval:` section of `.nohow.yml`."""
+
+    enabled: bool = True
+    embedder: str = "hashing"
+    embedder_options: Optional[Dict[str, Any]] = None
+    top_k: int = 4
+    min_score: float = 0.1
+    chunk_words: int = 200
+    chunk_overlap: int = 40
+
+
+class ChapterRetrieval:
+    """Per-book vector indexes over the generated chapters.
+
+    An index is loaded from the database on first use; chapters saved
+    before indexing existed (or with another embedder) are indexed then.
+    `index_chapter` keeps it up to date when a chapter is saved. Both run
+    off the UI thread, hence the lock.
+    """
+
+    def __init__(
+        self, config: RetrievalConfig, embedder: Optional[Embeddings] = None
+    ) -> None:
+        self.config = config
+        self.embedder = embedder or create_embedder(
+            config.embedder, config.embedder_options
+        )
+        self.embedder_name = embedder_name(self.embedder)
+        self._indexes: Dict[int, BookIndex] = {}
+        self._lock = threading.RLock()
+
+    def book_index(self, app, book_id: int) -> BookIndex:
+        with self._lock:
+            index = self._indexes.get(book_id)
+            if index is not None:
+                return index
+            index = BookIndex()
+            by_chapter: Dict[str, List[Any]] = {}
+            for row in load_chapter_chunks(app, book_id, self.embedder_name):
+                by_chapter.setdefault(row.toc_address, []).append(row)
+            for toc_address, rows in by_chapter.items():
+                index.update_chapter(
+                    toc_address,
+                    [row.text for row in rows],
+                    np.stack(
+                        [np.frombuffer(row.vector, dtype=np.float32) for row in rows]
+                    ),
+                    rows[0].content_hash,
+                )
+            self._indexes[book_id] = index
+            for chapter in load_book_chapters(app, book_id):
+                self.index_chapter(
+                    app, book_id, str(chapter.toc_address), str(chapter.content)
+                )
+            return index
+
+    def index_chapter(self, app, book_id: int, toc_address: str, content: str) -> None:
+        """(Re)index a saved chapter, unless its content did not change."""
+        with self._lock:
+            index = self.book_index(app, book_id)
+            chapter_hash = content_hash(content)
+            if index.hashes.get(toc_address) == chapter_hash:
+                return
+            chunks = chunk_text(
+                content, self.config.chunk_words, self.config.chunk_overlap
+            )
+            vectors = embed_texts(self.embedder, chunks)
+            replace_chapter_chunks(
+                app,
+                book_id,
+                toc_address,
+                self.embedder_name,
+                chapter_hash,
+                chunks,
+                [v.tobytes() for v in vectors],
+            )
+            index.update_chapter(toc_address, chunks, vectors, chapter_hash)
+
+    def retrieve(
+        self,
+        app,
+        book_id: int,
+        question: str,
+        exclude_address: Optional[str] = None,
+    ) -> List[RetrievedChunk]:
+        with self._lock:
+            index = self.book_index(app, book_id)
+            query = embed_texts(self.embedder, [question])[0]
+            return index.search(
+                query,
+                k=self.config.top_k,
+                exclude_address=exclude_address,
+                min_score=self.config.min_score,
+            )
+
+    def retriever_for(
+        self, app, book_id: int, exclude_address: Optional[str] = None
+    ) -> Retriever:
+        """Retrieval function for the chat about one chapter of a book."""
+        return lambda question: self.retrieve(app, book_id, question, exclude_address)
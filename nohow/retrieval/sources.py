@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy import func
+
+from nohow.db.models import SourceDocument, SourcePassage, SourcePosting
+from nohow.db.utils import get_session
+from nohow.retrieval.bm25 import (
+    bm25_top_k,
+    estimate_tokens,
+    iter_passages,
+    tokenize,
+    weighted_query,
+)
+from nohow.utils import ConfigSection
+
+_BATCH = 500  # passages inserted at once while indexing
+
+
+def _bulk_insert(session, passages: List[dict], postings: List[dict]) -> None:
+    # Core inserts on the session connection: the ORM bulk path costs more
+    # than SQLite itself for millions of postings.
+    connection = session.connection()
+    connection.execute(SourcePassage.__table__.insert(), passages)
+    if postings:
+        connection.execute(SourcePosting.__table__.insert(), postings)
+
+
+@dataclass(frozen=True, slots=True)
+class SourcesConfig(ConfigSection):
+    """The `sources:` section of `.nohow.yml`."""
+
+    token_budget: int = 1500  # source material added to a chapter prompt
+    top_k: int = 8
+    passage_words: int = 150
+
+
+@dataclass(frozen=True, slots=True)
+class SourceHit:
+    document: str  # file name
+    text: str
+    score: float
+
+
+class SourceLibrary:
+    """BM25 search over the source documents attached to books.
+
+    The inverted index lives in the database (source_passages and
+    source_postings). Documents are read in a streaming fashion and only
+    re-indexed when their size or modification time changed. Documents are
+    indexed one at a time: passage ids are assigned from the largest one.
+    """
+
+    def __init__(self, config: SourcesConfig) -> None:
+        self.config = config
+        self._lock = threading.Lock()
+
+    def attach(self, app, book_id: int, path: Path | str) -> SourceDocument:
+        """Attach a text or Markdown file to a book and index it."""
+        path = Path(path).expanduser().resolve()
+        if not path.is_file():
+            raise FileNotFoundError(f"No such file: {path}")
+        with get_session(app.get_db()) as session:
+            document = (
+                session.query(SourceDocument)
+                .filter_by(book_id=book_id, path=str(path))
+                .one_or_none()
+            )
+            if document is None:
+                document = SourceDocument(book_id=book_id, path=str(path))
+                session.add(document)
+                session.commit()
+            document_id = document.id
+        self.index_document(app, document_id)
+        with get_session(app.get_db()) as session:
+            return session.query(SourceDocument).filter_by(id=document_id).one()
+
+    def sync(self, app, book_id: int) -> int:
+        """Re-index the documents of a book that changed on disk."""
+        with get_session(app.get_db()) as session:
+            ids = [
+                d.id
+                for d in session.query(SourceDocument.id).filter_by(book_id=book_id)
+            ]
+        return sum(self.index_document(app, document_id) for document_id in ids)
+
+    def index_document(self, app, document_id: int, force: bool = False) -> bool:
+        """(Re)build the postings of a document; False when it is up to date."""
+        with self._lock, get_session(app.get_db()) as session:
+            document = session.query(SourceDocument).filter_by(id=document_id).one()
+            try:
+                stat = os.stat(document.path)
+            except FileNotFoundError:
+                return False  # keep the passages of a moved or deleted file
+            if (
+                not force
+                and document.size == stat.st_size
+                and document.mtime == stat.st_mtime
+            ):
+                return False
+
+            old = session.query(SourcePassage.id).filter_by(document_id=document_id)
+            session.query(SourcePosting).filter(
+                SourcePosting.passage_id.in_(old.scalar_subquery())
+            ).delete(synchronize_session=False)
+            session.query(SourcePassage).filter_by(document_id=document_id).delete()
+
+            # passage ids are assigned here so both tables are bulk inserted
+            next_id = (session.query(func.max(SourcePassage.id)).scalar() or 0) + 1
+            count = 0
+            passages: List[Dict[str, Any]] = []
+            postings: List[Dict[str, Any]] = []
+            for text in iter_passages(document.path, self.config.passage_words):
+                terms = Counter(tokenize(text))
+                length = sum(terms.values())
+                passage_id = next_id + count
+                passages.append(
+                    {
+                        "id": passage_id,
+                        "document_id": document_id,
+                        "book_id": document.book_id,
+                        "position": count,
+                        "text": text,
+                        "length": length,
+                    }
+                )
+                postings.extend(
+                    {
+                        "term": term,
+                        "passage_id": passage_id,
+                        "book_id": document.book_id,
+                        "tf": tf,
+                        "passage_length": length,
+                    }
+                    for term, tf in terms.items()
+                )
+                count += 1
+                if len(passages) >= _BATCH:
+                    _bulk_insert(session, passages, postings)
+                    passages, postings = [], []
+            if passages:
+                _bulk_insert(session, passages, postings)
+
+            document.size = stat.st_size
+            document.mtime = stat.st_mtime
+            document.passage_count = count
+            session.commit()
+            return True
+
+    def search(
+        self, app, book_id: int, query: Dict[str, float], k: int
+    ) -> List[SourceHit]:
+        """Best passages of the book sources for a weighted term query."""
+        if not query:
+            return []
+        with get_session(app.get_db()) as session:
+            passage_count, avg_length = (
+                session.query(
+                    func.count(SourcePassage.id), func.avg(SourcePassage.length)
+                )
+                .filter(SourcePassage.book_id == book_id)
+                .one()
+            )
+            if not passage_count:
+                return []
+            postings = session.query(
+                SourcePosting.term,
+                SourcePosting.passage_id,
+                SourcePosting.tf,
+                SourcePosting.passage_length,
+            ).filter(
+                SourcePosting.book_id == book_id,
+                SourcePosting.term.in_(list(query)),
+            )
+            top = bm25_top_k(postings, query, passage_count, float(avg_length), k)
+            if not top:
+                return []
+            rows = {
+                passage_id: (text, path)
+                for passage_id, text, path in session.query(
+                    SourcePassage.id, SourcePassage.text, SourceDocument.path
+                )
+                .join(SourceDocument, SourceDocument.id == SourcePassage.document_id)
+                .filter(SourcePassage.id.in_([pid for _, pid in top]))
+            }
+        return [
+            SourceHit(Path(rows[pid][1]).name, rows[pid][0], score)
+            for score, pid in top
+            if pid in rows
+        ]
+
+    def chapter_material(self, app, book_id: int, titles: Sequence[str]) -> str:
+        """Best passages for a chapter, formatted and cut to the token budget.
+
+        `titles` goes from the chapter title up to the root of the TOC.
+        """
+        hits = self.search(app, book_id, weighted_query(titles), self.config.top_k)
+        selected: List[str] = []
+        budget = self.config.token_budget
+        for hit in hits:
+            passage = f"[{hit.document}]\n{hit.text}"
+            cost = estimate_tokens(passage)
+            if cost > budget:
+                continue
+            selected.append(passage)
+            budget -= cost
+        return "\n\n".join(selected)
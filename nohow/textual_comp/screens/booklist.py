@@ -1,11 +1,7 @@
 from __future__ import annotations
-from typing import List
-
 from textual.app import ComposeResult
 from textual.screen import Screen
 from textual.widgets import Footer, Header, Label, Rule
-from nohow.db.utils import get_session, setup_database
-from nohow.db.models import Book
 from nohow.textual_comp.widgets.booklist_widgets import BooksView
 
 
@@ -35,21 +31,14 @@ class BookListScreen(Screen):
         yield Footer()
 
     def on_mount(self) -> None:
-        """Load books from the database and pass them to the BooksView."""
-        self.run_worker(self._load_books(), exclusive=True)
+        """Load the books from the database into the BooksView."""
+        self.run_worker(self._load_books())
 
     def _on_screen_resume(self):
         super()._on_screen_resume()
-        """Reload books when the screen gains focus."""
-        self.run_worker(self._load_books(), exclusive=True)
+        """Apply the changes made to the books while the screen was hidden."""
+        self.run_worker(self._load_books())
 
     async def _load_books(self) -> None:
-        books = []
-
-        engine = self.app.get_db()
-        with get_session(engine) as session:
-            books: List[Book] = session.query(Book).all()
-
         books_view = self.query_one("#books_view", BooksView)
-
-        await books_view.set_books(books)
+        await books_view.refresh_books()
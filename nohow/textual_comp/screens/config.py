@@ -53,6 +53,7 @@ class ConfigScreen(Screen):
         app_context.model_name = model_name_input.value
         app_context.aiprovider_key = aiprovider_key_input.value
         app_context.to_yaml(Path(self.app.yaml_config_path))
+        app_context.llm = app_context.build_llm()
         # Here you would typically save the configuration to a file
         self.app.pop_screen()
 
@@ -78,6 +79,11 @@ class ConfigForm(Static):
         yield Label(f"{self.app.yaml_config_path}")
         yield Label(f"Database Path:")
         yield Label(f"{self.app.db_path}")
+        yield Label(f"Prompt Cache:")
+        yield Label(
+            f"{self.app.app_context.prompt_cache_stats.summary()}",
+            id="prompt_cache_label",
+        )
 
         yield Label("Model Name:")
         yield Input(placeholder="Enter model name", id="model_name_input")
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from textual import on
+from textual.app import ComposeResult
+from textual.containers import Horizontal, Vertical
+from textual.screen import ModalScreen
+from textual.widgets import Button, Label
+
+
+class ConfirmScreen(ModalScreen[bool]):
+    """Small modal asking a yes/no question, dismissed with the answer."""
+
+    DEFAULT_CSS = """
+    ConfirmScreen {
+        align: center middle;
+    }
+    #confirm_dialog {
+        width: 50;
+        height: auto;
+        border: round $accent;
+        padding: 1 2;
+        background: $panel;
+    }
+    #confirm_buttons {
+        height: auto;
+        margin-top: 1;
+        align: center middle;
+    }
+    """
+
+    BINDINGS = [
+        ("y", "answer(True)", "Yes"),
+        ("n", "answer(False)", "No"),
+        ("escape", "answer(False)", "No"),
+    ]
+
+    def __init__(
+        self, question: str, yes_label: str = "Yes", no_label: str = "No", **kwargs
+    ) -> None:
+        super().__init__(**kwargs)
+        self.question = question
+        self.yes_label = yes_label
+        self.no_label = no_label
+
+    def compose(self) -> ComposeResult:
+        with Vertical(id="confirm_dialog"):
+            yield Label(self.question, id="confirm_question")
+            with Horizontal(id="confirm_buttons"):
+                yield Button(self.yes_label, id="confirm_yes", variant="primary")
+                yield Button(self.no_label, id="confirm_no", variant="error")
+
+    @on(Button.Pressed, "#confirm_yes")
+    def on_yes(self, event: Button.Pressed) -> None:
+        event.stop()
+        self.dismiss(True)
+
+    @on(Button.Pressed, "#confirm_no")
+    def on_no(self, event: Button.Pressed) -> None:
+        event.stop()
+        self.dismiss(False)
+
+    def action_answer(self, answer: bool) -> None:
+        self.dismiss(answer)
@@ -0,0 +1,187 @@
+from __future__ import annotations
+import random
+from typing import List
+
+from textual import on
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Horizontal, VerticalScroll
+from textual.screen import Screen
+from textual.widgets import Button, Footer, Header, Label
+
+from nohow.db.models import (
+    QuizItem,
+    add_quiz_item,
+    load_quiz_pool,
+    record_quiz_answers,
+)
+from nohow.prompts.mcq import MCQGen, astream_mcqs_from_chapter
+from nohow.retrieval.index import content_hash
+from nohow.textual_comp.widgets.mcq_widgets import MCQFormWidget
+from nohow.textual_comp.widgets.utils import IsTyping
+
+
+class QuizScreen(Screen):
+    """Quiz on one chapter, drawn from the stored question pool.
+
+    The quiz starts right away with the questions already stored for the
+    chapter. A background worker tops the pool up to POOL_TARGET questions,
+    persisting each new question as soon as it is streamed; while the quiz
+    is short of QUIZ_SIZE questions, new ones are added to it as they come.
+    """
+
+    QUIZ_SIZE = 5
+    POOL_TARGET = 20
+
+    DEFAULT_CSS = """
+    QuizScreen {
+        align: center top;
+    }
+    #quiz_title {
+        margin: 1 2;
+        text-style: bold;
+    }
+    #quiz_questions {
+        height: 1fr;
+        width: 90%;
+    }
+    #quiz_buttons {
+        height: auto;
+        margin: 1 2;
+    }
+    #quiz_score {
+        margin: 0 2;
+    }
+    """
+
+    BINDINGS = [
+        Binding("escape", "close", "Back"),
+        ("j", "focus_next", "Focus next"),
+        ("k", "focus_previous", "Focus previous"),
+    ]
+
+    def __init__(
+        self,
+        book_id: int,
+        toc_address: str,
+        chapter_title: str,
+        chapter_content: str,
+        **kwargs,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.book_id = book_id
+        self.toc_address = toc_address
+        self.chapter_title = chapter_title
+        self.chapter_content = chapter_content
+        # questions are kept for this content only
+        self.content_hash = content_hash(chapter_content)
+        self.generating_indicator = IsTyping()
+        self.generating_indicator.display = False
+        # widgets of the current session, with the id of their stored item
+        self._session: List[tuple[int, MCQFormWidget]] = []
+        self._submitted = False
+
+    def compose(self) -> ComposeResult:
+        yield Header()
+        yield Label(f"Quiz: {self.toc_address} {self.chapter_title}", id="quiz_title")
+        yield VerticalScroll(id="quiz_questions")
+        yield self.generating_indicator
+        yield Label("", id="quiz_score")
+        with Horizontal(id="quiz_buttons"):
+            yield Button("Submit", id="quiz_submit", variant="success", compact=True)
+            yield Button("New Quiz", id="quiz_new", variant="primary", compact=True)
+            yield Button("Back", id="quiz_back", compact=True)
+        yield Footer()
+
+    async def on_mount(self) -> None:
+        pool = load_quiz_pool(
+            self.app, self.book_id, self.toc_address, self.content_hash
+        )
+        await self._start_session(pool)
+        if len(pool) < self.POOL_TARGET:
+            self.run_worker(
+                self._top_up_pool(
+                    [MCQGen.model_validate_json(i.content).question for i in pool]
+                ),
+                group="quiz_top_up",
+                exclusive=True,
+            )
+
+    async def _start_session(self, pool: List[QuizItem]) -> None:
+        """Draw QUIZ_SIZE questions, least asked first (random among equals)."""
+        container = self.query_one("#quiz_questions", VerticalScroll)
+        await container.remove_children()
+        self._session = []
+        self._submitted = False
+        self.query_one("#quiz_score", Label).update("")
+
+        shuffled = list(pool)
+        random.shuffle(shuffled)
+        shuffled.sort(key=lambda item: item.times_asked or 0)
+        for item in shuffled[: self.QUIZ_SIZE]:
+            await self._add_question(item.id, MCQGen.model_validate_json(item.content))
+
+    async def _add_question(self, item_id: int, mcq: MCQGen) -> None:
+        widget = MCQFormWidget(mcq)
+        self._session.append((item_id, widget))
+        await self.query_one("#quiz_questions", VerticalScroll).mount(widget)
+
+    async def _top_up_pool(self, known_questions: List[str]) -> None:
+        self.generating_indicator.display = True
+        try:
+            stream = astream_mcqs_from_chapter(
+                self.app.app_context.llm_for("mcq"),
+                self.chapter_content,
+                total_count=self.POOL_TARGET - len(known_questions),
+                exclude=known_questions,
+            )
+            async for mcq in stream:
+                item = add_quiz_item(
+                    self.app,
+                    self.book_id,
+                    self.toc_address,
+                    self.content_hash,
+                    mcq.model_dump_json(),
+                )
+                if not self._submitted and len(self._session) < self.QUIZ_SIZE:
+                    await self._add_question(item.id, mcq)
+        except Exception as e:
+            self.notify(f"Could not generate questions: {e}", severity="error")
+        finally:
+            self.generating_indicator.display = False
+
+    @on(Button.Pressed, "#quiz_submit")
+    def on_submit(self, event: Button.Pressed) -> None:
+        event.stop()
+        if self._submitted or not self._session:
+            return
+        self._submitted = True
+        answers = []
+        correct_count = 0
+        for item_id, widget in self._session:
+            assert widget.mcq is not None
+            chosen = widget.selected_answers()
+            correct = widget.mcq.is_correct(chosen)
+            correct_count += int(correct)
+            widget.show_result(correct)
+            answers.append((item_id, chosen, correct))
+        record_quiz_answers(self.app, answers)
+        self.query_one("#quiz_score", Label).update(
+            f"Score: {correct_count}/{len(self._session)}"
+        )
+
+    @on(Button.Pressed, "#quiz_new")
+    async def on_new_quiz(self, event: Button.Pressed) -> None:
+        event.stop()
+        pool = load_quiz_pool(
+            self.app, self.book_id, self.toc_address, self.content_hash
+        )
+        await self._start_session(pool)
+
+    @on(Button.Pressed, "#quiz_back")
+    def on_back(self, event: Button.Pressed) -> None:
+        event.stop()
+        self.action_close()
+
+    def action_close(self) -> None:
+        self.app.pop_screen()
@@ -0,0 +1,143 @@
+from __future__ import annotations
+import time
+from typing import Callable, List, Optional
+
+from textual import on
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Horizontal, VerticalScroll
+from textual.screen import Screen
+from textual.widgets import Button, DataTable, Footer, Header, Label, Select
+
+from nohow.db.models import load_llm_calls
+from nohow.llm.telemetry import LLMCallRecord, summarize
+
+QUANTILES = (50, 90, 99)
+
+PERIODS = [
+    ("Last hour", 3600.0),
+    ("Last day", 86400.0),
+    ("Last week", 7 * 86400.0),
+    ("All time", 0.0),
+]
+
+
+def _fmt_seconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.2f}s"
+
+
+def _fmt_rate(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+class StatsScreen(Screen):
+    """Latency percentiles of the recorded LLM calls, by model and by feature."""
+
+    DEFAULT_CSS = """
+    StatsScreen {
+        align: center top;
+    }
+    #stats_controls {
+        height: auto;
+        margin: 1 2;
+    }
+    #stats_period {
+        width: 30;
+    }
+    .stats_title {
+        margin: 1 2 0 2;
+        text-style: bold;
+    }
+    StatsScreen DataTable {
+        height: auto;
+        margin: 0 2;
+    }
+    """
+
+    BINDINGS = [
+        Binding("escape", "close", "Back"),
+        ("r", "refresh_stats", "Refresh"),
+    ]
+
+    def compose(self) -> ComposeResult:
+        yield Header()
+        with Horizontal(id="stats_controls"):
+            yield Select(
+                [(label, seconds) for label, seconds in PERIODS],
+                value=PERIODS[1][1],
+                allow_blank=False,
+                id="stats_period",
+            )
+            yield Button("Back", id="stats_back", compact=True)
+        with VerticalScroll():
+            yield Label("By request kind", classes="stats_title")
+            yield DataTable(id="stats_by_kind", cursor_type="row")
+            yield Label("By model", classes="stats_title")
+            yield DataTable(id="stats_by_model", cursor_type="row")
+        yield Footer()
+
+    def on_mount(self) -> None:
+        self.action_refresh_stats()
+
+    def _load(self) -> List[LLMCallRecord]:
+        window = self.query_one("#stats_period", Select).value
+        since = time.time() - window if window else 0.0
+        return load_llm_calls(self.app, since=since)
+
+    def _fill(
+        self,
+        table: DataTable,
+        records: List[LLMCallRecord],
+        key: Callable[[LLMCallRecord], str],
+        group_label: str,
+    ) -> None:
+        table.clear(columns=True)
+        table.add_column(group_label)
+        table.add_column("Calls")
+        table.add_column("Errors")
+        for q in QUANTILES:
+            table.add_column(f"TTFT p{q}")
+        for q in QUANTILES:
+            table.add_column(f"Total p{q}")
+        table.add_column("Tok/s p50")
+        table.add_column("Avg in/out")
+        table.add_column("Cost")
+        for s in summarize(records, key, QUANTILES):
+            table.add_row(
+                s.group,
+                str(s.count),
+                str(s.errors),
+                *(_fmt_seconds(s.ttft[q]) for q in QUANTILES),
+                *(_fmt_seconds(s.duration[q]) for q in QUANTILES),
+                _fmt_rate(s.tokens_per_sec[50]),
+                f"{s.avg_prompt_tokens:.0f}/{s.avg_completion_tokens:.0f}",
+                "-" if s.total_cost is None else f"${s.total_cost:.4f}",
+            )
+
+    def action_refresh_stats(self) -> None:
+        records = self._load()
+        self._fill(
+            self.query_one("#stats_by_kind", DataTable),
+            records,
+            lambda r: r.request_kind,
+            "Kind",
+        )
+        self._fill(
+            self.query_one("#stats_by_model", DataTable),
+            records,
+            lambda r: r.model,
+            "Model",
+        )
+
+    @on(Select.Changed, "#stats_period")
+    def on_period_changed(self, event: Select.Changed) -> None:
+        event.stop()
+        self.action_refresh_stats()
+
+    @on(Button.Pressed, "#stats_back")
+    def on_back(self, event: Button.Pressed) -> None:
+        event.stop()
+        self.action_close()
+
+    def action_close(self) -> None:
+        self.app.pop_screen()
@@ -2,14 +2,26 @@ from __future__ import annotations
 import json
 from nohow.mkdutils import extract_toc_tree
 
+from sqlalchemy.exc import SQLAlchemyError
+from textual import on, work
 from textual.app import ComposeResult
 from textual.containers import Horizontal
 from textual.reactive import reactive
 from textual.screen import Screen
 from textual.widget import Widget
-from textual.widgets import Button, Footer, Header, Input, Static, TextArea
+from textual.widgets import (
+    Button,
+    Footer,
+    Header,
+    Input,
+    Label,
+    ListItem,
+    ListView,
+    Static,
+    TextArea,
+)
 
-from nohow.db.models import Book
+from nohow.db.models import Book, delete_source_document, list_source_documents
 from nohow.db.utils import get_session, setup_database
 
 
@@ -74,6 +86,110 @@ class BookEditWidget(Widget):
             pass
 
 
+class SourcesWidget(Widget):
+    """Source documents attached to a book, used to ground its chapters."""
+
+    DEFAULT_CSS = """
+    SourcesWidget {
+        border: solid $secondary;
+        padding: 0 1;
+        height: 12;
+    }
+    SourcesWidget > ListView {
+        height: 1fr;
+    }
+    SourcesWidget > Horizontal {
+        height: auto;
+    }
+    SourcesWidget Input {
+        width: 1fr;
+    }
+    """
+
+    def __init__(self, book_id: int, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.book_id = book_id
+        self._document_ids: list[int] = []
+
+    def compose(self) -> ComposeResult:
+        yield Static("Source documents (text / Markdown):")
+        yield ListView(id="sources_list")
+        with Horizontal():
+            yield Input(placeholder="Path to a .txt or .md file...", id="source_path")
+            yield Button("Attach", id="source_attach", compact=True)
+            yield Button("Detach", id="source_detach", compact=True)
+            yield Button("Re-index", id="source_reindex", compact=True)
+
+    def on_mount(self) -> None:
+        self.refresh_documents()
+
+    def refresh_documents(self) -> None:
+        documents = list_source_documents(self.app, self.book_id)
+        self._document_ids = [d.id for d in documents]
+        listing = self.query_one("#sources_list", ListView)
+        listing.clear()
+        listing.extend(
+            ListItem(Label(f"{d.path}  ({d.passage_count} passages)"))
+            for d in documents
+        )
+
+    @on(Button.Pressed, "#source_attach")
+    def on_attach(self, event: Button.Pressed) -> None:
+        event.stop()
+        path = self.query_one("#source_path", Input).value.strip()
+        if path:
+            self.attach(path)
+
+    @on(Button.Pressed, "#source_detach")
+    def on_detach(self, event: Button.Pressed) -> None:
+        event.stop()
+        index = self.query_one("#sources_list", ListView).index
+        if index is None or index >= len(self._document_ids):
+            return
+        delete_source_document(self.app, self._document_ids[index])
+        self.refresh_documents()
+
+    @on(Button.Pressed, "#source_reindex")
+    def on_reindex(self, event: Button.Pressed) -> None:
+        event.stop()
+        self.reindex()
+
+    @work(thread=True, group="source_indexing")
+    def attach(self, path: str) -> None:
+        library = self.app.app_context.source_library
+        self.app.call_from_thread(self.notify, f"Indexing {path}...")
+        try:
+            document = library.attach(self.app, self.book_id, path)
+        except (OSError, UnicodeError, SQLAlchemyError) as e:
+            self.app.call_from_thread(
+                self.notify, f"Could not attach {path}: {e}", severity="error"
+            )
+            return
+        self.app.call_from_thread(
+            self.notify, f"Indexed {document.passage_count} passages"
+        )
+        self.app.call_from_thread(self._attached)
+
+    def _attached(self) -> None:
+        self.refresh_documents()
+        self.query_one("#source_path", Input).clear()
+
+    @work(thread=True, group="source_indexing")
+    def reindex(self) -> None:
+        library = self.app.app_context.source_library
+        try:
+            changed = library.sync(self.app, self.book_id)
+        except (OSError, UnicodeError, SQLAlchemyError) as e:
+            self.app.call_from_thread(
+                self.notify, f"Could not re-index: {e}", severity="error"
+            )
+            return
+        self.app.call_from_thread(
+            self.notify, f"{changed} changed document(s) re-indexed"
+        )
+        self.app.call_from_thread(self.refresh_documents)
+
+
 class TOCEditScreen(Screen):
 
     DEFAULT_CSS = """
@@ -98,6 +214,7 @@ class TOCEditScreen(Screen):
     def compose(self) -> ComposeResult:
         yield Header()
         yield BookEditWidget(id="book_edit", book_title=self.initial_title)
+        yield SourcesWidget(self.book_id, id="book_sources")
         yield Footer()
 
     def on_mount(self) -> None:
@@ -1,18 +1,37 @@
 from textual.binding import Binding
 from textual import on
-from typing import List
+from typing import Callable, Dict, List
 import json
 from nohow.mkdutils import TocTreeNode
 from textual.screen import Screen
+from textual.widget import Widget
 
-from textual.widgets import Footer, Header, TextArea, Static, ContentSwitcher, Button
+from textual.widgets import (
+    Footer,
+    Header,
+    TextArea,
+    Static,
+    ContentSwitcher,
+    Button,
+)
 
-from nohow.db.models import Book, Convo, Chapter, create_conversation
+from nohow.db.models import (
+    Book,
+    create_conversation,
+    list_conversations,
+    load_chapter_content,
+    load_chapter_summaries,
+    load_convo_content,
+)
+from nohow.prompts.book_plan import BookGenerator, BookPlan, BookPlanConfig
+from nohow.prompts.summary import ChapterSummaryGen, summary_from_row
 from nohow.db.utils import get_session, setup_database
 from nohow.textual_comp.screens.tocedit import BookEditWidget
 from textual.containers import Horizontal
+from nohow.textual_comp.screens.confirm import ConfirmScreen
 
 from nohow.textual_comp.widgets.chapter_view import ChapterView
+from nohow.textual_comp.widgets.panes import PaneLRU, PaneState, ReaderConfig
 from nohow.textual_comp.widgets.chatflow import (
     ChatFlowWidget,
     ChatList,
@@ -45,6 +64,7 @@ class TOCReaderScreen(Screen):
     """
     BINDINGS = [
         Binding("ctrl+e", "book_list", "Book List"),
+        Binding("ctrl+g", "generate_book", "Generate Book"),
     ]
 
     def __init__(self, book_id: int, **kwargs) -> None:
@@ -52,6 +72,11 @@ class TOCReaderScreen(Screen):
         self.book_id = book_id
         self.book: Book | None = None
         self.w_contentswitcher: ContentSwitcher | None = None
+        # TOC nodes by chapter pane id
+        self._toc_nodes: Dict[str, TocTreeNode] = {}
+        self._panes: PaneLRU | None = None
+        # scroll position and draft of the unmounted panes
+        self._pane_states: Dict[str, PaneState] = {}
 
     def compose(self):
         yield Header()
@@ -63,71 +88,102 @@ class TOCReaderScreen(Screen):
         yield Footer()
 
     @on(ChatList.ChatOpened)
-    def on_chat_select(self, event: ChatList.ChatOpened) -> None:
-        assert isinstance(self.w_contentswitcher, ContentSwitcher)
-
-        if event.item.is_title:
-            toc_index = event.item.toc_index
-            convo_id = f"convo_{toc_index.replace('.', '_')}"
-            self.w_contentswitcher.current = convo_id
-        else:
-            convo_id = (
-                f"convo_{event.item.toc_index.replace('.', '_')}{event.item.chat_id}"
-            )
-            self.w_contentswitcher.current = convo_id
+    async def on_chat_select(self, event: ChatList.ChatOpened) -> None:
+        item = event.item
+        await self._show_pane(self._pane_id(item), lambda: self._create_pane(item))
 
     def on_mount(self) -> None:
         self.run_worker(self._refresh_from_db(), exclusive=True)
 
     async def _refresh_from_db(self) -> None:
-
+        # panes are created when first opened (see _show_pane), only the TOC
+        # and the conversation ids are loaded here
         with get_session(self.app.get_db()) as session:
             book = session.query(Book).filter_by(id=self.book_id).one()
-            all_chapters: List[Chapter] = list(book.chapter_contents)
-            all_convo: List[Convo] = list(book.conversations)
             self.book = book
+        toc_tree = TocTreeNode.from_json(json.loads(book.toc_tree))
+        self._toc_nodes = {
+            self._chapter_pane_id(node.level, node.conversation_key()): node
+            for node in toc_tree.preorder()
+        }
         # loading the chat list
         chat_list = self.query_one("#chat_list", ChatList)
         chat_list.current_book = book
-        chat_list.all_convo = all_convo
+        chat_list.all_convo = list_conversations(self.app, self.book_id)
+        chat_list.summaries = {
+            row.toc_address: summary_from_row(row)
+            for row in load_chapter_summaries(self.app, self.book_id)
+        }
         chat_list.load_conversation_list_items()
 
-        # loading the content switch with chat areas
-        assert isinstance(self.w_contentswitcher, ContentSwitcher)
-        # one chat per TOC Node identified by the toc Address
-        toc_tree = TocTreeNode.from_json(json.loads(book.toc_tree))
-        for node in toc_tree.preorder():
-            # add a chat area for this node
-            assert isinstance(node, TocTreeNode)
-            convo_key = node.conversation_key()
-            # find if there is a chapter content for this node
-            chapter_contents = [c for c in all_chapters if c.toc_address == convo_key]
-
-            chat_widget = ChapterView(
-                book=book,
-                tocnode=node,
-                toc_address=convo_key,
-                chapter_content=chapter_contents[0].content if chapter_contents else "",
-            )
-            self.w_contentswitcher.add_content(chat_widget, id=chat_widget.widget_id)
-        for convo in all_convo:
-            assert isinstance(convo.toc_address, str)
-            # conversation are identified by their toc_address and inner numbering
-            chat_widget = ChatFlowWidget(
-                book=book,
-                toc_address=convo.toc_address,
-                convo_id=convo.id,
-                convo_content=convo.content or "",
+    @staticmethod
+    def _chapter_pane_id(level: int, toc_address: str) -> str:
+        # same ids as ChapterView.widget_id
+        if level == 0:
+            return "convo_root"
+        return f"convo_{toc_address.replace('.', '_')}"
+
+    def _pane_id(self, item: ChatListItem) -> str:
+        if item.is_title:
+            return self._chapter_pane_id(item.level, item.toc_index)
+        # same ids as ChatFlowWidget.widget_id
+        return f"chat_{item.toc_index.replace('.', '_')}_{item.chat_id}"
+
+    def _create_pane(self, item: ChatListItem) -> Widget:
+        assert self.book is not None
+        if item.is_title:
+            return ChapterView(
+                book=self.book,
+                tocnode=self._toc_nodes[self._pane_id(item)],
+                toc_address=item.toc_index,
+                chapter_content=load_chapter_content(
+                    self.app, self.book_id, item.toc_index
+                ),
             )
-            widget_id = chat_widget.widget_id
-            self.w_contentswitcher.add_content(chat_widget, id=widget_id)
+        return ChatFlowWidget(
+            book=self.book,
+            toc_address=item.toc_index,
+            convo_id=int(item.chat_id),
+            convo_content=load_convo_content(self.app, int(item.chat_id)),
+        )
+
+    def _live_panes(self) -> PaneLRU:
+        if self._panes is None:
+            config = ReaderConfig.from_config(self.app.app_context.reader)
+            self._panes = PaneLRU(config.live_panes)
+        return self._panes
+
+    async def _show_pane(self, pane_id: str, create: Callable[[], Widget]) -> Widget:
+        """Show a pane, mounting it if needed and unmounting the least
+        recently viewed ones beyond `reader.live_panes`."""
+        assert isinstance(self.w_contentswitcher, ContentSwitcher)
+        switcher = self.w_contentswitcher
+        panes = self._live_panes()
+        if pane_id in panes:
+            pane = switcher.get_child_by_id(pane_id)
+        else:
+            pane = create()
+            state = self._pane_states.pop(pane_id, None)
+            if state is not None:
+                pane.restore_state(state)
+            await switcher.add_content(pane, id=pane_id)
+        switcher.current = pane_id
+        panes.touch(pane_id)
+
+        def is_busy(other_id: str) -> bool:
+            return switcher.get_child_by_id(other_id).is_busy
+
+        for evicted_id in panes.to_evict(is_busy):
+            evicted = switcher.get_child_by_id(evicted_id)
+            self._pane_states[evicted_id] = evicted.save_state()
+            await evicted.remove()
+        return pane
 
     @on(ChapterView.StartConversation)
     async def start_conversation(self, event: ChapterView.StartConversation) -> None:
         sender: ChapterView = event.sender
         new_convo = create_conversation(self.app, sender.book.id, sender.toc_address)
 
-        chat_area_switcher = self.query_one("#chat_area_switcher", ContentSwitcher)
         chat_list = self.query_one("#chat_list", ChatList)
         chat_widget = ChatFlowWidget(
             book=self.book,
@@ -136,14 +192,82 @@ class TOCReaderScreen(Screen):
             convo_content=new_convo.content,
         )
         chat_widget.chapter_content = sender.chapter_content
-        widget_id = chat_widget.widget_id
-        await chat_area_switcher.add_content(chat_widget, id=widget_id)
+        await self._show_pane(chat_widget.widget_id, lambda: chat_widget)
         await chat_list.insert_chat_list_item(
             convo=new_convo, toc_address=sender.toc_address
         )
 
         await chat_widget.chat_started(new_convo)
 
+    @on(ChapterView.SummaryUpdated)
+    def on_summary_updated(self, event: ChapterView.SummaryUpdated) -> None:
+        self.query_one("#chat_list", ChatList).set_summary(
+            event.toc_address, event.summary
+        )
+
+    def action_generate_book(self) -> None:
+        """Generate the missing chapters, in dependency order and in parallel."""
+        if self.book is None or not self.book.toc_tree:
+            return
+        plan = BookPlan.from_toc(TocTreeNode.from_json(json.loads(self.book.toc_tree)))
+        generator = BookGenerator(
+            self.app,
+            self.book,
+            plan,
+            chapter_length=self._book_plan_config().chapter_length,
+            on_chapter=self._chapter_generated,
+        )
+        missing = generator.missing()
+        if not missing:
+            self.notify("Every chapter is already written.")
+            return
+
+        question = f"Generate {len(missing)} missing chapters?"
+        stale = generator.stale_summaries()
+        if stale:
+            question += (
+                f"\n\n{len(stale)} written chapters they build on will be "
+                "summarized first."
+            )
+
+        def start(confirmed: bool | None) -> None:
+            if confirmed:
+                self.run_worker(
+                    self._generate_book(generator, len(missing)),
+                    group="book_generation",
+                    exclusive=True,
+                )
+
+        self.app.push_screen(
+            ConfirmScreen(
+                f"{question}\n\n{plan.report().describe()}",
+                yes_label="Generate",
+                no_label="Cancel",
+            ),
+            start,
+        )
+
+    def _book_plan_config(self) -> BookPlanConfig:
+        return BookPlanConfig.from_config(self.app.app_context.book_plan)
+
+    async def _generate_book(self, generator: BookGenerator, missing: int) -> None:
+        self.notify(f"Generating {missing} chapters...")
+        run = await generator.run(self._book_plan_config().max_concurrency)
+        self.notify(
+            run.describe(), severity="warning" if run.failed else "information"
+        )
+
+    def _chapter_generated(
+        self, toc_address: str, content: str, summary: ChapterSummaryGen | None
+    ) -> None:
+        for view in self.query(ChapterView):
+            # the synthetic TOC root shares its address with the first chapter
+            if view.toc_address != toc_address or view.tocnode.level == 0:
+                continue
+            view.show_chapter(content)
+        if summary is not None:
+            self.query_one("#chat_list", ChatList).set_summary(toc_address, summary)
+
     def action_book_list(self) -> None:
         """Action to go back to the book list screen."""
         self.app.pop_screen()
@@ -1,7 +1,9 @@
 from __future__ import annotations
+import asyncio
 from textual import on
 from regex import W
-from typing import List
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 
 from textual.containers import VerticalScroll, Grid, Horizontal
 from textual.css.query import NoMatches
@@ -9,7 +11,7 @@ from textual.message import Message
 from textual.reactive import reactive
 from textual.widget import Widget
 from textual.widgets import Button, Static, Input, ListView, ListItem, Label
-from nohow.db.models import Book
+from nohow.db.models import Book, book_list_version, list_book_titles
 from nohow.db.utils import get_session
 from textual.events import Click, DescendantFocus, DescendantBlur
 
@@ -142,6 +144,49 @@ class AddBookElement(Widget):
         yield Button("Add", id="add_book_button", variant="primary")
 
 
+@dataclass(frozen=True, slots=True)
+class BookListDiff:
+    changed: List[int]  # new or modified books, in display order
+    removed: List[int]
+
+
+class BookListModel:
+    """Ids and titles of the books, most recently updated first.
+
+    `refresh` compares `book_list_version` with the one it last saw and
+    only loads the books updated since then, so a refresh without changes
+    is a single aggregate query.
+    """
+
+    def __init__(self) -> None:
+        self.order: List[int] = []
+        self.titles: Dict[int, str] = {}
+        self.version: Optional[Tuple[int, float]] = None
+
+    def refresh(self, app) -> Optional[BookListDiff]:
+        """Load the changes since the last call; None if there are none."""
+        version = book_list_version(app)
+        if version == self.version:
+            return None
+        since = self.version[1] if self.version is not None else None
+        rows = list_book_titles(app, updated_since=since)
+        changed = [book_id for book_id, _, _ in rows]
+        for book_id, title, _ in rows:
+            self.titles[book_id] = title
+        moved = set(changed)
+        self.order = changed + [b for b in self.order if b not in moved]
+        removed: List[int] = []
+        if len(self.order) != version[0]:
+            # books were deleted, only their absence tells
+            existing = {book_id for book_id, _, _ in list_book_titles(app)}
+            removed = [b for b in self.order if b not in existing]
+            self.order = [b for b in self.order if b in existing]
+            for book_id in removed:
+                del self.titles[book_id]
+        self.version = version
+        return BookListDiff(changed, removed)
+
+
 class BooksView(Widget, can_focus=False):
     """Unfocusable container holding a scrollable vertical list of books."""
 
@@ -167,37 +212,100 @@ class BooksView(Widget, can_focus=False):
     
     """
 
+    # books mounted at first, and each time the end of the list is reached
+    PAGE_SIZE = 50
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.books = BookListModel()
+        # mounted elements: always the first books of `books.order`
+        self._elements: Dict[int, BookElement] = {}
+        # refreshes and pages are applied one at a time, never cancelled
+        self._lock = asyncio.Lock()
+
     def compose(self):
 
         yield VerticalScroll(id="book_list_view")
         yield AddBookElement(id="add_book_element")
 
-    async def set_books(self, books: List[Book]) -> None:
-        """Receive the current list of books from the DB and populate the List."""
-        # scroll = self.query_one("#books_scroll", VerticalScroll)
+    def on_mount(self) -> None:
         grid = self.query_one("#book_list_view", VerticalScroll)
-        await grid.remove_children("*")
+        self.watch(grid, "scroll_y", self._list_scrolled, init=False)
 
-        # Normalize incoming books into (id, title) pairs.
-        items: list[tuple[int | None, str]] = []
-        for book in books:
+    async def refresh_books(self) -> None:
+        """Apply the changes made to the books since the last refresh.
 
-            book_id = int(book.id)
-            title = str(book.title)
+        Changed books move to the top; the other elements stay mounted.
+        """
+        async with self._lock:
+            diff = self.books.refresh(self.app)
+            if diff is not None:
+                await self._apply(diff)
 
-            await grid.mount(BookElement(book_title=title, book_id=book_id))
+    async def _apply(self, diff: BookListDiff) -> None:
+        grid = self.query_one("#book_list_view", VerticalScroll)
+        removed = [self._elements.pop(b) for b in diff.removed if b in self._elements]
+        changed = diff.changed
+        shown = max(self.PAGE_SIZE, len(self._elements))
+        if len(changed) > shown:
+            # the unchanged elements are pushed past the first page
+            changed = changed[:shown]
+            keep = set(changed)
+            removed += [e for b, e in self._elements.items() if b not in keep]
+            self._elements = {b: e for b, e in self._elements.items() if b in keep}
+        if removed:
+            await grid.remove_children(removed)
+
+        appended: List[BookElement] = []
+        for position, book_id in enumerate(changed):
+            title = self.books.titles[book_id]
+            element = self._elements.get(book_id)
+            if element is None:
+                element = BookElement(book_title=title, book_id=book_id)
+                self._elements[book_id] = element
+                if position >= len(grid.children):
+                    appended.append(element)
+                else:
+                    await grid.mount(element, before=position)
+                continue
+            if appended:
+                await grid.mount_all(appended)
+                appended = []
+            element.book_title = title
+            if grid.children.index(element) != position:
+                grid.move_child(element, before=position)
+        if appended:
+            await grid.mount_all(appended)
+
+    def _near_end(self) -> bool:
+        grid = self.query_one("#book_list_view", VerticalScroll)
+        if len(self._elements) >= len(self.books.order):
+            return False
+        return grid.scroll_y >= grid.max_scroll_y - grid.size.height
+
+    def _list_scrolled(self) -> None:
+        if self._near_end() and not self._lock.locked():
+            self.run_worker(self._show_more(), group="book_pages")
+
+    async def _show_more(self) -> None:
+        """Mount the next page of books at the end of the list."""
+        async with self._lock:
+            if not self._near_end():
+                return
+            start = len(self._elements)
+            page = [
+                BookElement(book_title=self.books.titles[book_id], book_id=book_id)
+                for book_id in self.books.order[start : start + self.PAGE_SIZE]
+            ]
+            for element in page:
+                self._elements[element.book_id] = element
+            grid = self.query_one("#book_list_view", VerticalScroll)
+            await grid.mount_all(page)
 
     async def add_book(self, book: Book) -> BookElement:
-        """Insert a new book at the start of the list by rebuilding the grid.
-
-        We collect existing book titles and rebuild the grid so the layout rules
-        (3 columns, at least 2 rows) are preserved. This keeps logic simple and
-        consistent across different numbers of books.
-        """
-        grid = self.query_one("#book_list_view", VerticalScroll)
-        be = BookElement(book_title=book.title, book_id=book.id)
-        await grid.mount(be)
-        return be
+        """Show a book just created, at the start of the list."""
+        await self.refresh_books()
+        return self._elements[book.id]
 
     @on(Button.Pressed, "#add_book_button")
     def on_button_pressed(self, event: Button.Pressed) -> None:
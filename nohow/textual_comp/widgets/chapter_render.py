@@ -0,0 +1,635 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import io
+import json
+import os
+import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import accumulate
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+
+from markdown_it.token import Token
+from rich.console import Console
+from rich.markdown import Markdown as RichMarkdown
+from rich.segment import Segment
+from rich.style import Style
+from rich.theme import Theme
+from textual.app import App
+from textual.color import Color
+from textual.events import Click
+from textual.geometry import Size
+from textual.message import Message
+from textual.scroll_view import ScrollView
+from textual.selection import Selection
+from textual.strip import Strip
+
+from nohow.retrieval.index import content_hash
+from nohow.textual_comp.widgets.md_render import parse_markdown
+from nohow.textual_comp.widgets.panes import ReaderConfig
+
+# version of the lines kept on disk, part of their file names
+_FORMAT = 2
+
+
+@dataclass(frozen=True, slots=True)
+class RenderKey:
+    """What the lines of a rendered chapter depend on."""
+
+    content_hash: str
+    theme: str
+    width: int
+
+    @property
+    def filename(self) -> str:
+        theme = re.sub(r"[^\w.-]", "_", self.theme)
+        return f"{self.content_hash}-{theme}-{self.width}.v{_FORMAT}.json.gz"
+
+
+@dataclass(frozen=True)
+class ChapterStyle:
+    """Styles of a rendered chapter, derived from the app theme."""
+
+    name: str
+    theme: Theme
+    code_theme: str
+
+    @classmethod
+    def from_app(cls, app: App) -> "ChapterStyle":
+        variables = app.theme_variables
+        background = Color.parse(variables.get("background", "black"))
+
+        def color(name: str, default: str) -> str:
+            # blended over the background: variables may be translucent
+            value = variables.get(name, default)
+            try:
+                return (background + Color.parse(value)).hex
+            except Exception:
+                return (background + Color.parse(default)).hex
+
+        primary = color("primary", "blue")
+        accent = color("accent", "yellow")
+        muted = color("foreground-muted", "grey50")
+        styles = {
+            "markdown.h1.border": primary,
+            "markdown.code": f"bold {accent}",
+            "markdown.block_quote": f"italic {muted}",
+            "markdown.link": accent,
+            "markdown.link_url": f"underline {accent}",
+            "markdown.item.bullet": f"bold {primary}",
+            "markdown.item.number": f"bold {primary}",
+            "markdown.hr": primary,
+            "markdown.table.border": primary,
+            "markdown.table.header": f"bold {primary}",
+        }
+        for level in range(1, 7):
+            text_style = variables.get(f"markdown-h{level}-text-style", "bold")
+            if text_style == "none":
+                text_style = ""
+            heading_color = color(f"markdown-h{level}-color", primary)
+            styles[f"markdown.h{level}"] = f"{text_style} {heading_color}".strip()
+        dark = app.current_theme.dark
+        return cls(
+            name=app.theme,
+            theme=Theme(styles, inherit=True),
+            code_theme="monokai" if dark else "default",
+        )
+
+
+def render_chapter(markdown: str, width: int, style: ChapterStyle) -> List[Strip]:
+    """Lines of a chapter rendered at `width` cells."""
+    console = Console(
+        width=width,
+        color_system="truecolor",
+        force_terminal=True,
+        theme=style.theme,
+        file=io.StringIO(),
+    )
+    document = RichMarkdown(markdown, code_theme=style.code_theme)
+    lines = console.render_lines(
+        document, console.options.update_width(width), new_lines=False
+    )
+    return [Strip(line, width) for line in lines]
+
+
+def split_blocks(markdown: str, tokens: List[Token]) -> List[str]:
+    """Sources of the top-level blocks of a chapter, from its parsed tokens."""
+    lines = markdown.splitlines()
+    starts = [
+        token.map[0]
+        for token in tokens
+        if token.level == 0 and token.map and token.nesting >= 0
+    ]
+    if not starts:
+        return []
+    starts[0] = 0
+    ends = starts[1:] + [len(lines)]
+    return ["\n".join(lines[start:end]).rstrip() for start, end in zip(starts, ends)]
+
+
+def estimate_height(source: str, width: int) -> int:
+    """Lines a block is expected to take before it is rendered."""
+    return sum(max(1, -(-len(line) // width)) for line in source.splitlines())
+
+
+class ChapterBlocks:
+    """A long chapter rendered block by block, as it is scrolled.
+
+    Blocks not rendered yet count for an estimate of their height, replaced
+    by the real one when they are rendered. Only the lines of the most
+    recently rendered blocks are kept (`keep_lines`), so the memory used
+    does not grow with the chapter. Blocks are separated by a blank line.
+    """
+
+    def __init__(
+        self,
+        sources: List[str],
+        width: int,
+        style: ChapterStyle,
+        keep_lines: int = 2000,
+    ) -> None:
+        self.sources = sources
+        self.width = width
+        self.style = style
+        self.keep_lines = keep_lines
+        self.heights = [
+            estimate_height(source, width) + (1 if index else 0)
+            for index, source in enumerate(sources)
+        ]
+        self._offsets: Optional[List[int]] = None
+        self._rendered: OrderedDict[int, List[Strip]] = OrderedDict()
+        self._kept = 0
+        self.pending: Set[int] = set()  # being rendered in a thread
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    @property
+    def offsets(self) -> List[int]:
+        # computed again once the blocks rendered since are measured
+        if self._offsets is None:
+            self._offsets = list(accumulate(self.heights, initial=0))
+        return self._offsets
+
+    @property
+    def height(self) -> int:
+        return self.offsets[-1]
+
+    def offset(self, index: int) -> int:
+        """First line of a block."""
+        return self.offsets[index]
+
+    def locate(self, y: int) -> Tuple[int, int]:
+        """The block at line `y` and the line in that block."""
+        offsets = self.offsets
+        index = min(max(bisect_right(offsets, y) - 1, 0), len(self) - 1)
+        return index, y - offsets[index]
+
+    def is_rendered(self, index: int) -> bool:
+        return index in self._rendered
+
+    def render_block(self, index: int) -> List[Strip]:
+        """The lines of a block; safe to call from a thread."""
+        lines = render_chapter(self.sources[index], self.width, self.style)
+        if index:
+            lines.insert(0, Strip.blank(self.width))
+        return lines
+
+    def add(self, index: int, lines: List[Strip]) -> int:
+        """Keep the lines of a rendered block; how much it grew."""
+        if index in self._rendered:
+            self._kept -= len(self._rendered.pop(index))
+        self._rendered[index] = lines
+        self._kept += len(lines)
+        while self._kept > self.keep_lines and len(self._rendered) > 1:
+            _, dropped = self._rendered.popitem(last=False)
+            self._kept -= len(dropped)
+        growth = len(lines) - self.heights[index]
+        if growth:
+            self.heights[index] = len(lines)
+            self._offsets = None
+        return growth
+
+    def render(self, index: int) -> int:
+        """Render a block unless its lines are kept; how much it grew."""
+        if index in self._rendered:
+            self._rendered.move_to_end(index)
+            return 0
+        return self.add(index, self.render_block(index))
+
+    def line(self, y: int) -> Optional[Strip]:
+        """Line `y` of the chapter, None if its block is not rendered."""
+        if not self.sources:
+            return None
+        index, row = self.locate(y)
+        lines = self._rendered.get(index)
+        if lines is None or not 0 <= row < len(lines):
+            return None
+        return lines[row]
+
+    def text(self, y: int) -> Optional[str]:
+        """Text of line `y`, for a selection.
+
+        A block that is not rendered gives its source on its first line,
+        and nothing on the others.
+        """
+        if not self.sources:
+            return None
+        strip = self.line(y)
+        if strip is not None:
+            return strip.text
+        index, row = self.locate(y)
+        return self.sources[index] if row == 0 else None
+
+
+def _dump_segment(segment: Segment) -> list:
+    style = segment.style
+    if style is None:
+        return [segment.text, ""]
+    if style.link:
+        # urls are not valid in style definitions
+        return [segment.text, str(style.clear_meta_and_links()), style.link]
+    return [segment.text, str(style)]
+
+
+def _load_segment(text: str, style: str, link: str = "") -> Segment:
+    if not style:
+        return Segment(text)
+    if link:
+        return Segment(text, Style.parse(style) + Style(link=link))
+    return Segment(text, Style.parse(style))
+
+
+def _dump_lines(lines: List[Strip]) -> list:
+    return [[_dump_segment(segment) for segment in line] for line in lines]
+
+
+def _load_lines(data: list, width: int) -> List[Strip]:
+    return [
+        Strip([_load_segment(*segment) for segment in line], width) for line in data
+    ]
+
+
+class ChapterRenderCache:
+    """Rendered chapters by content, theme and width.
+
+    The most recently used ones are kept in memory and, when a directory
+    is given, every rendering is also written there (gzipped JSON, the
+    least recently used files deleted beyond `disk_entries`), so reopening
+    a book after a restart does not render its chapters again. Used from
+    the render threads.
+
+    Chapters of `virtualize_from` characters or more are not rendered
+    whole but as `ChapterBlocks`, kept in memory only.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 32,
+        directory: Optional[Path] = None,
+        disk_entries: int = 256,
+        virtualize_from: int = 30000,
+    ) -> None:
+        self.capacity = max(1, capacity)
+        self.directory = directory
+        self.disk_entries = disk_entries
+        self.virtualize_from = virtualize_from
+        self._lines: OrderedDict[RenderKey, List[Strip]] = OrderedDict()
+        self._blocks: OrderedDict[RenderKey, ChapterBlocks] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: ReaderConfig, directory: Path) -> "ChapterRenderCache":
+        return cls(
+            capacity=config.render_cache,
+            directory=directory if config.render_cache_on_disk else None,
+            virtualize_from=config.virtualize_from,
+        )
+
+    def blocks(self, key: RenderKey) -> Optional[ChapterBlocks]:
+        """The blocks of a long chapter shown before, with what they measured."""
+        blocks = self._blocks.get(key)
+        if blocks is not None:
+            self._blocks.move_to_end(key)
+        return blocks
+
+    def put_blocks(self, key: RenderKey, blocks: ChapterBlocks) -> None:
+        self._blocks[key] = blocks
+        self._blocks.move_to_end(key)
+        while len(self._blocks) > self.capacity:
+            self._blocks.popitem(last=False)
+
+    def cached(self, key: RenderKey) -> Optional[List[Strip]]:
+        """The lines kept in memory, without reading the disk."""
+        with self._lock:
+            lines = self._lines.get(key)
+            if lines is not None:
+                self._lines.move_to_end(key)
+            return lines
+
+    def _remember(self, key: RenderKey, lines: List[Strip]) -> None:
+        with self._lock:
+            self._lines[key] = lines
+            self._lines.move_to_end(key)
+            while len(self._lines) > self.capacity:
+                self._lines.popitem(last=False)
+
+    def get(self, key: RenderKey) -> Optional[List[Strip]]:
+        lines = self.cached(key)
+        if lines is not None or self.directory is None:
+            return lines
+        path = self.directory / key.filename
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                lines = _load_lines(json.load(f), key.width)
+            os.utime(path)  # most recently used
+        except (OSError, ValueError):
+            return None
+        self._remember(key, lines)
+        return lines
+
+    def put(self, key: RenderKey, lines: List[Strip]) -> None:
+        self._remember(key, lines)
+        if self.directory is None:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / key.filename
+            partial = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with gzip.open(partial, "wt", encoding="utf-8") as f:
+                json.dump(_dump_lines(lines), f, separators=(",", ":"))
+            os.replace(partial, path)
+            self._prune()
+        except OSError:
+            pass  # the disk copy is only an optimization
+
+    def _prune(self) -> None:
+        assert self.directory is not None
+        files = sorted(
+            self.directory.glob("*.json.gz"), key=lambda p: p.stat().st_mtime
+        )
+        for path in files[: max(0, len(files) - self.disk_entries)]:
+            path.unlink(missing_ok=True)
+
+    def render(self, markdown: str, key: RenderKey, style: ChapterStyle) -> List[Strip]:
+        """Cached lines of a chapter, rendered on a miss."""
+        lines = self.get(key)
+        if lines is None:
+            lines = render_chapter(markdown, key.width, style)
+            self.put(key, lines)
+        return lines
+
+
+class RenderedChapter(ScrollView, can_focus=True):
+    """A chapter drawn from pre-rendered lines (Line API).
+
+    The chapter is rendered in a thread once per content, theme and width
+    and the lines are kept in a `ChapterRenderCache`, so showing a chapter
+    again is only a cache lookup. Only the visible lines are drawn.
+
+    Long chapters are split into blocks (`ChapterBlocks`) instead: only
+    the blocks on screen, and a screen above and below, are rendered in a
+    thread as the view is scrolled. The line at the top of the view stays
+    in place when the blocks above it are measured.
+    """
+
+    DEFAULT_CSS = """
+    RenderedChapter {
+        height: 1fr;
+        padding: 1 10 1 7;
+        overflow-x: hidden;
+        overflow-y: scroll;
+    }
+    """
+
+    class Rendered(Message):
+        """The lines of the current content and width are shown."""
+
+    def __init__(
+        self,
+        markdown: str = "",
+        cache: Optional[ChapterRenderCache] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.markdown = markdown
+        self.cache = cache if cache is not None else ChapterRenderCache()
+        self._lines: List[Strip] = []
+        self._blocks: Optional[ChapterBlocks] = None
+        # block sources of the current content, by its hash
+        self._sources: Tuple[str, List[str]] = ("", [])
+        self._key: Optional[RenderKey] = None
+
+    def on_mount(self) -> None:
+        self.app.theme_changed_signal.subscribe(self, lambda _: self._render_lines())
+        self._render_lines()
+
+    def on_resize(self) -> None:
+        self._render_lines()
+
+    def update(self, markdown: str) -> None:
+        """Show another content, rendered unless cached."""
+        self.markdown = markdown
+        self._render_lines()
+
+    def _render_lines(self) -> None:
+        width = self.scrollable_content_region.width
+        if width <= 0:
+            return
+        key = RenderKey(content_hash(self.markdown), self.app.theme, width)
+        if key == self._key:
+            return
+        self._key = key
+        if len(self.markdown) >= self.cache.virtualize_from:
+            blocks = self.cache.blocks(key)
+            if blocks is None and self._sources[0] == key.content_hash:
+                # another width or theme: the blocks are the same
+                blocks = self._new_blocks(key, self._sources[1])
+            if blocks is not None:
+                self._show_blocks(blocks)
+                return
+            self.run_worker(
+                self._split(key, self.markdown), group="render", exclusive=True
+            )
+            return
+        lines = self.cache.cached(key)
+        if lines is not None:
+            self._show(lines)
+            return
+        style = ChapterStyle.from_app(self.app)
+        self.run_worker(
+            self._load(key, self.markdown, style), group="render", exclusive=True
+        )
+
+    async def _load(self, key: RenderKey, markdown: str, style: ChapterStyle) -> None:
+        lines = await asyncio.to_thread(self.cache.render, markdown, key, style)
+        if key == self._key:
+            self._show(lines)
+
+    async def _split(self, key: RenderKey, markdown: str) -> None:
+        sources = split_blocks(markdown, await parse_markdown(markdown))
+        self._sources = (key.content_hash, sources)
+        if key == self._key:
+            self._show_blocks(self._new_blocks(key, sources))
+
+    def _new_blocks(self, key: RenderKey, sources: List[str]) -> ChapterBlocks:
+        blocks = ChapterBlocks(sources, key.width, ChapterStyle.from_app(self.app))
+        self.cache.put_blocks(key, blocks)
+        return blocks
+
+    def _show(self, lines: List[Strip]) -> None:
+        # same relative position when the width changes
+        position = self.scroll_y / max(1, self.virtual_size.height)
+        relayout = self.virtual_size.height > 0
+        self._lines = lines
+        self._blocks = None
+        self.virtual_size = Size(0, len(lines))
+        if relayout:
+            self.scroll_to(y=round(position * len(lines)), animate=False)
+        self.refresh()
+        self.post_message(self.Rendered())
+
+    def _show_blocks(self, blocks: ChapterBlocks) -> None:
+        previous = self._blocks
+        y = round(self.scroll_y)
+        if previous and previous.sources is blocks.sources:
+            # the same block at the top of the view
+            index, row = previous.locate(y)
+            y = blocks.offset(index) + round(
+                row * blocks.heights[index] / max(1, previous.heights[index])
+            )
+        elif self.virtual_size.height > 0:
+            y = round(y / self.virtual_size.height * blocks.height)
+        self._lines = []
+        self._blocks = blocks
+        self.virtual_size = Size(0, blocks.height)
+        self.scroll_to(y=y, animate=False)
+        self._fill()
+        self.refresh()
+        self.post_message(self.Rendered())
+
+    def watch_scroll_y(self, old_value: float, new_value: float) -> None:
+        super().watch_scroll_y(old_value, new_value)
+        self._fill()
+
+    def _fill(self) -> None:
+        """Render the blocks on screen, and a screen above and below.
+
+        Blocks are rendered in a thread; until they are, the view shows as
+        many blank lines as they are expected to take.
+        """
+        blocks = self._blocks
+        if blocks is None or not len(blocks):
+            return
+        top = round(self.scroll_y)
+        height = self.scrollable_content_region.height
+        anchor, _ = blocks.locate(top)
+        wanted: List[int] = []
+        # the blocks from the top of the view down, then above it
+        index = anchor
+        y = blocks.offset(anchor)
+        while index < len(blocks) and y < top + 2 * height:
+            wanted.append(index)
+            y += blocks.heights[index]
+            index += 1
+        above = 0
+        index = anchor
+        while index > 0 and above < height:
+            index -= 1
+            wanted.append(index)
+            above += blocks.heights[index]
+        missing = []
+        for index in wanted:
+            if blocks.is_rendered(index):
+                blocks.render(index)  # most recently used
+            elif index not in blocks.pending:
+                missing.append(index)
+        if missing:
+            blocks.pending.update(missing)
+            self.run_worker(self._render_blocks(blocks, missing), group="blocks")
+
+    async def _render_blocks(self, blocks: ChapterBlocks, indexes: List[int]) -> None:
+        try:
+            rendered = await asyncio.to_thread(
+                lambda: [blocks.render_block(index) for index in indexes]
+            )
+        finally:
+            blocks.pending.difference_update(indexes)
+        if blocks is not self._blocks:
+            for index, lines in zip(indexes, rendered):
+                blocks.add(index, lines)
+            return
+        # the line at the top of the view stays in place
+        anchor, row = blocks.locate(round(self.scroll_y))
+        for index, lines in zip(indexes, rendered):
+            blocks.add(index, lines)
+        self.virtual_size = Size(0, blocks.height)
+        y = blocks.offset(anchor) + min(row, blocks.heights[anchor] - 1)
+        if y != round(self.scroll_y):
+            self.scroll_to(y=y, animate=False)
+        self.refresh()
+        self._fill()
+
+    def on_click(self, event: Click) -> None:
+        if event.style.link:
+            self.app.open_url(event.style.link)
+
+    def _line_text(self, y: int) -> Optional[str]:
+        if self._blocks is not None:
+            return self._blocks.text(y)
+        if 0 <= y < len(self._lines):
+            return self._lines[y].text
+        return None
+
+    def get_selection(self, selection: Selection) -> Optional[Tuple[str, str]]:
+        """The text under the selection, one line per rendered line."""
+        height = self.virtual_size.height
+        if not height:
+            return None
+        start = 0 if selection.start is None else selection.start.y
+        end = height - 1 if selection.end is None else min(selection.end.y, height - 1)
+        selected: List[str] = []
+        for y in range(start, end + 1):
+            span = selection.get_span(y)
+            text = self._line_text(y)
+            if span is None or text is None:
+                continue
+            if self._blocks is not None and self._blocks.line(y) is None:
+                selected.append(text)  # the source of a block not rendered
+                continue
+            x_start, x_end = span
+            selected.append(text[x_start : None if x_end == -1 else x_end].rstrip())
+        return "\n".join(selected), "\n"
+
+    def selection_updated(self, selection: Optional[Selection]) -> None:
+        self.refresh()
+
+    def render_line(self, y: int) -> Strip:
+        index = y + round(self.scroll_y)
+        width = self.scrollable_content_region.width
+        if self._blocks is not None:
+            strip = self._blocks.line(index) or Strip.blank(width)
+        elif 0 <= index < len(self._lines):
+            strip = self._lines[index]
+        else:
+            strip = Strip.blank(width)
+        strip = strip.crop_extend(0, width, None)
+        selection = self.text_selection
+        span = selection.get_span(index) if selection is not None else None
+        if span is not None:
+            start, end = span
+            end = width if end == -1 else min(end, width)
+            if start < end:
+                before, selected, after = strip.divide([start, end, width])
+                style = self.screen.get_component_rich_style("screen--selection")
+                selected = Strip(
+                    Segment.apply_style(selected, post_style=style),
+                    selected.cell_length,
+                )
+                strip = Strip.join([before, selected, after])
+        return strip.apply_style(self.rich_style).apply_offsets(0, index)
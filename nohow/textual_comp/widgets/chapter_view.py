@@ -1,13 +1,20 @@
 import asyncio
+from functools import partial
 from nohow.prompts.chat_gen import ChatSession, make_chat_session
 from langchain.messages import HumanMessage, AIMessage
-from nohow.prompts.chap_gen import ChapterInputs, build_chain
+from nohow.prompts.chap_gen import (
+    ChapterInputs,
+    astream_chapter_by_sections,
+    build_chain,
+)
+from nohow.llm.hedging import hedged_astream
+from nohow.llm.telemetry import request_config
 from nohow.prompts.utils import new_message_of_type
 from textual import on
 from typing import List
 import json
 from nohow.mkdutils import TocTreeNode
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from textual.widget import Widget
 from textual.reactive import reactive
 from textual.message import Message
@@ -35,12 +42,28 @@ from rich.color import Color
 from rich.padding import Padding
 from rich.text import Text
 
-from nohow.db.models import Book, Convo, Chapter, update_convo_content
+from nohow.db.models import (
+    Book,
+    Convo,
+    Chapter,
+    save_chapter_content,
+    update_convo_content,
+)
+from nohow.prompts.summary import ChapterSummaryGen, refresh_chapter_summary
 from nohow.db.utils import get_session
 from nohow.textual_comp.widgets.chatbox import ChatInputArea, ChatMessage
 from shortuuid import ShortUUID
 
+from nohow.textual_comp.widgets.chapter_render import RenderedChapter
+from nohow.textual_comp.widgets.md_stream import MarkdownStreamRenderer
+from nohow.textual_comp.widgets.panes import (
+    PaneState,
+    has_running_workers,
+    restore_scroll,
+)
 from nohow.textual_comp.widgets.utils import IsTyping
+from nohow.textual_comp.screens.confirm import ConfirmScreen
+from textual.worker import Worker, WorkerCancelled, WorkerFailed
 
 
 class ChapterView(Widget, can_focus=False, can_focus_children=True):
@@ -50,13 +73,16 @@ class ChapterView(Widget, can_focus=False, can_focus_children=True):
         height: 100%;
     }
 
-    #chapter_content_area {
+    #chapter_text, #chapter_content_area {
         border: blank $primary;
         &:focus {
             border: solid $accent;
             background: $boost;
         }
     }
+    #chapter_content_area {
+        display: none;
+    }
     #chapter_content_md {
         
         margin: 1 10 1 7;
@@ -72,12 +98,28 @@ class ChapterView(Widget, can_focus=False, can_focus_children=True):
     
     """
 
+    BINDINGS = [
+        Binding("ctrl+b", "cancel_generation", "Stop generation"),
+    ]
+
+    # chapters of at least this many words are generated section by section
+    SECTIONED_FROM_LENGTH = 2000
+    WORDS_PER_SECTION = 500
+
     @dataclass
     class StartConversation(Message):
         def __init__(self, sender: "ChapterView") -> None:
             super().__init__()
             self.sender = sender
 
+    class SummaryUpdated(Message):
+        """The stored summary of a chapter changed."""
+
+        def __init__(self, toc_address: str, summary: ChapterSummaryGen) -> None:
+            super().__init__()
+            self.toc_address = toc_address
+            self.summary = summary
+
     def __init__(
         self,
         book: Book,
@@ -96,15 +138,54 @@ class ChapterView(Widget, can_focus=False, can_focus_children=True):
         self.chapter_content: str = chapter_content
         self.responding_indicator = IsTyping()
         self.responding_indicator.display = False
+        self._generation_worker: Worker | None = None
+        self._previous_content: str = ""
+        self._restored: PaneState | None = None
 
     @property
     def widget_id(self):
+        # the synthetic TOC root shares its address with the first chapter
+        if self.tocnode.level == 0:
+            return "convo_root"
         return f"convo_{self.toc_address.replace('.', '_')}"
 
+    @property
+    def is_busy(self) -> bool:
+        """Generating, indexing or summarizing: the view must stay mounted."""
+        return has_running_workers(self)
+
+    def save_state(self) -> PaneState:
+        text = self.query_one("#chapter_text", RenderedChapter)
+        return PaneState(scroll_y=text.scroll_y)
+
+    def restore_state(self, state: PaneState) -> None:
+        """Apply the state of the previous instance, called before mounting."""
+        self._restored = state
+
+    @on(RenderedChapter.Rendered)
+    def _content_rendered(self) -> None:
+        if self._restored is not None:
+            self.call_after_refresh(self._restore_scroll)
+
+    def _restore_scroll(self) -> None:
+        text = self.query_one("#chapter_text", RenderedChapter)
+        if self._restored is not None and restore_scroll(text, self._restored.scroll_y):
+            self._restored = None
+
+    def show_chapter(self, content: str) -> None:
+        """Replace the chapter shown (when not generating)."""
+        self.chapter_content = content
+        self.query_one("#chapter_text", RenderedChapter).update(content)
+
     def compose(self):
         yield self.responding_indicator
+        # the chapter is read from cached rendered lines, generations are
+        # streamed into a Markdown widget shown meanwhile
+        yield RenderedChapter(
+            self.chapter_content, cache=self.app.render_cache, id="chapter_text"
+        )
         with VerticalScroll(can_focus=True, id="chapter_content_area"):
-            yield Markdown(self.chapter_content, id="chapter_content_md")
+            yield Markdown(id="chapter_content_md")
 
         with Horizontal(id="chapter_buttons_area"):
             yield Label("Chapter Length:")
@@ -131,6 +212,13 @@ class ChapterView(Widget, can_focus=False, can_focus_children=True):
             )
         return ""
 
+    def chapter_titles(self) -> List[str]:
+        """Title of the chapter, then of its ancestors up to the TOC root."""
+        if not self.book.toc_tree:
+            return [self.tocnode.title]
+        root = TocTreeNode.from_json(json.loads(str(self.book.toc_tree)))
+        return root.titles_to(self.tocnode.index) or [self.tocnode.title]
+
     def get_chapter_inputs(self, chapter_length: int) -> ChapterInputs:
         # find the chapter length from the input
 
@@ -139,19 +227,15 @@ class ChapterView(Widget, can_focus=False, can_focus_children=True):
             chapter_title=self.tocnode.title,
             book_toc=self.book_extract(),
             chapter_length=chapter_length,
+            book_outline=str(self.book.toc or ""),
         )
 
     @on(
         Button.Pressed,
         "#generate_chap_button_small, #generate_chap_button_medium, #generate_chap_button_large, #generate_chap_button_xlarge",
     )
-    async def generate_chapter(self, event: Button.Pressed) -> None:
+    def generate_chapter(self, event: Button.Pressed) -> None:
         event.stop()
-        self.responding_indicator.display = True
-        # 1. gather the inputs for generation
-        chain = build_chain(self.app.app_context.llm)
-
-        self.tocnode.title
         chapter_length_button_map = {
             "generate_chap_button_small": 250,
             "generate_chap_button_medium": 500,
@@ -161,50 +245,177 @@ class ChapterView(Widget, can_focus=False, can_focus_children=True):
         button_id = event.button.id
         chapter_length = chapter_length_button_map[button_id]
 
+        # run the stream in a worker so the view stays responsive (and the
+        # Stop button / binding can cancel it)
+        self._generation_worker = self.run_worker(
+            self._generate(chapter_length), group="chapter_generation", exclusive=True
+        )
+
+    def _set_generating(self, generating: bool) -> None:
+        self.responding_indicator.display = generating
+        for button in self.query("#chapter_buttons_area Button"):
+            button.disabled = generating
+        self.query_one("#chapter_content_area").display = generating
+        self.query_one("#chapter_text").display = not generating
+        if not generating:
+            self.show_chapter(self.chapter_content)
+            self.query_one("#chapter_content_md", Markdown).update("")
+
+    async def _generate(self, chapter_length: int) -> None:
+        self._set_generating(True)
+        # reset the content, keeping the previous one in case of
+        # cancellation: before the first await, which may be cancelled
+        self._previous_content = self.chapter_content
+        self.chapter_content = ""
+        # 1. gather the inputs for generation
+        llm = self.app.app_context.llm_for("chapter")
         inputs = self.get_chapter_inputs(chapter_length)
+        # 1.0 excerpts of the book sources about this chapter, if any
+        source_passages = await asyncio.to_thread(
+            self.app.app_context.source_library.chapter_material,
+            self.app,
+            self.book_id,
+            self.chapter_titles(),
+        )
+        inputs = replace(inputs, source_passages=source_passages)
         # 1.1 grab the chapter content area
         chapter_content_md = self.query_one("#chapter_content_md", Markdown)
-        # reset the content
-        self.chapter_content = ""
         chapter_content_md.update("")
 
-        # update function
-        async def update_md_content(chunk: str) -> None:
-            self.chapter_content += chunk
-            await chapter_content_md.append(chunk)
+        # chunks are rendered at most once per frame
+        renderer = MarkdownStreamRenderer(chapter_content_md)
 
-        # 2. trigger generation process
-        async for chunk in chain.astream(inputs.to_dict()):
-            await update_md_content(chunk)
+        # 2. trigger generation process; long chapters are outlined first and
+        # their sections written concurrently, streamed back in order
+        policy = self.app.app_context.stream_policy
+        if chapter_length >= self.SECTIONED_FROM_LENGTH:
+            stream = astream_chapter_by_sections(
+                llm,
+                inputs,
+                section_count=chapter_length // self.WORDS_PER_SECTION,
+                policy=policy,
+            )
+        else:
+            chain = build_chain(llm)
+            stream = hedged_astream(
+                lambda: chain.astream(
+                    inputs.to_dict(), config=request_config("chapter")
+                ),
+                policy,
+            )
+        try:
+            async for chunk in stream:
+                self.chapter_content += chunk
+                renderer.write(chunk)
+        except Exception as e:
+            # timeouts, and provider errors left after the retries: the
+            # partial chapter is not saved, the previous one is shown again
+            self.notify(f"Chapter generation failed: {e}", severity="error")
+            self.chapter_content = self._previous_content
+            self._set_generating(False)
+            return
+        finally:
+            await renderer.close()
 
         # 3. finalize with saving to DB
-        self.chapter_content
-        self.book_id
-        self.toc_address
-
-        with get_session(self.app.get_db()) as session:
-            # find if chapter already exists
-            existing_chapter = (
-                session.query(Chapter)
-                .filter_by(toc_address=self.toc_address, book_id=self.book_id)
-                .one_or_none()
+        self._save_chapter()
+        self._set_generating(False)
+
+    def _save_chapter(self) -> None:
+        """Persist the chapter and update what is derived from it."""
+        save_chapter_content(
+            self.app, self.book_id, self.toc_address, self.chapter_content
+        )
+        retrieval = self.app.app_context.chapter_retrieval
+        if retrieval is not None:
+            self.run_worker(
+                partial(
+                    retrieval.index_chapter,
+                    self.app,
+                    self.book_id,
+                    self.toc_address,
+                    self.chapter_content,
+                ),
+                thread=True,
+                group="chapter_indexing",
+            )
+        self.run_worker(
+            self._summarize(self.chapter_content),
+            group="chapter_summary",
+            exclusive=True,
+        )
+
+    async def _summarize(self, content: str) -> None:
+        """Refresh the stored summary of the chapter if its content changed."""
+        try:
+            summary = await refresh_chapter_summary(
+                self.app,
+                self.app.app_context.llm_for("summary"),
+                self.book_id,
+                self.toc_address,
+                str(self.book.title),
+                self.tocnode.title,
+                content,
             )
-            if existing_chapter:
-                existing_chapter.content = self.chapter_content
-                session.commit()
-                session.refresh(existing_chapter)
-                new_chapter = existing_chapter
+        except Exception as e:
+            self.notify(f"Could not summarize the chapter: {e}", severity="warning")
+            return
+        if summary is not None:
+            self.post_message(self.SummaryUpdated(self.toc_address, summary))
+
+    @on(Button.Pressed, "#stop_button")
+    async def on_stop_pressed(self, event: Button.Pressed) -> None:
+        event.stop()
+        await self.action_cancel_generation()
+
+    async def action_cancel_generation(self) -> None:
+        """Stop the running generation and ask whether to keep the partial chapter."""
+        worker = self._generation_worker
+        if worker is None or worker.is_finished:
+            return
+        worker.cancel()
+        try:
+            await worker.wait()
+        except (WorkerCancelled, WorkerFailed):
+            pass
+        self._generation_worker = None
+
+        def keep_or_discard(keep: bool | None) -> None:
+            if keep and self.chapter_content:
+                self._save_chapter()
             else:
-                new_chapter = Chapter(
-                    content=self.chapter_content,
-                    toc_address=self.toc_address,
-                    book_id=self.book_id,
-                )
-                session.add(new_chapter)
-                session.commit()
-                session.refresh(new_chapter)
+                self.chapter_content = self._previous_content
+            self._set_generating(False)
 
-        self.responding_indicator.display = False
+        if not self.chapter_content:
+            keep_or_discard(False)
+            return
+        self.app.push_screen(
+            ConfirmScreen(
+                "Generation stopped. Keep the partial chapter?",
+                yes_label="Keep",
+                no_label="Discard",
+            ),
+            keep_or_discard,
+        )
+
+    @on(Button.Pressed, "#start_quiz_button")
+    def start_quiz(self, event: Button.Pressed) -> None:
+        event.stop()
+        if not self.chapter_content:
+            self.notify("Generate the chapter before starting a quiz.")
+            return
+        # Import locally to avoid top-level import cycles.
+        from nohow.textual_comp.screens.quiz import QuizScreen
+
+        self.app.push_screen(
+            QuizScreen(
+                book_id=self.book_id,
+                toc_address=self.toc_address,
+                chapter_title=self.tocnode.title,
+                chapter_content=self.chapter_content,
+            )
+        )
 
     @on(Button.Pressed, "#start_convo_button")
     def start_conversation(self) -> None:
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterator, Optional
+
+from langchain.messages import AIMessage, HumanMessage
+from textual.app import App
+from textual.signal import Signal
+from textual.worker import Worker, WorkerCancelled, WorkerFailed
+
+from nohow.db.models import update_convo_content
+from nohow.prompts.chat_gen import ChatSession
+from nohow.textual_comp.widgets.panes import ReaderConfig
+
+
+@dataclass(eq=False)
+class ChatStream:
+    """A reply streamed for a conversation."""
+
+    convo_id: int
+    toc_address: str
+    session: ChatSession
+    question: str = ""
+    reply: str = ""  # received so far
+    started: bool = False  # False while waiting for a free stream
+    cancelled: bool = False  # then the canceller ends it
+    answered: bool = False  # a reply was kept, set when it ends
+    worker: Optional[Worker] = None
+    # set by the pane showing the conversation, if any
+    on_chunk: Optional[Callable[[str], Awaitable[None]]] = None
+    on_end: Optional[Callable[[], Awaitable[None]]] = None
+
+    @property
+    def status(self) -> str:
+        return "replying" if self.started else "waiting"
+
+
+class ChatStreams:
+    """The replies streamed for all the conversations, `max_streams` at a time.
+
+    The streams are app workers: they go on when the pane of their
+    conversation is unmounted or the reader closed, and the conversation is
+    saved when the reply is complete. `changed` is published with the
+    stream whenever one is queued, starts or ends.
+    """
+
+    def __init__(self, app: App, max_streams: int = 3) -> None:
+        self.app = app
+        self.max_streams = max(1, max_streams)
+        self._slots = asyncio.Semaphore(self.max_streams)
+        self._streams: Dict[int, ChatStream] = {}
+        self.changed: Signal[ChatStream] = Signal(app, "chat_streams_changed")
+
+    @classmethod
+    def from_config(cls, app: App, config: ReaderConfig) -> "ChatStreams":
+        return cls(app, max_streams=config.max_streams)
+
+    def __iter__(self) -> Iterator[ChatStream]:
+        return iter(list(self._streams.values()))
+
+    def get(self, convo_id: int) -> Optional[ChatStream]:
+        return self._streams.get(convo_id)
+
+    def start(
+        self, convo_id: int, toc_address: str, session: ChatSession, message: str
+    ) -> ChatStream:
+        """Queue the reply to `message`; one stream per conversation."""
+        assert convo_id not in self._streams, "a reply is already streamed"
+        # the question is part of the conversation while it waits
+        session.append_user(message)
+        stream = ChatStream(convo_id, toc_address, session, question=message)
+        self._streams[convo_id] = stream
+        stream.worker = self.app.run_worker(
+            self._run(stream), group=f"chat_stream_{convo_id}", exit_on_error=False
+        )
+        self.changed.publish(stream)
+        return stream
+
+    async def _run(self, stream: ChatStream) -> None:
+        try:
+            async with self._slots:
+                stream.started = True
+                self.changed.publish(stream)
+                async for chunk in stream.session.stream_assistant():
+                    stream.reply += chunk
+                    if stream.on_chunk is not None:
+                        await stream.on_chunk(chunk)
+        except Exception as e:
+            # timeouts, network or provider errors: the stream ends all the same
+            self.app.notify(f"No answer: {e}", severity="error")
+        finally:
+            if not stream.cancelled:
+                await self.end(stream)
+
+    async def cancel(self, stream: ChatStream) -> bool:
+        """Stop the stream; `end` is left to the caller (keep or discard).
+
+        False if it had ended already.
+        """
+        if stream.worker is None or stream.worker.is_finished:
+            return False
+        stream.cancelled = True
+        stream.worker.cancel()
+        try:
+            await stream.worker.wait()
+        except (WorkerCancelled, WorkerFailed):
+            pass
+        return True
+
+    async def end(self, stream: ChatStream) -> None:
+        """Save the conversation and tell its pane the reply is over.
+
+        Without a reply (error, discarded or cancelled while waiting) the
+        question is dropped: the next request would otherwise send two
+        questions in a row.
+        """
+        if self._streams.get(stream.convo_id) is not stream:
+            return  # ended already
+        conversation = stream.session.conversation
+        stream.answered = isinstance(conversation[-1], AIMessage)
+        if isinstance(conversation[-1], HumanMessage):
+            conversation.pop()
+        update_convo_content(
+            self.app,
+            convo_id=stream.convo_id,
+            new_content=json.dumps(stream.session.serialize_conversation()),
+        )
+        self._streams.pop(stream.convo_id, None)
+        self.changed.publish(stream)
+        if stream.on_end is not None:
+            await stream.on_end()
@@ -1,5 +1,4 @@
 from __future__ import annotations
-import time
 
 
 from nohow.prompts.utils import new_message_of_type
@@ -11,10 +10,12 @@ from textual.binding import Binding
 from textual.geometry import Size
 from textual.widget import Widget
 from textual.containers import Container
-from textual.widgets import TextArea, Button, Markdown
+from textual.widgets import TextArea, Button, Markdown, Static
 from textual.message import Message
 from textual import on, events
 
+from nohow.textual_comp.widgets.md_stream import MarkdownStreamRenderer
+
 class ChatInputArea(TextArea):
     BINDINGS = [
         Binding(
@@ -117,8 +118,8 @@ class ChatMessage(Widget, can_focus=True):
         )
         self.tooltip = f"Sent {timestamp}"
 
-        self.chunk_buffer: str = ""
-        self.last_debuff_time: float = 0.0
+        self._renderer: MarkdownStreamRenderer | None = None
+        self._seen_flushes = 0
 
     @property
     def is_ai_message(self):
@@ -136,6 +137,13 @@ class ChatMessage(Widget, can_focus=True):
         else:
             self.add_class("human-message")
 
+    def on_unmount(self) -> None:
+        # the reply may go on streaming without this message (pane closed
+        # or evicted): its renderer must not outlive it
+        if self._renderer is not None:
+            self._renderer.cancel()
+            self._renderer = None
+
     def get_code_blocks(self, markdown_string):
         pattern = r"```(.*?)\n(.*?)```"
         code_blocks = re.findall(pattern, markdown_string, re.DOTALL)
@@ -172,28 +180,77 @@ class ChatMessage(Widget, can_focus=True):
         return self._message
 
     async def feed_chunk(self, chunk: str) -> bool:
-        """Feed a new chunk of text to the message content."""
+        """Feed a new chunk of text to the message content.
 
-        self.chunk_buffer += chunk
-        now = time.time()
-        if now - self.last_debuff_time > 0.2:
-            await self.debuff()
-            return True
-        else:
-            return False
-
-    async def debuff(self) -> None:
-        """Clear any buffered chunks without updating the message content."""
-        current_content = self.message.content or ""
-        updated_content = current_content + self.chunk_buffer
-        self._message.content = updated_content
-        await self.markdown_widget.append(self.chunk_buffer)
-        self.chunk_buffer = ""
-        self.last_debuff_time = time.time()
-        self.refresh()
+        Returns True when the message was redrawn since the previous chunk.
+        """
+        self._message.content = (self.message.content or "") + chunk
+        if self._renderer is None:
+            self._renderer = MarkdownStreamRenderer(self.markdown_widget)
+        self._renderer.write(chunk)
+        flushes = self._renderer.flush_count
+        redrawn, self._seen_flushes = flushes != self._seen_flushes, flushes
+        return redrawn
 
     async def finalize_message(self) -> None:
         """Finalize the message after all chunks have been fed."""
-        # Any finalization logic can go here.
-        if self.chunk_buffer:
-            await self.debuff()
+        if self._renderer is not None:
+            await self._renderer.close()
+            self._renderer = None
+
+
+class CollapsedMessage(Widget, can_focus=True):
+    """A message shown as a one-line header until expanded.
+
+    Used for the system message, which holds the whole chapter: its
+    Markdown is only built when the user opens it.
+    """
+
+    BINDINGS = [
+        Binding("enter", "toggle", "Expand/Collapse", key_display="⏎"),
+    ]
+
+    DEFAULT_CSS = """
+    CollapsedMessage {
+        height: auto;
+        width: 100%;
+        padding: 0 1;
+        margin-left: 5;
+        background: $surface 10%;
+
+        &:focus {
+            outline-left: thick $primary;
+            background: $boost;
+        }
+        & > #collapsed-header {
+            color: $text-muted;
+            text-style: italic;
+        }
+    }
+    """
+
+    def __init__(self, message: AnyMessage, title: str = "System prompt") -> None:
+        super().__init__()
+        self.message = message
+        self.title = title
+        self.expanded = False
+
+    def _header(self) -> str:
+        words = len(str(self.message.content or "").split())
+        marker = "▼" if self.expanded else "▶"
+        return f"{marker} {self.title} ({words} words)"
+
+    def compose(self):
+        yield Static(self._header(), id="collapsed-header")
+
+    def on_click(self, event: events.Click) -> None:
+        event.stop()
+        self.run_worker(self.action_toggle(), exclusive=True)
+
+    async def action_toggle(self) -> None:
+        self.expanded = not self.expanded
+        self.query_one("#collapsed-header", Static).update(self._header())
+        if self.expanded:
+            await self.mount(ChatMessage(message=self.message, model_name=""))
+        else:
+            await self.query(ChatMessage).remove()
@@ -1,10 +1,10 @@
 import asyncio
 from nohow.prompts.chat_gen import ChatSession, make_chat_session
-from langchain.messages import HumanMessage, AIMessage
+from langchain.messages import HumanMessage, AIMessage, SystemMessage
 from nohow.prompts.chap_gen import ChapterInputs, build_chain
 from nohow.prompts.utils import new_message_of_type
 from textual import on
-from typing import List
+from typing import Dict, List
 import json
 from nohow.mkdutils import TocTreeNode
 from dataclasses import dataclass
@@ -16,8 +16,6 @@ from textual.widgets import (
     TextArea,
     Button,
     Input,
-    ListView,
-    ListItem,
     Markdown,
 )
 from textual.events import Event, Click
@@ -36,11 +34,28 @@ from rich.padding import Padding
 from rich.text import Text
 
 from nohow.db.models import Book, Convo, Chapter, update_convo_content
+from nohow.prompts.summary import ChapterSummaryGen, summary_tooltip
 from nohow.db.utils import get_session
-from nohow.textual_comp.widgets.chatbox import ChatInputArea, ChatMessage
+from nohow.textual_comp.widgets.chat_streams import ChatStream
+from nohow.textual_comp.widgets.chatbox import (
+    ChatInputArea,
+    ChatMessage,
+    CollapsedMessage,
+)
 from shortuuid import ShortUUID
 
+from nohow.textual_comp.widgets.navigator import (
+    ChatListItem,
+    NavigatorRows,
+    NavigatorView,
+)
+from nohow.textual_comp.widgets.panes import (
+    PaneState,
+    has_running_workers,
+    restore_scroll,
+)
 from nohow.textual_comp.widgets.utils import IsTyping
+from nohow.textual_comp.screens.confirm import ConfirmScreen
 
 
 class ChatFlowWidget(Widget):
@@ -73,8 +88,12 @@ class ChatFlowWidget(Widget):
         ),
         Binding("k", "scroll_convo(True)", "Scroll Up", show=False),
         Binding("j", "scroll_convo(False)", "Scroll Down", show=False),
+        Binding("ctrl+b", "cancel_stream", "Stop reply"),
     ]
 
+    # messages built when a conversation is opened, and per scroll-up page
+    HISTORY_WINDOW = 20
+
     DEFAULT_CSS = """
     ChatFlowWidget {
         
@@ -91,6 +110,11 @@ class ChatFlowWidget(Widget):
         height: 1fr;
         padding: 1 1;
     }
+
+    #older-messages {
+        color: $text-muted;
+        text-align: center;
+    }
     
     """
 
@@ -110,34 +134,92 @@ class ChatFlowWidget(Widget):
 
         # for managing the conversation
         self.allow_input_submit = True
+        # the reply being streamed, in the background (see ChatStreams)
+        self._stream: ChatStream | None = self.app.chat_streams.get(convo_id)
+        self._streaming_chatbox: ChatMessage | None = None
+        self._question_chatbox: ChatMessage | None = None
         self.responding_indicator = IsTyping()
         self.responding_indicator.display = False
-        llm = self.app.app_context.llm
-        assert llm is not None
-        if convo_content:
+        self._restored: PaneState | None = None
+        # index of the oldest built message, after the system message
+        self._first_shown = 0
+        self._history_start = 0
+        # messages to lay out before giving up restoring the scroll position
+        self._layouts_pending = 0
+        llm = self.app.app_context.llm_for("chat")
+        if self._stream is not None:
+            # the stored conversation misses the question being answered
+            self.chat_session = self._stream.session
+        elif convo_content:
             self.chat_session = ChatSession.create_from_serialized(
                 llm=llm,
                 serialized=json.loads(convo_content),
+                policy=self.app.app_context.stream_policy,
+                retriever=self._retriever(),
             )
         else:
             self.chat_session = None
 
     @property
     def widget_id(self):
-        return f"convo_{self.toc_address.replace('.', '_')}" + str(self.convo_id)
+        # "chat_" keeps the ids apart from the chapter views ("convo_...")
+        return f"chat_{self.toc_address.replace('.', '_')}_{self.convo_id}"
+
+    @property
+    def is_busy(self) -> bool:
+        """Loading messages: the conversation must stay mounted.
+
+        A reply goes on streaming when its pane is unmounted.
+        """
+        return has_running_workers(self)
+
+    def save_state(self) -> PaneState:
+        return PaneState(
+            scroll_y=self.chat_container.scroll_y,
+            draft=self.input_area.text,
+            first_shown=self._first_shown,
+        )
+
+    def restore_state(self, state: PaneState) -> None:
+        """Apply the state of the previous instance, called before mounting."""
+        self._restored = state
+
+    @on(Markdown.TableOfContentsUpdated)
+    def _message_laid_out(self) -> None:
+        if self._restored is not None:
+            self._layouts_pending -= 1
+            self.call_after_refresh(self._restore_scroll)
+
+    def _restore_scroll(self) -> None:
+        if self._restored is None:
+            return
+        restored = restore_scroll(self.chat_container, self._restored.scroll_y)
+        if restored or self._layouts_pending <= 0:
+            # every message is laid out: the content will not grow any more
+            self._restored = None
+
+    def _retriever(self):
+        """Retrieval over the other chapters of the book, None when disabled."""
+        # the current chapter is in the system prompt already
+        retrieval = self.app.app_context.chapter_retrieval
+        if retrieval is None:
+            return None
+        return retrieval.retriever_for(self.app, self.book_id, self.toc_address)
 
     async def chat_started(self, convo: Convo) -> None:
         if self.chat_session is not None:
             return
 
-        llm = self.app.app_context.llm
-        assert llm is not None
+        llm = self.app.app_context.llm_for("chat")
 
         # 1. prepare inputs for the chat sessions creation
         self.chapter_content
 
         self.chat_session = make_chat_session(
-            llm=llm, chapter_content=self.chapter_content
+            llm=llm,
+            chapter_content=self.chapter_content,
+            policy=self.app.app_context.stream_policy,
+            retriever=self._retriever(),
         )
         update_convo_content(
             self.app,
@@ -145,9 +227,9 @@ class ChatFlowWidget(Widget):
             new_content=json.dumps(self.chat_session.serialize_conversation()),
         )
 
-        for message in self.chat_session.conversation:
-            chat_box = ChatMessage(message=message, model_name="")
-            await self.chat_container.mount(chat_box)
+        await self.chat_container.mount_all(
+            [self._message_widget(m) for m in self.chat_session.conversation]
+        )
 
     def compose(self):
         yield Static(f"chapter : {self.toc_address} , bookid: {self.book_id} ")
@@ -157,16 +239,124 @@ class ChatFlowWidget(Widget):
             self.chat_container = vertical_scroll
             vertical_scroll.can_focus = False
 
-            if self.chat_session is not None:
-                for message in self.chat_session.conversation:
-                    chat_box = ChatMessage(message=message, model_name="dummy-model")
-                    yield chat_box
+            # only the latest messages are built, older ones are loaded when
+            # scrolling up (see _load_older_messages)
+            messages = self.chat_session.conversation if self.chat_session else []
+            start = 0
+            if messages and isinstance(messages[0], SystemMessage):
+                yield self._message_widget(messages[0])
+                start = 1
+            self._first_shown = max(start, len(messages) - self.HISTORY_WINDOW)
+            if self._restored is not None and self._restored.first_shown is not None:
+                # build the messages the saved scroll position refers to
+                self._first_shown = min(
+                    max(start, self._restored.first_shown), self._first_shown
+                )
+            self._history_start = start
+            self._layouts_pending = len(messages) - self._first_shown
+            older = Static(self._older_label(), id="older-messages")
+            older.display = self._first_shown > start
+            yield older
+            for message in messages[self._first_shown :]:
+                yield self._message_widget(message)
         with Horizontal(id="chat-input-text-container"):
-            self.input_area = ChatInputArea(self, id="chat_input_area")
+            self.input_area = ChatInputArea(
+                self,
+                text=self._restored.draft if self._restored else "",
+                id="chat_input_area",
+            )
             yield self.input_area
             yield Button("Send", id="btn-submit")
         yield self.responding_indicator
 
+    async def on_mount(self) -> None:
+        self.watch(self.chat_container, "scroll_y", self._history_scrolled, init=False)
+        stream = self._stream
+        if stream is not None and self.app.chat_streams.get(self.convo_id) is stream:
+            # a reply streamed while the conversation was not shown
+            question = self._last_question()
+            chatbox = ChatMessage(
+                message=AIMessage(content=""),
+                model_name=self.app.app_context.model_name,
+            )
+            await self.chat_container.mount(chatbox)
+            if stream.reply:
+                await chatbox.feed_chunk(stream.reply)
+            self._follow_stream(stream, chatbox, question)
+        elif stream is not None:
+            # it ended while the conversation was composed
+            self._stream = None
+            last = stream.session.conversation[-1]
+            if stream.answered:
+                await self.chat_container.mount(self._message_widget(last))
+            else:
+                await self._unask(stream, self._last_question())
+        if self._restored is None:
+            self.call_after_refresh(self.scroll_to_latest_message)
+
+    def on_unmount(self) -> None:
+        if self._stream is not None and self._stream.on_end == self._end_of_reply:
+            self._stream.on_chunk = None
+            self._stream.on_end = None
+
+    def _last_question(self) -> ChatMessage | None:
+        """The chatbox of the question being answered, if it is built."""
+        messages = self.chat_container.query(ChatMessage)
+        if messages and isinstance(messages.last().message, HumanMessage):
+            return messages.last()
+        return None
+
+    def _message_widget(self, message) -> Widget:
+        if isinstance(message, SystemMessage):
+            # the system message holds the whole chapter
+            return CollapsedMessage(message)
+        return ChatMessage(message=message, model_name="")
+
+    def _older_label(self) -> str:
+        hidden = self._first_shown - self._history_start
+        return f"↑ {hidden} earlier messages (scroll up or click to load)"
+
+    def _history_scrolled(self, scroll_y: float) -> None:
+        if scroll_y <= 0 and self._first_shown > self._history_start:
+            self.run_worker(
+                self._load_older_messages(), group="chat_history", exclusive=True
+            )
+
+    @on(Click, "#older-messages")
+    def _older_clicked(self) -> None:
+        self.run_worker(
+            self._load_older_messages(), group="chat_history", exclusive=True
+        )
+
+    async def _load_older_messages(self) -> None:
+        """Build the previous page of messages above the visible ones."""
+        if self.chat_session is None or self._first_shown <= self._history_start:
+            return
+        start = max(self._history_start, self._first_shown - self.HISTORY_WINDOW)
+        widgets = [
+            self._message_widget(m)
+            for m in self.chat_session.conversation[start : self._first_shown]
+        ]
+        self._first_shown = start
+        placeholder = self.query_one("#older-messages", Static)
+        placeholder.update(self._older_label())
+        placeholder.display = self._first_shown > self._history_start
+        children = list(self.chat_container.children)
+        position = children.index(placeholder) + 1
+        anchor = children[position] if position < len(children) else None
+        # where the first message was in the view, kept once the page is built
+        shown_at = (
+            anchor.virtual_region.y - self.chat_container.scroll_y if anchor else 0
+        )
+        await self.chat_container.mount_all(widgets, after=placeholder)
+        if anchor is not None:
+            self.call_after_refresh(self._keep_in_view, anchor, shown_at)
+
+    def _keep_in_view(self, widget: Widget, shown_at: float) -> None:
+        self.chat_container.scroll_to(
+            y=widget.virtual_region.y - shown_at, animate=False, immediate=True
+        )
+
     def scroll_to_latest_message(self) -> None:
         """Scroll to the latest message in the chat flow."""
         if self.chat_container is not None:
@@ -212,28 +402,96 @@ class ChatFlowWidget(Widget):
         await self.chat_container.mount(ai_message_chatbox)
         self.scroll_to_latest_message()
 
+        # streamed by the app: other conversations may stream meanwhile, and
+        # the reply is saved even if this pane is unmounted
+        stream = self.app.chat_streams.start(
+            self.convo_id, self.toc_address, self.chat_session, message
+        )
+        self._follow_stream(stream, ai_message_chatbox, user_message_chatbox)
+        self.action_last_message()
+
+    def _follow_stream(
+        self,
+        stream: ChatStream,
+        chatbox: ChatMessage,
+        question: ChatMessage | None,
+    ) -> None:
+        """Show the rest of a streamed reply in `chatbox`."""
+        self._stream = stream
+        self._streaming_chatbox = chatbox
+        self._question_chatbox = question
+        stream.on_chunk = self._reply_chunk
+        stream.on_end = self._end_of_reply
         self.responding_indicator.display = True
         self.allow_input_submit = False
+
+    async def _reply_chunk(self, chunk: str) -> None:
+        assert self._streaming_chatbox is not None
+        if await self._streaming_chatbox.feed_chunk(chunk):
+            self.action_last_message()
+
+    async def _end_of_reply(self) -> None:
+        """Give the input back to the user (the reply is saved already)."""
+        stream = self._stream
+        chatbox = self._streaming_chatbox
+        answered = stream is not None and stream.answered
+        if chatbox is not None:
+            await chatbox.finalize_message()
+            if not answered or not chatbox.message.content:
+                # no answer (timeout, error): nothing to show
+                await chatbox.remove()
+        if stream is not None and not answered:
+            await self._unask(stream, self._question_chatbox)
+        self._stream = None
+        self._streaming_chatbox = None
+        self._question_chatbox = None
+        self.responding_indicator.display = False
+        self.allow_input_submit = True
         self.action_last_message()
 
-        async def stream_in_background():
-            assert self.chat_session is not None
-            async for chunk in self.chat_session.send(message):
+    async def _unask(self, stream: ChatStream, question: ChatMessage | None) -> None:
+        """Forget a question left without reply; its text goes back to the input."""
+        if question is not None:
+            await question.remove()
+        if not self.input_area.text:
+            self.input_area.text = stream.question
 
-                if await ai_message_chatbox.feed_chunk(chunk):
-                    self.action_last_message()
+    @on(Button.Pressed, "#stop_button")
+    async def on_stop_pressed(self, event: Button.Pressed) -> None:
+        event.stop()
+        await self.action_cancel_stream()
 
-            await ai_message_chatbox.finalize_message()
-            update_convo_content(
-                self.app,
-                convo_id=self.convo_id,
-                new_content=json.dumps(self.chat_session.serialize_conversation()),
-            )
-            self.responding_indicator.display = False
-            self.allow_input_submit = True
-            self.action_last_message()
+    async def action_cancel_stream(self) -> None:
+        """Stop the streaming reply and ask whether to keep what was received."""
+        stream = self._stream
+        chatbox = self._streaming_chatbox
+        if stream is None or chatbox is None:
+            return
+        streams = self.app.chat_streams
+        if not await streams.cancel(stream):
+            return  # the reply ended meanwhile
+        # render what was received so far
+        await chatbox.finalize_message()
+
+        async def keep_or_discard(keep: bool | None) -> None:
+            if keep:
+                stream.session.append_assistant(str(chatbox.message.content))
+            else:
+                await chatbox.remove()
+                self._streaming_chatbox = None
+            await streams.end(stream)
 
-        self.run_worker(stream_in_background(), exclusive=True)
+        if not chatbox.message.content:
+            await keep_or_discard(False)
+            return
+        self.app.push_screen(
+            ConfirmScreen(
+                "Reply stopped. Keep the partial answer?",
+                yes_label="Keep",
+                no_label="Discard",
+            ),
+            keep_or_discard,
+        )
 
     def action_focus_input(self) -> None:
         """Focus the chat input area."""
@@ -282,82 +540,6 @@ class UserInputWidget(Widget):
         pass
 
 
-class ChatListItem(ListItem):
-    DEFAULT_CSS = """
-    ChatListItem {
-        height: auto;
-        padding: 0 1;
-        background: $surface;
-
-        &.-h1 {
-            color: $primary;
-            text-style: bold underline;
-        }
-        &.-h2 {
-            color: $primary 90% ;
-            
-        }
-
-        &.-h3 {
-            color: $primary 80% ;
-        }
-
-        &.-conversation {
-            text-style: italic;
-            color: $accent 90%;
-        }
-    }
-
-    
-    """
-
-    def __init__(
-        self,
-        level: int,
-        toc_index: str,
-        chat_id: str,
-        toc_title: str,
-        is_open: bool = False,
-    ) -> None:
-        """
-        Args:
-            chat: The chat associated with this option.
-            is_open: True if this is the chat that's currently open.
-        """
-        super().__init__()
-        self.chat_id: str = chat_id
-        self.is_open: bool = is_open
-        self.toc_title: str = toc_title
-        self.level: int = level
-        self.toc_index: str = toc_index
-
-    @property
-    def is_title(self) -> bool:
-        return self.chat_id == ""
-
-    def compose(self) -> ComposeResult:
-        if self.is_title:
-            yield Static(f"{self.toc_index} {self.toc_title}")
-        else:
-            yield Static(f"[{self.chat_id}] ...")
-
-    def on_mount(self) -> None:
-        # Adjust padding based on level
-        if self.is_title:
-            padding_value = self.level * 2
-            # add class based on level
-            if self.level == 1:
-                self.add_class("-h1")
-            elif self.level == 2:
-                self.add_class("-h2")
-            else:
-                self.add_class("-h3")
-        else:
-            self.add_class("-conversation")
-            padding_value = (self.level * 2) + 2
-        self.styles.padding = (0, 0, 0, padding_value)
-
-
 class ChatList(Widget):
     DEFAULT_CSS = """
     ChatList {
@@ -376,7 +558,9 @@ class ChatList(Widget):
 
     current_chat_id: reactive[str | None] = reactive(None)
     current_book: Book | None = None
-    all_convo: List[Convo]
+    all_convo: List[tuple[int, str]]  # (id, toc address) of the conversations
+    # chapter summaries by toc address, shown as tooltips of the titles
+    summaries: Dict[str, ChapterSummaryGen] = {}
 
     @dataclass
     class ChatOpened(Message):
@@ -386,81 +570,63 @@ class ChatList(Widget):
 
     def compose(self) -> ComposeResult:
         with Vertical(id="cl-header-container"):
-            self.options = []
-            self.option_list = ListView(
-                *self.options,
-                id="cl-option-list",
-            )
-            yield self.option_list
+            yield NavigatorView(id="cl-option-list")
 
-    def on_list_view_highlighted(self, event: ListView.Highlighted) -> None:
-        item = event.item
-        if isinstance(item, ChatListItem):
-            self.current_chat_id = item.chat_id
-            self.post_message(self.ChatOpened(item))
+    def on_mount(self) -> None:
+        self.app.chat_streams.changed.subscribe(self, self._stream_changed)
+
+    def _stream_changed(self, stream: ChatStream) -> None:
+        """Show whether a reply is waiting or streamed on its conversation."""
+        ol = self.query_one("#cl-option-list", NavigatorView)
+        live = self.app.chat_streams.get(stream.convo_id) is stream
+        index = ol.rows.set_status(
+            stream.toc_address, str(stream.convo_id), stream.status if live else ""
+        )
+        if index >= 0:
+            ol.refresh_row(index)
+
+    def on_navigator_view_highlighted(self, event: NavigatorView.Highlighted) -> None:
+        self.current_chat_id = event.item.chat_id
+        self.post_message(self.ChatOpened(event.item))
         event.stop()
 
     async def insert_chat_list_item(self, convo: Convo, toc_address: str):
-        ol = self.query_one("#cl-option-list", ListView)
-        insertion_index = 0
-        level = 0
-        for child_idx, child in enumerate(ol.children):
-            assert isinstance(child, ChatListItem)
-            if child.toc_index == toc_address:
-                insertion_index = child_idx + 1
-                level = child.level
-
-        cli = ChatListItem(
-            level=level,
-            toc_index=str(convo.toc_address),
-            chat_id=str(convo.id),
-            toc_title="",
-            is_open=False,
-        )
-        await ol.insert(insertion_index, [cli])
-        ol.index = insertion_index
+        ol = self.query_one("#cl-option-list", NavigatorView)
+        index = ol.rows.add_conversation(toc_address, str(convo.id))
+        ol.rows_changed(index)
+        ol.cursor = index
 
     def load_conversation_list_items(self):
 
-        ol = self.query_one("#cl-option-list", ListView)
-        ol.clear()
+        ol = self.query_one("#cl-option-list", NavigatorView)
+        rows = NavigatorRows()
         if isinstance(self.current_book, Book) and isinstance(self.all_convo, list):
             if self.current_book.toc_tree:
-                self.all_convo
                 toc_tree = TocTreeNode.from_json(json.loads(self.current_book.toc_tree))
-                for node in toc_tree.preorder():
-                    convo_key = node.conversation_key()
-                    matching_convos = [
-                        c for c in self.all_convo if c.toc_address == convo_key
-                    ]
-                    ol.append(
-                        ChatListItem(
-                            level=node.level,
-                            toc_index=convo_key,
-                            chat_id="",
-                            toc_title=node.title,
-                            is_open=False,
-                        )
+                rows = NavigatorRows.from_toc(
+                    toc_tree,
+                    [(address, str(convo_id)) for convo_id, address in self.all_convo],
+                    {a: summary_tooltip(s) for a, s in self.summaries.items()},
+                )
+                for stream in self.app.chat_streams:
+                    rows.set_status(
+                        stream.toc_address, str(stream.convo_id), stream.status
                     )
-                    for convo in matching_convos:
-                        ol.append(
-                            ChatListItem(
-                                level=node.level + 1,
-                                toc_index=convo.toc_address,
-                                chat_id=str(convo.id),
-                                toc_title=node.title,
-                                is_open=False,
-                            )
-                        )
-        else:
-            return []
+        ol.set_rows(rows)
+
+    def set_summary(self, toc_address: str, summary: ChapterSummaryGen) -> None:
+        """Show the new summary of a chapter on its title."""
+        self.summaries = {**self.summaries, toc_address: summary}
+        title = self.query_one("#cl-option-list", NavigatorView).rows.title(toc_address)
+        if title is not None:
+            title.tooltip = summary_tooltip(summary)
 
     def action_cursor_up(self) -> None:
         """Move the cursor up in the chat list."""
-        ol = self.query_one("#cl-option-list", ListView)
+        ol = self.query_one("#cl-option-list", NavigatorView)
         ol.action_cursor_up()
 
     def action_cursor_down(self) -> None:
         """Move the cursor down in the chat list."""
-        ol = self.query_one("#cl-option-list", ListView)
+        ol = self.query_one("#cl-option-list", NavigatorView)
         ol.action_cursor_down()
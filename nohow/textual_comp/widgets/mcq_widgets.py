@@ -0,0 +1,85 @@
+from __future__ import annotations
+from typing import List
+
+from textual.app import ComposeResult
+from textual.widget import Widget
+from textual.widgets import Checkbox, Markdown
+
+from nohow.prompts.mcq import MCQGen
+
+
+class MCQFormWidget(Widget):
+    """Widget for displaying MCQ forms."""
+
+    DEFAULT_CSS = """
+    MCQFormWidget {
+        border: solid $secondary;
+        padding: 1 1;
+        height: auto;
+
+        &.-correct {
+            border: solid $success;
+        }
+        &.-wrong {
+            border: solid $error;
+        }
+    }
+    """
+
+    BINDINGS = []
+
+    _mcq: MCQGen | None = None
+
+    def __init__(self, mcq: MCQGen | None = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._mcq = mcq
+
+    def compose(self) -> ComposeResult:
+        yield Markdown("MCQ Form - Under Construction", id="mcq_form_label")
+        yield Checkbox("Option 1", id="option_1")
+        yield Checkbox("Option 2", id="option_2")
+        yield Checkbox("Option 3", id="option_3")
+        yield Checkbox("Option 4", id="option_4")
+
+    @property
+    def mcq(self) -> MCQGen | None:
+        return self._mcq
+
+    def set_mcq(self, mcq: MCQGen) -> None:
+        """Set the MCQ to display."""
+        self._mcq = mcq
+        # updsate the question
+        mcq_label = self.query_one("#mcq_form_label", Markdown)
+        mcq_label.update(mcq.question)
+        # update the options
+        updated_options = []
+        for idx, option in enumerate(mcq.choices):
+            checkbox = self.query_one(f"#option_{idx+1}", Checkbox)
+            checkbox.label = option
+            checkbox.display = True
+            updated_options.append(checkbox)
+        # hide unused options
+        for idx in range(len(mcq.choices), 4):
+            checkbox = self.query_one(f"#option_{idx+1}", Checkbox)
+            checkbox.display = False
+
+    def selected_answers(self) -> List[int]:
+        """0-based indices of the checked choices."""
+        if self._mcq is None:
+            return []
+        return [
+            idx
+            for idx in range(len(self._mcq.choices))
+            if self.query_one(f"#option_{idx+1}", Checkbox).value
+        ]
+
+    def show_result(self, correct: bool) -> None:
+        """Lock the form and highlight whether the answer was right."""
+        self.set_class(correct, "-correct")
+        self.set_class(not correct, "-wrong")
+        for checkbox in self.query(Checkbox):
+            checkbox.disabled = True
+
+    def on_mount(self) -> None:
+        if self._mcq:
+            self.set_mcq(self._mcq)
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from typing import List, Optional
+
+from markdown_it import MarkdownIt
+from markdown_it.token import Token
+
+from nohow.retrieval.index import content_hash
+
+
+class TokenCache:
+    """Parsed documents by content hash, least recently used first out.
+
+    Tokens are only read once parsed, so a cached list is shared by every
+    view showing the same document.
+    """
+
+    def __init__(self, capacity: int = 32) -> None:
+        self.capacity = capacity
+        self._tokens: OrderedDict[str, List[Token]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[List[Token]]:
+        tokens = self._tokens.get(key)
+        if tokens is not None:
+            self._tokens.move_to_end(key)
+        return tokens
+
+    def put(self, key: str, tokens: List[Token]) -> None:
+        self._tokens[key] = tokens
+        self._tokens.move_to_end(key)
+        while len(self._tokens) > self.capacity:
+            self._tokens.popitem(last=False)
+
+
+_TOKENS = TokenCache()
+
+
+def _parse(markdown: str) -> List[Token]:
+    return MarkdownIt("gfm-like").parse(markdown)
+
+
+async def parse_markdown(markdown: str) -> List[Token]:
+    """Tokens of a document, parsed in a thread unless already cached."""
+    key = content_hash(markdown)
+    tokens = _TOKENS.get(key)
+    if tokens is None:
+        tokens = await asyncio.to_thread(_parse, markdown)
+        _TOKENS.put(key, tokens)
+    return tokens
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import List, Optional
+
+from textual.widgets import Markdown
+
+
+class MarkdownStreamRenderer:
+    """Streams text into a `Markdown` widget, at most once per frame.
+
+    Chunks are buffered by `write` and appended together by a background
+    task. `Markdown.append` only reparses the document from the start of
+    its last block, so the closed blocks are never rendered again; the
+    interval between appends adapts to their measured cost, so rendering
+    takes at most `1 / load_factor` of the event loop whatever the model
+    speed or document size.
+    """
+
+    def __init__(
+        self,
+        markdown: Markdown,
+        frame_interval: float = 1 / 30,
+        max_interval: float = 0.5,
+        load_factor: float = 4.0,
+    ) -> None:
+        self.markdown = markdown
+        self.frame_interval = frame_interval
+        self.max_interval = max_interval
+        self.load_factor = load_factor
+        self.interval = frame_interval
+        self.flush_count = 0
+        self._render_cost: Optional[float] = None  # moving average, seconds
+        self._pending: List[str] = []
+        self._wakeup = asyncio.Event()
+        self._last_flush = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def write(self, chunk: str) -> None:
+        """Queue a chunk; it is rendered with the next frame."""
+        if not chunk:
+            return
+        self._pending.append(chunk)
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            delay = self._last_flush + self.interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Render the queued chunks now."""
+        self._wakeup.clear()
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending.clear()
+        start = time.perf_counter()
+        # shielded: cancelling the stream must not drop text being appended
+        await asyncio.shield(self.markdown.append(text))
+        self._last_flush = time.perf_counter()
+        self.flush_count += 1
+        self._adapt(self._last_flush - start)
+
+    def _adapt(self, cost: float) -> None:
+        if self._render_cost is None:
+            self._render_cost = cost
+        else:
+            self._render_cost = 0.8 * self._render_cost + 0.2 * cost
+        self.interval = min(
+            self.max_interval,
+            max(self.frame_interval, self._render_cost * self.load_factor),
+        )
+
+    def cancel(self) -> None:
+        """Stop the background task and drop what is still queued.
+
+        For a widget unmounted mid-stream, which must not be updated anymore.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._pending.clear()
+
+    async def close(self) -> None:
+        """Stop the background task and render what is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from rich.segment import Segment
+from rich.style import Style
+from textual import events
+from textual.binding import Binding
+from textual.geometry import Region, Size
+from textual.message import Message
+from textual.reactive import reactive
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+from nohow.mkdutils import TocTreeNode
+
+
+@dataclass(eq=False)
+class ChatListItem:
+    """A row of the navigator: a TOC title or a conversation under it."""
+
+    level: int
+    toc_index: str
+    chat_id: str  # "" for a TOC title
+    toc_title: str
+    is_open: bool = False
+    tooltip: Optional[str] = field(default=None)
+    status: str = ""  # of the reply streamed for a conversation
+
+    @property
+    def is_title(self) -> bool:
+        return self.chat_id == ""
+
+    @property
+    def label(self) -> str:
+        if self.is_title:
+            return f"{self.toc_index} {self.toc_title}"
+        if self.status:
+            return f"[{self.chat_id}] ... ({self.status})"
+        return f"[{self.chat_id}] ..."
+
+    @property
+    def indent(self) -> int:
+        # same padding as the former ListItem rows
+        return self.level * 2 if self.is_title else self.level * 2 + 2
+
+    @property
+    def style_class(self) -> str:
+        if not self.is_title:
+            return "-conversation"
+        return {1: "-h1", 2: "-h2"}.get(self.level, "-h3")
+
+
+class _Fenwick:
+    """Prefix sums of block sizes, updated and searched in O(log n)."""
+
+    def __init__(self, sizes: Sequence[int]) -> None:
+        self.tree = [0] * (len(sizes) + 1)
+        for i, size in enumerate(sizes, 1):
+            self.tree[i] += size
+            parent = i + (i & -i)
+            if parent <= len(sizes):
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index: int, delta: int) -> None:
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index: int) -> int:
+        """Sum of the sizes of the blocks before `index`."""
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def find(self, position: int) -> Tuple[int, int]:
+        """Block containing `position`, and the offset of it in the block."""
+        index = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            nxt = index + step
+            if nxt < len(self.tree) and self.tree[nxt] <= position:
+                index = nxt
+                position -= self.tree[nxt]
+            step >>= 1
+        return index, position
+
+
+@dataclass(eq=False)
+class _Block:
+    title: ChatListItem
+    conversations: List[ChatListItem] = field(default_factory=list)
+
+
+class NavigatorRows:
+    """Rows of the navigator: one block per TOC node, its title then its
+    conversations.
+
+    Conversations are grouped by address once; a Fenwick tree over the block
+    sizes maps row indexes to blocks, so adding or removing a conversation
+    and renaming a node only touch the affected rows.
+    """
+
+    def __init__(self, blocks: Sequence[_Block] = ()) -> None:
+        self._blocks: List[_Block] = list(blocks)
+        self._sizes = _Fenwick([1 + len(b.conversations) for b in self._blocks])
+        self._length = sum(1 + len(b.conversations) for b in self._blocks)
+        # the synthetic TOC root shares its address with the first chapter,
+        # which wins
+        self._block_of: Dict[str, int] = {
+            b.title.toc_index: i for i, b in enumerate(self._blocks)
+        }
+
+    @classmethod
+    def from_toc(
+        cls,
+        toc_tree: TocTreeNode,
+        conversations: Iterable[Tuple[str, str]] = (),
+        tooltips: Optional[Mapping[str, str]] = None,
+    ) -> "NavigatorRows":
+        """Rows of a TOC; `conversations` are (toc address, chat id) pairs."""
+        by_address: Dict[str, List[str]] = {}
+        for address, chat_id in conversations:
+            by_address.setdefault(address, []).append(chat_id)
+        tooltips = tooltips or {}
+        nodes = list(toc_tree.preorder())
+        # conversations of an address shared with the root go to the chapter
+        owner = {node.conversation_key(): i for i, node in enumerate(nodes)}
+        blocks = []
+        for i, node in enumerate(nodes):
+            address = node.conversation_key()
+            title = ChatListItem(
+                level=node.level,
+                toc_index=address,
+                chat_id="",
+                toc_title=node.title,
+                tooltip=tooltips.get(address),
+            )
+            chat_ids = by_address.get(address, []) if owner[address] == i else []
+            blocks.append(
+                _Block(
+                    title,
+                    [
+                        ChatListItem(node.level + 1, address, chat_id, node.title)
+                        for chat_id in chat_ids
+                    ],
+                )
+            )
+        return cls(blocks)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int) -> ChatListItem:
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        block, offset = self._sizes.find(index)
+        return self._row(self._blocks[block], offset)
+
+    def __iter__(self) -> Iterator[ChatListItem]:
+        for block in self._blocks:
+            yield block.title
+            yield from block.conversations
+
+    @staticmethod
+    def _row(block: _Block, offset: int) -> ChatListItem:
+        return block.title if offset == 0 else block.conversations[offset - 1]
+
+    def title(self, address: str) -> Optional[ChatListItem]:
+        block = self._block_of.get(address)
+        return None if block is None else self._blocks[block].title
+
+    def index_of(self, address: str, chat_id: str = "") -> int:
+        """Row of a TOC title (or of one of its conversations), -1 if absent."""
+        block_index = self._block_of.get(address)
+        if block_index is None:
+            return -1
+        start = self._sizes.prefix(block_index)
+        if not chat_id:
+            return start
+        block = self._blocks[block_index]
+        for offset, row in enumerate(block.conversations, 1):
+            if row.chat_id == chat_id:
+                return start + offset
+        return -1
+
+    def add_conversation(self, address: str, chat_id: str) -> int:
+        """Append a conversation under its TOC title; returns its row."""
+        block_index = self._block_of[address]
+        block = self._blocks[block_index]
+        block.conversations.append(
+            ChatListItem(block.title.level + 1, address, chat_id, block.title.toc_title)
+        )
+        self._sizes.add(block_index, 1)
+        self._length += 1
+        return self._sizes.prefix(block_index) + len(block.conversations)
+
+    def set_status(self, address: str, chat_id: str, status: str) -> int:
+        """Change the status of a conversation; returns its row, -1 if absent."""
+        index = self.index_of(address, chat_id)
+        if index < 0 or not chat_id:
+            return -1
+        self[index].status = status
+        return index
+
+
+class NavigatorView(ScrollView, can_focus=True):
+    """Virtualized list of the `NavigatorRows` of a book.
+
+    Only the visible lines are rendered (Line API), so mounting and
+    scrolling cost the same whatever the size of the book.
+    """
+
+    COMPONENT_CLASSES = {
+        "navigator--h1",
+        "navigator--h2",
+        "navigator--h3",
+        "navigator--conversation",
+        "navigator--cursor",
+    }
+
+    DEFAULT_CSS = """
+    NavigatorView {
+        width: 1fr;
+        height: 1fr;
+        overflow-x: hidden;
+        background: $surface;
+
+        & > .navigator--h1 {
+            color: $primary;
+            text-style: bold underline;
+        }
+        & > .navigator--h2 {
+            color: $primary 90%;
+        }
+        & > .navigator--h3 {
+            color: $primary 80%;
+        }
+        & > .navigator--conversation {
+            text-style: italic;
+            color: $accent 90%;
+        }
+        & > .navigator--cursor {
+            background: $block-cursor-blurred-background;
+        }
+        &:focus > .navigator--cursor {
+            background: $block-cursor-background;
+            color: $block-cursor-foreground;
+        }
+    }
+    """
+
+    BINDINGS = [
+        Binding("up", "cursor_up", "Cursor up", show=False),
+        Binding("down", "cursor_down", "Cursor down", show=False),
+        Binding("home", "first", "First", show=False),
+        Binding("end", "last", "Last", show=False),
+        Binding("pageup", "page_up", "Page up", show=False),
+        Binding("pagedown", "page_down", "Page down", show=False),
+    ]
+
+    cursor: reactive[int] = reactive(-1, always_update=True)
+
+    class Highlighted(Message):
+        def __init__(self, item: ChatListItem) -> None:
+            super().__init__()
+            self.item = item
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.rows = NavigatorRows()
+
+    def set_rows(self, rows: NavigatorRows) -> None:
+        """Replace all the rows; the first one is highlighted."""
+        self.rows = rows
+        self.rows_changed()
+        self.cursor = 0 if len(rows) else -1
+
+    def refresh_row(self, index: int) -> None:
+        self.refresh(Region(0, index - round(self.scroll_y), self.size.width, 1))
+
+    def rows_changed(self, start: int = 0) -> None:
+        """Redraw after rows were inserted or removed at `start`."""
+        # no horizontal scrolling: lines are cropped to the view width
+        self.virtual_size = Size(0, len(self.rows))
+        top = max(0, start - round(self.scroll_y))
+        if top < self.size.height:
+            self.refresh(Region(0, top, self.size.width, self.size.height - top))
+
+    @property
+    def highlighted(self) -> Optional[ChatListItem]:
+        if 0 <= self.cursor < len(self.rows):
+            return self.rows[self.cursor]
+        return None
+
+    def validate_cursor(self, cursor: int) -> int:
+        if not len(self.rows):
+            return -1
+        return max(0, min(cursor, len(self.rows) - 1))
+
+    def watch_cursor(self, old: int, new: int) -> None:
+        self.refresh_row(old)
+        self.refresh_row(new)
+        item = self.highlighted
+        if item is None:
+            return
+        self.scroll_to_region(Region(0, new, self.size.width, 1), animate=False)
+        self.post_message(self.Highlighted(item))
+
+    def _row_style(self, item: ChatListItem, selected: bool) -> Style:
+        style = self.get_component_rich_style(f"navigator-{item.style_class}")
+        if selected:
+            style += self.get_component_rich_style("navigator--cursor")
+        return style
+
+    def render_line(self, y: int) -> Strip:
+        index = y + round(self.scroll_y)
+        width = self.size.width
+        base = self.rich_style
+        if not 0 <= index < len(self.rows):
+            return Strip.blank(width, base)
+        item = self.rows[index]
+        style = base + self._row_style(item, index == self.cursor)
+        text = " " * item.indent + item.label
+        return Strip([Segment(text, style)]).crop_extend(0, width, style)
+
+    def on_click(self, event: events.Click) -> None:
+        index = event.y + round(self.scroll_y)
+        if 0 <= index < len(self.rows):
+            self.cursor = index
+
+    def on_mouse_move(self, event: events.MouseMove) -> None:
+        index = event.y + round(self.scroll_y)
+        item = self.rows[index] if 0 <= index < len(self.rows) else None
+        self.tooltip = item.tooltip if item is not None else None
+
+    def action_cursor_up(self) -> None:
+        if self.cursor > 0:
+            self.cursor -= 1
+
+    def action_cursor_down(self) -> None:
+        if self.cursor < len(self.rows) - 1:
+            self.cursor += 1
+
+    def action_first(self) -> None:
+        self.cursor = 0
+
+    def action_last(self) -> None:
+        self.cursor = len(self.rows) - 1
+
+    def action_page_up(self) -> None:
+        self.cursor -= max(1, self.scrollable_content_region.height)
+
+    def action_page_down(self) -> None:
+        self.cursor += max(1, self.scrollable_content_region.height)
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from textual.widget import Widget
+
+from nohow.utils import ConfigSection
+
+
+@dataclass(frozen=True, slots=True)
+class ReaderConfig(ConfigSection):
+    """The `reader:` section of `.nohow.yml`."""
+
+    live_panes: int = 8  # chapter and chat panes kept mounted
+    render_cache: int = 32  # rendered chapters kept in memory
+    render_cache_on_disk: bool = True  # and in the render_cache directory
+    virtualize_from: int = 30000  # characters from which chapters render as scrolled
+    max_streams: int = 3  # chat replies streamed at the same time, others wait
+
+
+@dataclass(frozen=True, slots=True)
+class PaneState:
+    """What is kept of a pane while it is unmounted."""
+
+    scroll_y: float = 0.0
+    draft: str = ""  # unsent text of the chat input
+    # oldest message built by a conversation, scroll_y depends on it
+    first_shown: Optional[int] = None
+
+
+class PaneLRU:
+    """Ids of the mounted panes, least recently viewed first."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = max(1, capacity)
+        self._order: OrderedDict[str, None] = OrderedDict()
+
+    def __contains__(self, pane_id: str) -> bool:
+        return pane_id in self._order
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def touch(self, pane_id: str) -> None:
+        self._order[pane_id] = None
+        self._order.move_to_end(pane_id)
+
+    def discard(self, pane_id: str) -> None:
+        self._order.pop(pane_id, None)
+
+    def to_evict(self, is_busy: Callable[[str], bool]) -> List[str]:
+        """Panes to unmount to get back to capacity, oldest first.
+
+        Busy panes (streaming, saving) are kept even if over capacity; the
+        most recently viewed pane is never evicted.
+        """
+        excess = len(self._order) - self.capacity
+        evicted: List[str] = []
+        for pane_id in list(self._order)[:-1]:
+            if len(evicted) >= excess:
+                break
+            if not is_busy(pane_id):
+                evicted.append(pane_id)
+        for pane_id in evicted:
+            del self._order[pane_id]
+        return evicted
+
+
+def restore_scroll(area: Widget, y: float) -> bool:
+    """Scroll `area` back to `y`; False while its content is still too short.
+
+    Markdown content is laid out some time after mounting, so panes call it
+    again on `Markdown.TableOfContentsUpdated` until it succeeds.
+    """
+    area.scroll_to(y=y, animate=False, immediate=True)
+    return area.max_scroll_y >= y
+
+
+def has_running_workers(widget: Widget) -> bool:
+    """True while a worker started by the widget is running.
+
+    Workers are cancelled when their widget is removed.
+    """
+    return any(w.node is widget and not w.is_finished for w in widget.app.workers)
@@ -8,12 +8,18 @@ from textual.app import ComposeResult
 
 
 class IsTyping(Horizontal):
+    """Streaming indicator with a Stop button (`#stop_button`) to cancel the stream."""
+
     DEFAULT_CSS = """
     IsTyping {
         height: 1;
         }
+    IsTyping > #stop_button {
+        margin-left: 2;
+    }
     """
 
     def compose(self) -> ComposeResult:
         yield LoadingIndicator()
         yield Label("  AI is responding ")
+        yield Button("Stop", id="stop_button", variant="error", compact=True)
@@ -1,4 +1,6 @@
+from dataclasses import fields
 from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Self
 
 
 def format_timestamp(timestamp: float) -> str:
@@ -13,3 +15,15 @@ def format_timestamp(timestamp: float) -> str:
     utc_dt = datetime.fromtimestamp(timestamp, timezone.utc)
     local_dt = utc_dt.astimezone()
     return local_dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ConfigSection:
+    """Base of the dataclasses read from a section of `.nohow.yml`."""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> Self:
+        """Build from a section of the config; unknown keys are ignored."""
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in (config or {}).items() if k in known})
@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import create_engine
+from textual.app import App
+
+from nohow.db.models import Book
+from nohow.db.utils import get_session, setup_database
+from nohow.main import AppContext
+from nohow.textual_comp.widgets.chapter_render import ChapterRenderCache
+from nohow.textual_comp.widgets.chat_streams import ChatStreams
+
+
+class DbApp:
+    """The database side of NoHowApp, for tests.
+
+    Used alone where only `get_db` is needed, or mixed into a Textual App.
+    """
+
+    def __init__(self, db_url: str, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.db_url = db_url
+
+    def get_db(self):
+        return create_engine(self.db_url)
+
+
+class ReaderApp(DbApp, App):
+    """A Textual app with the services of NohowApp, on the fake backend."""
+
+    def __init__(self, db_url: str, reader: dict | None = None) -> None:
+        super().__init__(db_url)
+        self.app_context = AppContext()
+        self.app_context.backend = "fake"
+        self.app_context.retrieval = {"enabled": False}
+        self.app_context.reader = reader or {}
+        self.render_cache = ChapterRenderCache()
+        self.chat_streams = ChatStreams(self)
+
+
+@pytest.fixture
+def db_url(tmp_path) -> str:
+    """A new database in the test directory."""
+    db_url = f"sqlite:///{tmp_path / 'test.db'}"
+    setup_database(db_url=db_url)
+    return db_url
+
+
+@pytest.fixture
+def db_app(db_url) -> DbApp:
+    return DbApp(db_url)
+
+
+@pytest.fixture
+def book_id(db_app) -> int:
+    """A book without TOC in the test database."""
+    with get_session(db_app.get_db()) as session:
+        book = Book(title="Baking", toc="")
+        session.add(book)
+        session.commit()
+        return book.id
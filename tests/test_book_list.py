@@ -0,0 +1,66 @@
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from nohow.db.models import Book, list_book_titles
+from nohow.db.utils import add_missing_columns, get_session, setup_database
+from nohow.textual_comp.widgets.booklist_widgets import BookListModel
+
+from conftest import DbApp
+
+
+def test_missing_columns_are_added_to_an_older_database(tmp_path) -> None:
+    db_url = f"sqlite:///{tmp_path / 'old.db'}"
+    with create_engine(db_url).begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE books (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL,"
+            " toc TEXT, toc_tree TEXT)"
+        )
+        connection.exec_driver_sql("INSERT INTO books (title) VALUES ('Baking')")
+    engine = setup_database(db_url=db_url)
+    assert "updated_at" in {c["name"] for c in inspect(engine).get_columns("books")}
+    assert list_book_titles(DbApp(db_url)) == [(1, "Baking", 0.0)]
+
+
+def test_only_addable_columns_are_migrated(tmp_path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE books (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL)"
+        )
+    # toc is not listed: left alone
+    add_missing_columns(engine, {"books": ["updated_at"]})
+    columns = {c["name"] for c in inspect(engine).get_columns("books")}
+    assert columns == {"id", "title", "updated_at"}
+
+    # NOT NULL without a server_default: SQLite would reject it
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE books")
+        connection.exec_driver_sql("CREATE TABLE books (id INTEGER PRIMARY KEY)")
+    with pytest.raises(ValueError, match="books.title"):
+        add_missing_columns(engine, {"books": ["title"]})
+
+
+def test_refresh_only_reports_the_changes(db_app) -> None:
+    app = db_app
+    with get_session(app.get_db()) as session:
+        session.add_all(
+            [Book(title=t, toc="", updated_at=i) for i, t in enumerate("abc", 1)]
+        )
+        session.commit()
+
+    books = BookListModel()
+    diff = books.refresh(app)
+    assert diff is not None and diff.changed == [3, 2, 1]
+    assert books.refresh(app) is None
+
+    with get_session(app.get_db()) as session:
+        session.query(Book).filter_by(id=1).one().title = "A"
+        session.query(Book).filter_by(id=2).delete()
+        session.commit()
+    diff = books.refresh(app)
+    assert diff is not None
+    # the latest book seen is reloaded: it may share its updated_at with
+    # a change made just after the previous refresh
+    assert (diff.changed, diff.removed) == ([1, 3], [2])
+    assert books.order == [1, 3]
+    assert books.titles == {1: "A", 3: "c"}
@@ -0,0 +1,156 @@
+import asyncio
+import re
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from nohow.db.models import Book, load_book_chapters, save_chapter_content
+from nohow.db.utils import get_session
+from nohow.llm.fake import FakeStreamingChatModel
+from nohow.llm.hedging import StreamPolicy
+from nohow.mkdutils import extract_toc_tree
+from nohow.prompts.book_plan import BookGenerator, BookPlan, PlanNode, run_plan
+from nohow.retrieval.sources import SourceLibrary, SourcesConfig
+
+TOC = """# Bread
+## Flour
+## Water
+### Hardness
+# Pastry
+## Butter
+"""
+
+
+def test_plan_dependencies_and_critical_path() -> None:
+    plan = BookPlan.from_toc(extract_toc_tree(TOC))
+    deps = {a: n.depends_on for a, n in plan.nodes.items()}
+    assert deps == {
+        "0": (),
+        "0.0": ("0",),
+        "0.1": ("0", "0.0"),
+        "0.1.0": ("0.1",),
+        "1": ("0",),
+        "1.0": ("1",),
+    }
+    assert plan.nodes["0.1.0"].titles == ("Hardness", "Water", "Bread")
+
+    report = plan.report()
+    assert report.critical_path == ("0", "0.0", "0.1", "0.1.0")
+    assert report.max_width == 2  # 0.0 with 1, then 0.1 with 1.0
+    assert report.speedup_bound == 1.5
+
+    path, length = plan.critical_path({"0": 1, "1": 10, "1.0": 10})
+    assert path == ["0", "1", "1.0"] and length == 21
+
+
+def test_run_plan_respects_dependencies_and_skips_after_failure() -> None:
+    plan = BookPlan.from_toc(extract_toc_tree(TOC))
+    started: list = []
+    done: set = set()
+    running = 0
+    peak = 0
+
+    async def run_node(node: PlanNode) -> None:
+        nonlocal running, peak
+        assert set(node.depends_on) <= done
+        started.append(node.address)
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if node.address == "1":
+            raise RuntimeError("boom")
+        done.add(node.address)
+
+    run = asyncio.run(run_plan(plan, run_node, max_concurrency=4))
+    assert started[0] == "0"
+    assert peak == 2
+    assert run.failed == {"1": "boom"}
+    assert run.skipped == ["1.0"]
+    assert set(run.durations) == {"0", "0.0", "0.1", "0.1.0"}
+
+
+class _TitleModel(FakeStreamingChatModel):
+    """Replies with `template` filled with the chapter title of the prompt."""
+
+    title_pattern: str = ""
+    template: str = ""
+    prompts: list = []
+
+    def _reply(self, messages) -> str:
+        prompt = messages[-1].content
+        self.prompts.append(prompt)
+        return self.template.format(title=re.search(self.title_pattern, prompt)[1])
+
+    async def _astream(self, messages, *args, **kwargs):
+        yield ChatGenerationChunk(message=AIMessageChunk(content=self._reply(messages)))
+
+    async def _agenerate(self, messages, *args, **kwargs):
+        message = AIMessage(content=self._reply(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class _Context:
+    """The parts of AppContext a BookGenerator uses."""
+
+    stream_policy = StreamPolicy()
+    chapter_retrieval = None
+
+    def __init__(self) -> None:
+        self.source_library = SourceLibrary(SourcesConfig())
+        self.models = {
+            "chapter": _TitleModel(
+                title_pattern=r'chapter titled "(.*?)"',
+                template="Text of {title}.",
+                prompts=[],
+            ),
+            "summary": _TitleModel(
+                title_pattern=r"Chapter: (.*)",
+                template='[{{"summary": "Summary of {title}"}}]',
+                prompts=[],
+            ),
+        }
+
+    def llm_for(self, kind: str):
+        return self.models[kind]
+
+
+def test_book_generator_saves_and_summarizes_what_it_builds_on(db_app) -> None:
+    toc = "# Bread\n## Flour\n## Water\n# Pastry\n"
+    with get_session(db_app.get_db()) as session:
+        book = Book(title="Baking", toc=toc)
+        session.add(book)
+        session.commit()
+        session.refresh(book)
+        session.expunge(book)
+    db_app.app_context = context = _Context()
+    save_chapter_content(db_app, book.id, "0", "Bread is flour and water.")
+    save_chapter_content(db_app, book.id, "1", "Pastry is mostly butter.")
+
+    done = []
+    generator = BookGenerator(
+        db_app,
+        book,
+        BookPlan.from_toc(extract_toc_tree(toc)),
+        on_chapter=lambda address, content, summary: done.append(address),
+    )
+    assert generator.missing() == ["0.0", "0.1"]
+    # Pastry is kept and nothing missing builds on it: not summarized
+    assert generator.stale_summaries() == ["0"]
+
+    run = asyncio.run(generator.run())
+
+    assert run.failed == {} and run.kept == ["0", "1"]
+    assert run.describe().startswith("2 chapters in")
+    assert sorted(done) == ["0", "0.0", "0.1"]
+    saved = {c.toc_address: c.content for c in load_book_chapters(db_app, book.id)}
+    assert saved["0.0"] == "Text of Flour." and saved["0.1"] == "Text of Water."
+    summarized = context.models["summary"].prompts
+    assert sorted(re.search(r"Chapter: (.*)", p).group(1) for p in summarized) == [
+        "Bread",
+        "Flour",
+        "Water",
+    ]
+    # Water follows Flour in Bread: it is written from their summaries
+    water = next(p for p in context.models["chapter"].prompts if '"Water"' in p)
+    assert "[0] Summary of Bread" in water and "[0.0] Summary of Flour" in water
@@ -0,0 +1,208 @@
+import asyncio
+
+from rich.style import Style
+from textual.app import App
+from textual.geometry import Offset
+from textual.selection import Selection
+
+from nohow.textual_comp.widgets.chapter_render import (
+    ChapterBlocks,
+    ChapterRenderCache,
+    ChapterStyle,
+    RenderedChapter,
+    RenderKey,
+    render_chapter,
+    split_blocks,
+)
+from nohow.textual_comp.widgets.md_render import parse_markdown
+
+CHAPTER = (
+    "# Bread\n\nFlour, *water* and `salt`.\n\n- knead\n"
+    "- bake, [as the mill says](https://mill.example/bread)\n"
+)
+LONG_CHAPTER = "\n\n".join(
+    f"## Step {i}\n\nMix the flour and the water, then wait {i} minutes.\n\n"
+    f"| flour | water |\n|---|---|\n| {i} | {i} |"
+    for i in range(200)
+)
+PLAIN = ChapterStyle("plain", theme=None, code_theme="default")
+
+
+class Reader(App):
+    def __init__(self, cache: ChapterRenderCache, markdown: str = CHAPTER) -> None:
+        super().__init__()
+        self.cache = cache
+        self.markdown = markdown
+
+    def compose(self):
+        yield RenderedChapter(self.markdown, cache=self.cache)
+
+
+async def rendered(app: App, pilot) -> None:
+    """Wait for the chapter, and the blocks it renders, to be shown."""
+    while any(not worker.is_finished for worker in app.workers):
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+
+
+def test_rendered_lines_survive_a_restart(tmp_path) -> None:
+    async def style() -> ChapterStyle:
+        app = App()
+        async with app.run_test():
+            return ChapterStyle.from_app(app)
+
+    chapter_style = asyncio.run(style())
+    key = RenderKey("abc", chapter_style.name, 40)
+    cache = ChapterRenderCache(directory=tmp_path)
+    lines = cache.render(CHAPTER, key, chapter_style)
+    assert any("Bread" in line.text for line in lines)
+
+    restarted = ChapterRenderCache(directory=tmp_path)
+    assert restarted.cached(key) is None
+    reloaded = restarted.get(key)
+    assert reloaded is not None
+    assert [line.text for line in reloaded] == [line.text for line in lines]
+
+    def styles(line):
+        return [(segment.text, segment.style or Style()) for segment in line]
+
+    assert styles(reloaded[0]) == styles(lines[0])
+    links = [s.style.link for line in reloaded for s in line if s.style]
+    assert "https://mill.example/bread" in links
+
+
+def test_memory_cache_evicts_the_least_recently_used() -> None:
+    cache = ChapterRenderCache(capacity=2)
+    keys = [RenderKey(str(i), "theme", 40) for i in range(3)]
+    for key in keys:
+        cache.put(key, [])
+    assert cache.cached(keys[0]) is None
+    assert cache.cached(keys[2]) == []
+
+
+def test_view_renders_once_per_width_and_theme() -> None:
+    cache = ChapterRenderCache()
+
+    async def run() -> None:
+        app = Reader(cache)
+        async with app.run_test(size=(60, 20)) as pilot:
+            view = app.query_one(RenderedChapter)
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            assert "Bread" in view.render_line(0).text
+            first_key = view._key
+
+            app.theme = "textual-light"
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            assert view._key != first_key
+            assert cache.cached(first_key) is not None
+            assert len(cache._lines) == 2
+
+    asyncio.run(run())
+
+
+def test_clicking_a_link_opens_it() -> None:
+    opened = []
+
+    async def run() -> None:
+        app = Reader(ChapterRenderCache())
+        app.open_url = lambda url, **kwargs: opened.append(url)
+        async with app.run_test(size=(60, 20)) as pilot:
+            view = app.query_one(RenderedChapter)
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            y = next(y for y in range(18) if "mill" in view.render_line(y).text)
+            x = view.render_line(y).text.index("mill")
+            left, top = view.styles.padding.left, view.styles.padding.top
+            await pilot.click(RenderedChapter, offset=(left + x, top + y))
+
+    asyncio.run(run())
+    assert opened == ["https://mill.example/bread"]
+
+
+def test_lines_fit_the_width() -> None:
+    lines = render_chapter(
+        "word " * 100, 30, ChapterStyle("plain", theme=None, code_theme="default")
+    )
+    assert len(lines) > 1
+    assert all(line.cell_length == 30 for line in lines)
+
+
+def test_blocks_render_the_whole_chapter() -> None:
+    sources = split_blocks(LONG_CHAPTER, asyncio.run(parse_markdown(LONG_CHAPTER)))
+    assert len(sources) == 600
+    blocks = ChapterBlocks(sources, 40, PLAIN, keep_lines=10000)
+    for index in range(len(blocks)):
+        blocks.render(index)
+    lines = [blocks.line(y) for y in range(blocks.height)]
+    whole = render_chapter(LONG_CHAPTER, 40, PLAIN)
+    assert [line.text for line in lines if line.text.strip()] == [
+        line.text for line in whole if line.text.strip()
+    ]
+
+    kept = ChapterBlocks(sources, 40, PLAIN, keep_lines=100)
+    for index in range(len(kept)):
+        kept.render(index)
+    assert kept._kept <= 100
+    assert kept.line(0) is None and kept.line(kept.height - 1) is not None
+
+
+def test_long_chapter_renders_blocks_near_the_view() -> None:
+    cache = ChapterRenderCache(virtualize_from=0)
+
+    async def run() -> None:
+        app = Reader(cache, LONG_CHAPTER)
+        async with app.run_test(size=(60, 20)) as pilot:
+            view = app.query_one(RenderedChapter)
+            await rendered(app, pilot)
+            blocks = view._blocks
+            assert blocks is not None and not view._lines
+            assert "Step 0" in view.render_line(0).text
+            assert len(blocks._rendered) < 30
+
+            view.scroll_to(y=blocks.height // 2, animate=False)
+            # blank until the blocks are rendered in a thread
+            assert not any(view.render_line(y).text.strip() for y in range(5))
+            await rendered(app, pilot)
+            assert any(view.render_line(y).text.strip() for y in range(5))
+            for _ in range(60):
+                # the blocks measured above do not move the text on screen
+                shown = [view.render_line(y).text for y in range(5)]
+                view.scroll_to(y=view.scroll_y - 1, animate=False)
+                await rendered(app, pilot)
+                assert [view.render_line(y).text for y in range(1, 6)] == shown
+
+    asyncio.run(run())
+
+
+def test_selected_text_is_copied() -> None:
+    async def run(markdown: str, cache: ChapterRenderCache, word: str) -> list:
+        app = Reader(cache, markdown)
+        async with app.run_test(size=(60, 20)) as pilot:
+            view = app.query_one(RenderedChapter)
+            await rendered(app, pilot)
+            y = next(y for y in range(18) if word in view.render_line(y).text)
+            x = view.render_line(y).text.index(word)
+            before = list(view.render_line(y))
+            selection = Selection(Offset(x, y), Offset(x + 5, y))
+            app.screen.selections = {view: selection}
+            await pilot.pause()
+            return [
+                view.get_selection(selection)[0],
+                before != list(view.render_line(y)),
+                view.get_selection(Selection(None, None))[0],
+            ]
+
+    selected, highlighted, whole = asyncio.run(
+        run(CHAPTER, ChapterRenderCache(), "Flour")
+    )
+    assert selected == "Flour"
+    assert highlighted
+    assert "Bread" in whole and "bake" in whole
+
+    # blocks not rendered yet are copied from their source
+    _, _, whole = asyncio.run(
+        run(LONG_CHAPTER, ChapterRenderCache(virtualize_from=0), "Mix")
+    )
+    assert "Step 0" in whole and "wait 199 minutes" in whole
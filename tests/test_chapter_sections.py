@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import pytest
+
+from nohow.llm.fake import FakeStreamingChatModel
+from nohow.llm.hedging import StreamPolicy, StreamTimeoutError
+from nohow.prompts.chap_gen import (
+    ChapterInputs,
+    astream_chapter_by_sections,
+    ordered_merge,
+    parse_section_plan,
+)
+
+INPUTS = ChapterInputs(
+    book_title="Book",
+    chapter_title="Chapter",
+    book_toc="- Chapter",
+    chapter_length=2000,
+)
+
+
+def _delayed(chunks: list[str], delay: float, running: list[int]):
+    """A stream factory; `running` records how many streams run as it starts."""
+
+    async def stream():
+        running[0] += 1
+        running.append(running[0])
+        try:
+            for chunk in chunks:
+                await asyncio.sleep(delay)
+                yield chunk
+        finally:
+            running[0] -= 1
+
+    return stream
+
+
+async def _collect(stream) -> list[str]:
+    return [chunk async for chunk in stream]
+
+
+def test_ordered_merge_buffers_later_streams() -> None:
+    # the last stream finishes first but is yielded last
+    running = [0]
+    factories = [
+        _delayed(["a1", "a2"], 0.03, running),
+        _delayed(["b1"], 0.02, running),
+        _delayed(["c1", "c2"], 0.0, running),
+    ]
+    result = asyncio.run(_collect(ordered_merge(factories)))
+    assert result == ["a1", "a2", "b1", "c1", "c2"]
+    assert running == [0, 1, 2, 3]  # concurrent, not sequential
+
+    running = [0]
+    factories = [_delayed(["x"], 0.0, running) for _ in range(3)]
+    asyncio.run(_collect(ordered_merge(factories, max_concurrency=2)))
+    assert max(running[1:]) == 2
+
+
+def test_parse_section_plan_skips_malformed() -> None:
+    text = 'Plan:\n[{"title": "Intro", "points": ["why"]}, {"x": 1}, {"title": "End"}]'
+    sections = parse_section_plan(text)
+    assert [s.title for s in sections] == ["Intro", "End"]
+    assert sections[0].points == ("why",)
+
+
+def test_chapter_by_sections_streams_every_section() -> None:
+    outline = json.dumps([{"title": "One"}, {"title": "Two"}, {"title": "Three"}])
+    llm = FakeStreamingChatModel(
+        responses=[outline, "first part", "second part", "third part"],
+        tokens_per_sec=0,
+        ttft=0,
+    )
+    text = "".join(asyncio.run(_collect(astream_chapter_by_sections(llm, INPUTS, 3))))
+    assert text.count("\n\n") == 2
+    assert sorted(text.split("\n\n")) == ["first part", "second part", "third part"]
+
+
+def test_chapter_by_sections_falls_back_to_single_stream() -> None:
+    llm = FakeStreamingChatModel(
+        responses=["not an outline", "whole chapter"], tokens_per_sec=0, ttft=0
+    )
+    text = "".join(asyncio.run(_collect(astream_chapter_by_sections(llm, INPUTS))))
+    assert text == "whole chapter"
+
+
+def test_outline_request_has_a_deadline() -> None:
+    llm = FakeStreamingChatModel(responses=["[]"], tokens_per_sec=0, ttft=10)
+    policy = StreamPolicy(ttft_timeout=0.01, max_hedges=0)
+    with pytest.raises(StreamTimeoutError):
+        asyncio.run(_collect(astream_chapter_by_sections(llm, INPUTS, 3, policy)))
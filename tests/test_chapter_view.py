@@ -0,0 +1,53 @@
+import asyncio
+import json
+import threading
+
+from nohow.db.models import Book
+from nohow.db.utils import get_session
+from nohow.mkdutils import extract_toc_tree
+from nohow.retrieval.sources import SourceLibrary
+from nohow.textual_comp.widgets.chapter_view import ChapterView
+
+from conftest import ReaderApp
+
+
+def test_cancel_while_fetching_sources_keeps_the_chapter(db_url, monkeypatch) -> None:
+    toc = "# Bread\n## Flour\n"
+    fetching = threading.Event()
+    release = threading.Event()
+
+    def slow_material(self, app, book_id, titles) -> str:
+        fetching.set()
+        release.wait(5)
+        return ""
+
+    monkeypatch.setattr(SourceLibrary, "chapter_material", slow_material)
+
+    class Reader(ReaderApp):
+        def compose(self):
+            with get_session(self.get_db()) as session:
+                book = Book(
+                    title="Baking",
+                    toc=toc,
+                    toc_tree=json.dumps(extract_toc_tree(toc).to_json()),
+                )
+                session.add(book)
+                session.commit()
+                session.refresh(book)
+            node = extract_toc_tree(toc).children[0]
+            yield ChapterView(book, node, node.conversation_key(), "Flour and water.")
+
+    async def run() -> None:
+        app = Reader(db_url)
+        async with app.run_test() as pilot:
+            view = app.query_one(ChapterView)
+            view._generation_worker = view.run_worker(view._generate(500))
+            await asyncio.to_thread(fetching.wait, 5)
+            await view.action_cancel_generation()
+            await pilot.pause()
+            release.set()
+            # nothing was generated: the previous chapter is back, unasked
+            assert view.chapter_content == "Flour and water."
+            assert app.screen is app.screen_stack[0]
+
+    asyncio.run(run())
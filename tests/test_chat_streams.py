@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from textual.app import App
+
+from nohow.db.models import create_conversation, load_convo_content
+from nohow.llm.fake import FakeStreamingChatModel
+from nohow.prompts.chat_gen import make_chat_session
+from nohow.textual_comp.widgets.chat_streams import ChatStreams
+
+from conftest import DbApp
+
+
+class BrokenModel(FakeStreamingChatModel):
+    """Fails in the middle of its reply."""
+
+    async def _astream(self, *args, **kwargs):
+        yield ChatGenerationChunk(message=AIMessageChunk(content="Knead"))
+        raise ConnectionError("network down")
+
+
+class Reader(DbApp, App):
+    pass
+
+
+def test_replies_stream_concurrently_up_to_the_limit(db_url, book_id) -> None:
+
+    async def run() -> None:
+        app = Reader(db_url)
+        async with app.run_test():
+            convos = [create_conversation(app, book_id, a) for a in "01"]
+            streams = ChatStreams(app, max_streams=1)
+            seen = []
+            streams.changed.subscribe(
+                app.screen,
+                lambda s: seen.append((s.convo_id, s.status, s in streams)),
+                immediate=True,
+            )
+            llm = FakeStreamingChatModel(text="Knead it.", tokens_per_sec=0, ttft=0)
+            for convo in convos:
+                session = make_chat_session(llm, chapter_content="Flour and water.")
+                streams.start(convo.id, convo.toc_address, session, "How?")
+            await app.workers.wait_for_complete()
+            assert list(streams) == []
+            # the second reply starts when the first one ends
+            assert seen == [
+                (1, "waiting", True),
+                (2, "waiting", True),
+                (1, "replying", True),
+                (1, "replying", False),
+                (2, "replying", True),
+                (2, "replying", False),
+            ]
+
+            for convo in convos:
+                saved = json.loads(load_convo_content(app, convo.id))
+                assert [m["role"] for m in saved] == ["system", "user", "assistant"]
+                assert saved[-1]["content"] == "Knead it."
+
+    asyncio.run(run())
+
+
+def test_a_failed_reply_ends_its_stream(db_url, book_id) -> None:
+
+    async def run() -> None:
+        app = Reader(db_url)
+        async with app.run_test():
+            convo = create_conversation(app, book_id, "0")
+            streams = ChatStreams(app, max_streams=1)
+            ended = []
+
+            async def on_end() -> None:
+                ended.append(convo.id)
+
+            session = make_chat_session(BrokenModel(), chapter_content="Flour.")
+            stream = streams.start(convo.id, convo.toc_address, session, "How?")
+            stream.on_end = on_end
+            await app.workers.wait_for_complete()
+
+            assert app.is_running
+            assert list(streams) == [] and ended == [convo.id]
+            assert stream.reply == "Knead" and not stream.answered
+            # the question without reply is not kept
+            saved = json.loads(load_convo_content(app, convo.id))
+            assert [m["role"] for m in saved] == ["system"]
+            assert len(session.conversation) == 1
+
+    asyncio.run(run())
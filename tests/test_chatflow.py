@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+from langchain.messages import AIMessage, HumanMessage
+from textual.app import App
+
+from nohow.db.models import Book, create_conversation
+from nohow.llm.fake import FakeStreamingChatModel
+from nohow.prompts.chat_gen import make_chat_session
+from nohow.textual_comp.widgets.chatbox import ChatMessage, CollapsedMessage
+from nohow.textual_comp.widgets.chatflow import ChatFlowWidget
+
+from conftest import ReaderApp
+
+
+def _conversation(count: int) -> str:
+    """A saved conversation of `count` messages after the chapter."""
+    session = make_chat_session(FakeStreamingChatModel(), chapter_content="Flour.")
+    for i in range(count):
+        message = HumanMessage if i % 2 == 0 else AIMessage
+        session.conversation.append(message(content=f"Message {i}"))
+    return json.dumps(session.serialize_conversation())
+
+
+class ChatReader(ReaderApp):
+    def __init__(self, db_url: str, book_id: int, content: str) -> None:
+        super().__init__(db_url)
+        self.book_id = book_id
+        self.content = content
+
+    def compose(self):
+        convo = create_conversation(self, self.book_id, "0")
+        book = Book(id=self.book_id, title="Baking", toc="")
+        yield ChatFlowWidget(book, "0", convo.id, self.content)
+
+
+def _shown(app: App) -> list[str]:
+    return [m.message.content for m in app.query(ChatMessage)]
+
+
+def test_long_history_is_built_a_page_at_a_time(db_url, book_id) -> None:
+    async def run() -> None:
+        app = ChatReader(db_url, book_id, _conversation(45))
+        async with app.run_test(size=(80, 40)) as pilot:
+            await pilot.pause()
+            container = app.query_one(ChatFlowWidget).chat_container
+            # the chapter is not built until it is opened
+            system = app.query_one(CollapsedMessage)
+            assert not system.expanded and not system.query(ChatMessage)
+            assert _shown(app) == [f"Message {i}" for i in range(25, 45)]
+
+            # the placeholder just below the chapter, without reaching the top
+            container.scroll_to(y=1, animate=False)
+            await pilot.pause()
+            anchor = app.query(ChatMessage).first()
+            top = anchor.region.y
+            await pilot.click("#older-messages")
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            assert _shown(app) == [f"Message {i}" for i in range(5, 45)]
+            assert anchor.region.y == top
+
+            anchor = app.query(ChatMessage).first()
+            top = anchor.region.y + round(container.scroll_y)  # once at the top
+            container.scroll_home(animate=False)
+            await pilot.pause()
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            assert _shown(app) == [f"Message {i}" for i in range(45)]
+            assert anchor.region.y == top
+            assert not app.query_one("#older-messages").display
+
+    asyncio.run(run())
@@ -68,3 +68,13 @@ Some text here.
     toc_tree = extract_toc_tree(toc_text)
 
     toc_tree.children
+
+
+def test_titles_to_leave_out_the_root() -> None:
+    toc_tree = extract_toc_tree("## Chapter 2\n### Section 2.1\n")
+    section = toc_tree.children[0].children[0]
+
+    titles = toc_tree.titles_to(section.index)
+
+    assert titles == ["Section 2.1", "Chapter 2"]
+    assert toc_tree.title not in titles
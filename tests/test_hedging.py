@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from nohow.llm.hedging import StreamPolicy, StreamTimeoutError, hedged_astream
+
+
+def _collect(factory, policy):
+    async def run():
+        return [item async for item in hedged_astream(factory, policy)]
+
+    return asyncio.run(run())
+
+
+def test_slow_first_request_is_hedged_and_cancelled() -> None:
+    started: list[int] = []
+    closed: list[int] = []
+
+    def factory():
+        attempt = len(started)
+        started.append(attempt)
+
+        async def stream():
+            try:
+                await asyncio.sleep(10 if attempt == 0 else 0)
+                for token in ("a", "b", "c"):
+                    yield f"{attempt}{token}"
+            finally:
+                closed.append(attempt)
+
+        return stream()
+
+    policy = StreamPolicy(ttft_timeout=0.05, max_hedges=1)
+    assert _collect(factory, policy) == ["1a", "1b", "1c"]
+    assert started == [0, 1]
+    assert sorted(closed) == [0, 1]
+
+
+def test_failed_request_is_retried() -> None:
+    calls: list[int] = []
+
+    def factory():
+        calls.append(1)
+
+        async def stream():
+            if len(calls) < 3:
+                raise ConnectionError("boom")
+            yield "ok"
+
+        return stream()
+
+    policy = StreamPolicy(max_retries=2, backoff_base=0.001)
+    assert _collect(factory, policy) == ["ok"]
+    assert len(calls) == 3
+
+    calls.clear()
+    with pytest.raises(ConnectionError):
+        _collect(factory, StreamPolicy(max_retries=1, backoff_base=0.001))
+
+
+def test_deadlines_raise() -> None:
+    def stalled():
+        async def stream():
+            yield "first"
+            await asyncio.sleep(10)
+            yield "never"
+
+        return stream()
+
+    with pytest.raises(StreamTimeoutError):
+        _collect(stalled, StreamPolicy(inter_token_timeout=0.05))
+
+    def silent():
+        async def stream():
+            await asyncio.sleep(10)
+            yield "never"
+
+        return stream()
+
+    with pytest.raises(StreamTimeoutError):
+        _collect(silent, StreamPolicy(ttft_timeout=0.02, max_hedges=1))
+
+
+def test_policy_from_config_ignores_unknown_keys() -> None:
+    policy = StreamPolicy.from_config({"ttft_timeout": 5, "other": 1})
+    assert policy.ttft_timeout == 5
+    assert StreamPolicy().backoff(10) <= StreamPolicy().backoff_max
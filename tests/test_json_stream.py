@@ -0,0 +1,41 @@
+import json
+
+from nohow.prompts.json_stream import JsonArrayStreamParser
+from nohow.prompts.mcq import gen_mcqs_from_chain_result
+
+ITEMS = [
+    {"question": "What is {x} in \"quotes\" ]?", "choices": ["a", "b"], "correct_answers": [0]},
+    {"question": "Nested [1, {2}]", "choices": ["c", "d", "e"], "correct_answers": [1, 2]},
+]
+
+
+def test_objects_are_emitted_as_soon_as_they_close() -> None:
+    text = json.dumps(ITEMS)
+    parser = JsonArrayStreamParser()
+    emitted = []
+    first_item_end = text.index("}, {") + 1
+    for pos, ch in enumerate(text):
+        for item in parser.feed(ch):
+            emitted.append((pos, item))
+    assert [item for _, item in emitted] == ITEMS
+    assert emitted[0][0] == first_item_end - 1
+    assert parser.done
+
+
+def test_stray_text_wrappers_and_truncated_tail() -> None:
+    text = "Sure! Here you go:\n```json\n" + json.dumps({"items": ITEMS}) + "\n```"
+    assert JsonArrayStreamParser().feed(text) == ITEMS
+
+    truncated = json.dumps(ITEMS)[:-20]
+    assert JsonArrayStreamParser().feed(truncated) == ITEMS[:1]
+
+    parser = JsonArrayStreamParser()
+    assert parser.feed('[{"question": oops}, ' + json.dumps(ITEMS[1]) + "]") == ITEMS[1:]
+    assert parser.skipped == 1
+
+
+def test_chain_result_keeps_valid_items() -> None:
+    invalid = {"question": "no choices", "choices": ["only one"], "correct_answers": [0]}
+    text = json.dumps([ITEMS[0], invalid, ITEMS[1]])[:-5]
+    mcqs = gen_mcqs_from_chain_result(text)
+    assert [m.question for m in mcqs] == [ITEMS[0]["question"]]
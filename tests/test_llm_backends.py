@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from nohow.llm.backends import LLMSpec, available_backends, create_llm
+from nohow.llm.fake import FakeStreamingChatModel
+
+
+def test_fake_backend_streams_configured_text() -> None:
+    llm = create_llm(
+        LLMSpec(
+            backend="fake",
+            model_name="fake-small",
+            options={"text": "one two three", "tokens_per_sec": 0, "ttft": 0},
+        )
+    )
+    assert isinstance(llm, FakeStreamingChatModel)
+
+    async def collect() -> list[str]:
+        return [str(c.content) async for c in llm.astream("hello")]
+
+    chunks = asyncio.run(collect())
+    assert "".join(chunks) == "one two three"
+    assert chunks[:3] == ["one", " two", " three"]
+
+
+def test_fake_backend_cycles_responses() -> None:
+    llm = FakeStreamingChatModel(responses=["a", "b"], tokens_per_sec=0, ttft=0)
+    assert [llm.invoke("x").content for _ in range(3)] == ["a", "b", "a"]
+
+
+def test_unknown_backend() -> None:
+    assert {"openai", "fake"} <= set(available_backends())
+    with pytest.raises(ValueError):
+        create_llm(LLMSpec(backend="nope"))
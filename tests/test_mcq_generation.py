@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import pytest
+
+from nohow.llm.fake import FakeStreamingChatModel
+from nohow.prompts.dedup import MinHasher, NearDuplicateFilter
+from nohow.prompts.mcq import agenerate_mcqs_from_chapter, generate_mcqs_from_chapter
+
+
+def _mcq(question: str) -> dict:
+    return {"question": question, "choices": ["yes", "no"], "correct_answers": [0]}
+
+
+def test_near_duplicate_questions_are_filtered() -> None:
+    dedup = NearDuplicateFilter(threshold=0.6)
+    assert dedup.add("What is one advantage of using list comprehensions?")
+    assert not dedup.add("What is an advantage of using list comprehensions ?")
+    assert dedup.add("When should a generator expression be preferred?")
+    assert len(dedup) == 2
+
+    hasher = MinHasher()
+    same = hasher.signature("Same text here")
+    assert hasher.similarity(same, hasher.signature("same text, here!")) == 1.0
+
+
+class _CountingModel(FakeStreamingChatModel):
+    """Fake model recording how many requests stream at the same time."""
+
+    running: int = 0
+    concurrency: list = []
+
+    async def _astream(self, *args, **kwargs):
+        self.running += 1
+        self.concurrency.append(self.running)
+        try:
+            async for chunk in super()._astream(*args, **kwargs):
+                yield chunk
+        finally:
+            self.running -= 1
+
+
+def test_batches_run_concurrently_and_top_up_shortfall() -> None:
+    batch_a = json.dumps([_mcq("What does a list comprehension build?"), _mcq("Why use generators for large data?")])
+    # second batch repeats a question of the first one: only the new one is kept
+    batch_b = json.dumps([_mcq("What does a list comprehension build ?"), _mcq("How are nested comprehensions read?")])
+    batch_c = json.dumps([_mcq("When is an explicit loop clearer than a comprehension?"), _mcq("What is late binding in lambdas?")])
+    llm = _CountingModel(
+        responses=[batch_a, batch_b, batch_c], tokens_per_sec=0, ttft=0.05
+    )
+
+    mcqs = asyncio.run(
+        agenerate_mcqs_from_chapter(llm, "chapter", total_count=4, generate_by=2)
+    )
+
+    assert sorted(m.question for m in mcqs) == sorted([
+        "What does a list comprehension build?",
+        "Why use generators for large data?",
+        "How are nested comprehensions read?",
+        "When is an explicit loop clearer than a comprehension?",
+    ])
+    # two concurrent batches, then one top-up round: two round trips, not three
+    assert llm.concurrency == [1, 2, 1]
+
+
+def test_blocking_wrapper_refuses_a_running_loop() -> None:
+    llm = FakeStreamingChatModel(responses=["[]"], tokens_per_sec=0, ttft=0)
+
+    async def call_from_loop() -> None:
+        generate_mcqs_from_chapter(llm, "chapter", total_count=2)
+
+    with pytest.raises(RuntimeError, match="agenerate_mcqs_from_chapter"):
+        asyncio.run(call_from_loop())
@@ -0,0 +1,24 @@
+import asyncio
+
+from nohow.textual_comp.widgets.md_render import TokenCache, parse_markdown
+
+DOCUMENT = "\n\n".join(f"## Part {i}\n\nSome *text* for part {i}." for i in range(60))
+
+
+def test_token_cache_evicts_the_least_recently_used() -> None:
+    cache = TokenCache(capacity=2)
+    cache.put("a", [])
+    cache.put("b", [])
+    assert cache.get("a") == []
+    cache.put("c", [])
+    assert cache.get("b") is None
+    assert cache.get("a") == [] and cache.get("c") == []
+
+
+def test_parsed_documents_are_cached_by_content() -> None:
+    async def parse_twice() -> bool:
+        first = await parse_markdown(DOCUMENT)
+        return first is await parse_markdown(DOCUMENT)
+
+    assert asyncio.run(parse_twice())
+
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from langchain.messages import AIMessage
+from textual.app import App
+
+from nohow.textual_comp.widgets.chatbox import ChatMessage
+from nohow.textual_comp.widgets.md_stream import MarkdownStreamRenderer
+
+
+class SlowMarkdown:
+    """Stands in for the Markdown widget, with a fixed render cost."""
+
+    def __init__(self, cost: float) -> None:
+        self.cost = cost
+        self.appends: list = []
+
+    async def append(self, text: str) -> None:
+        time.sleep(self.cost)
+        self.appends.append(text)
+
+
+def test_chunks_are_coalesced_and_interval_adapts() -> None:
+    markdown = SlowMarkdown(cost=0.02)
+    renderer = MarkdownStreamRenderer(markdown, frame_interval=0.01)
+
+    async def stream() -> None:
+        for i in range(100):
+            renderer.write(f"{i} ")
+            await asyncio.sleep(0.001)
+        await renderer.close()
+
+    asyncio.run(stream())
+    assert "".join(markdown.appends) == "".join(f"{i} " for i in range(100))
+    assert len(markdown.appends) < 20
+    # rendering costs 20 ms, so appends are spaced by about 4 x 20 ms
+    assert 0.06 < renderer.interval <= renderer.max_interval
+
+
+def test_unmounted_message_stops_its_renderer() -> None:
+    class Chat(App):
+        def compose(self):
+            yield ChatMessage(message=AIMessage(content=""), model_name="fake")
+
+    async def run() -> None:
+        app = Chat()
+        async with app.run_test() as pilot:
+            chatbox = app.query_one(ChatMessage)
+            await chatbox.feed_chunk("Flour ")
+            task = chatbox._renderer._task
+            await chatbox.remove()
+            await pilot.pause()
+            assert task.cancelled()
+            assert chatbox._renderer is None
+
+    asyncio.run(run())
@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+from nohow.db.models import Book
+from nohow.mkdutils import extract_toc_tree
+from nohow.textual_comp.widgets.chatflow import ChatList
+from nohow.textual_comp.widgets.navigator import NavigatorRows, NavigatorView
+
+from conftest import ReaderApp
+
+TOC = """# Bread
+## Flour
+## Water
+# Pastry
+"""
+
+
+def labels(rows: NavigatorRows) -> list:
+    return [(r.toc_index, r.chat_id) for r in rows]
+
+
+def test_rows_group_conversations_under_their_node() -> None:
+    rows = NavigatorRows.from_toc(
+        extract_toc_tree(TOC), [("0.1", "7"), ("1", "3"), ("0.1", "9")]
+    )
+    assert labels(rows) == [
+        ("0", ""),  # synthetic root
+        ("0", ""),
+        ("0.0", ""),
+        ("0.1", ""),
+        ("0.1", "7"),
+        ("0.1", "9"),
+        ("1", ""),
+        ("1", "3"),
+    ]
+    assert [rows[i] for i in range(len(rows))] == list(rows)
+    assert rows.index_of("0.1", "9") == 5
+    assert rows.index_of("1") == 6
+    assert rows.index_of("2") == -1
+
+
+def test_incremental_updates_keep_the_index_consistent() -> None:
+    rows = NavigatorRows.from_toc(extract_toc_tree(TOC))
+    assert rows.add_conversation("0.0", "1") == 3
+    assert rows.add_conversation("0.0", "2") == 4
+    assert rows.add_conversation("1", "5") == 7
+    assert [(rows[i].toc_index, rows[i].chat_id) for i in range(len(rows))] == labels(
+        rows
+    )
+    assert rows.index_of("0.1") == 5
+    assert rows.index_of("1", "5") == 7
+
+
+def test_conversation_status_shows_in_its_label() -> None:
+    rows = NavigatorRows.from_toc(extract_toc_tree(TOC), [("0.1", "7")])
+    index = rows.set_status("0.1", "7", "replying")
+    assert index == 4 and rows[index].label == "[7] ... (replying)"
+    assert rows.set_status("0.1", "", "replying") == -1
+    rows.set_status("0.1", "7", "")
+    assert rows[index].label == "[7] ..."
+
+
+class NavigatorApp(ReaderApp):
+    def __init__(self, db_url: str) -> None:
+        super().__init__(db_url)
+        self.opened: list = []
+
+    def compose(self):
+        yield ChatList()
+
+    def on_chat_list_chat_opened(self, event: ChatList.ChatOpened) -> None:
+        self.opened.append((event.item.toc_index, event.item.chat_id))
+
+
+def test_navigator_opens_the_highlighted_row(db_url) -> None:
+    async def run() -> None:
+        app = NavigatorApp(db_url)
+        async with app.run_test(size=(60, 20)) as pilot:
+            chat_list = app.query_one(ChatList)
+            chat_list.current_book = Book(
+                title="Baking",
+                toc=TOC,
+                toc_tree=json.dumps(extract_toc_tree(TOC).to_json()),
+            )
+            chat_list.all_convo = [(7, "0.0")]
+            chat_list.load_conversation_list_items()
+            navigator = app.query_one(NavigatorView)
+            navigator.focus()
+            await pilot.pause()
+            assert navigator.cursor == 0
+            assert "ROOT" in navigator.render_line(0).text
+            assert "Bread" in navigator.render_line(1).text
+
+            flour = navigator.rows.index_of("0.0")
+            navigator.cursor = flour
+            await pilot.press("down")
+            assert navigator.cursor == flour + 1
+            assert navigator.highlighted.chat_id == "7"
+            await pilot.press("end")
+            assert navigator.highlighted.toc_title == "Pastry"
+            await pilot.click(NavigatorView, offset=(2, flour))
+            await pilot.pause()
+            assert navigator.cursor == flour
+
+        # every highlighted row is opened, in order
+        assert app.opened == [
+            ("0", ""),
+            ("0.0", ""),
+            ("0.0", "7"),
+            ("1", ""),
+            ("0.0", ""),
+        ]
+
+    asyncio.run(run())
@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+from langchain.messages import AIMessage, HumanMessage
+from textual.widgets import ContentSwitcher
+
+from nohow.db.models import Book, create_conversation, update_convo_content
+from nohow.db.utils import get_session
+from nohow.llm.fake import FakeStreamingChatModel
+from nohow.mkdutils import extract_toc_tree
+from nohow.prompts.chat_gen import make_chat_session
+from nohow.textual_comp.screens.tocreader import TOCReaderScreen
+from nohow.textual_comp.widgets.chatflow import ChatFlowWidget
+from nohow.textual_comp.widgets.navigator import NavigatorView
+from nohow.textual_comp.widgets.panes import PaneLRU
+
+from conftest import ReaderApp
+
+
+def test_lru_evicts_least_recently_viewed_idle_panes() -> None:
+    panes = PaneLRU(capacity=2)
+    for pane_id in ("a", "b", "c"):
+        panes.touch(pane_id)
+    panes.touch("a")  # order is now b, c, a
+    assert panes.to_evict(lambda pane_id: False) == ["b"]
+    assert "b" not in panes and len(panes) == 2
+
+    panes.touch("d")  # c, a, d: c is streaming, so a goes
+    assert panes.to_evict(lambda pane_id: pane_id == "c") == ["a"]
+
+    # over capacity but everything else is busy: the current pane stays
+    panes.touch("e")
+    assert panes.to_evict(lambda pane_id: pane_id != "e") == []
+    assert len(panes) == 3
+
+
+def _saved_conversation(count: int) -> str:
+    session = make_chat_session(FakeStreamingChatModel(), chapter_content="Flour.")
+    for i in range(count):
+        message = HumanMessage if i % 2 == 0 else AIMessage
+        session.conversation.append(message(content=f"Message {i}\n\n" * 3))
+    return json.dumps(session.serialize_conversation())
+
+
+def test_reader_unmounts_idle_panes_and_restores_them(db_url) -> None:
+    toc = "# Bread\n## Flour\n"
+
+    async def run() -> None:
+        app = ReaderApp(db_url, reader={"live_panes": 2})
+        async with app.run_test(size=(100, 30)) as pilot:
+            with get_session(app.get_db()) as session:
+                book = Book(
+                    title="Baking",
+                    toc=toc,
+                    toc_tree=json.dumps(extract_toc_tree(toc).to_json()),
+                )
+                session.add(book)
+                session.commit()
+                book_id = book.id
+            convos = [create_conversation(app, book_id, "0") for _ in range(4)]
+            for convo in convos:
+                update_convo_content(app, convo.id, _saved_conversation(12))
+            screen = TOCReaderScreen(book_id)
+            await app.push_screen(screen)
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            navigator = screen.query_one(NavigatorView)
+            switcher = screen.query_one(ContentSwitcher)
+
+            async def open_convo(convo) -> ChatFlowWidget:
+                navigator.cursor = navigator.rows.index_of("0", str(convo.id))
+                await pilot.pause()
+                return switcher.get_child_by_id(switcher.current)
+
+            def mounted() -> list[int]:
+                return [pane.convo_id for pane in switcher.query(ChatFlowWidget)]
+
+            first = await open_convo(convos[0])
+            await pilot.pause()
+            first.input_area.text = "unsent question"
+            first.chat_container.scroll_to(y=5, animate=False)
+            await pilot.pause()
+
+            second = await open_convo(convos[1])
+            busy = asyncio.Event()
+            second.run_worker(busy.wait())  # as while a reply is loaded
+            await open_convo(convos[2])
+            assert mounted() == [convos[1].id, convos[2].id]
+
+            await open_convo(convos[3])
+            # the busy pane stays; the idle one viewed before is unmounted
+            assert mounted() == [convos[1].id, convos[3].id]
+            busy.set()
+
+            reopened = await open_convo(convos[0])
+            assert reopened is not first
+            await app.workers.wait_for_complete()
+            await pilot.pause()
+            assert reopened.input_area.text == "unsent question"
+            assert reopened.chat_container.scroll_y == 5
+
+    asyncio.run(run())
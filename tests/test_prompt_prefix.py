@@ -0,0 +1,53 @@
+import os
+
+from nohow.llm.usage import PromptCacheStats, extract_token_usage
+from nohow.prompts.chap_gen import ChapterInputs, build_prompt
+from nohow.prompts.chat_gen import DEFAULT_SYSTEM_TEMPLATE
+
+
+def _render(inputs: ChapterInputs) -> str:
+    messages = build_prompt().format_messages(**inputs.to_dict())
+    return "\n".join(str(m.content) for m in messages)
+
+
+def test_chapter_prompts_share_book_prefix() -> None:
+    outline = "# Book\n## A\n### A.1\n## B\n### B.1\n"
+    first = _render(
+        ChapterInputs("Book", "A.1", "### A.1", 500, book_outline=outline)
+    )
+    second = _render(
+        ChapterInputs("Book", "B.1", "### B.1", 1000, book_outline=outline)
+    )
+
+    common = os.path.commonprefix([first, second])
+    assert outline in common
+    assert "A.1" not in common.replace(outline, "")
+
+
+def test_chat_system_template_puts_chapter_last() -> None:
+    rendered = DEFAULT_SYSTEM_TEMPLATE.format(chapter_content="CHAPTER")
+    assert rendered.rstrip().endswith("CHAPTER")
+
+
+def test_extract_token_usage_formats() -> None:
+    assert extract_token_usage(
+        {
+            "input_tokens": 1200,
+            "output_tokens": 30,
+            "input_token_details": {"cache_read": 1024},
+        }
+    ) == (1200, 30, 1024)
+    assert extract_token_usage(
+        {
+            "prompt_tokens": 10,
+            "completion_tokens": 3,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+    ) == (10, 3, 0)
+    assert extract_token_usage(None) == (0, 0, 0)
+
+    stats = PromptCacheStats()
+    stats.record(1200, 1024)
+    stats.record(800, 0)
+    assert stats.requests == 2 and stats.requests_with_hits == 1
+    assert abs(stats.hit_ratio - 1024 / 2000) < 1e-9
@@ -0,0 +1,19 @@
+from nohow.db.models import add_quiz_item, load_quiz_pool, record_quiz_answers
+from nohow.retrieval.index import content_hash
+
+
+def test_pool_is_dropped_when_the_chapter_changes(db_app, book_id) -> None:
+    first = content_hash("Bread is flour and water.")
+    asked = add_quiz_item(db_app, book_id, "0", first, '{"question": "a"}')
+    add_quiz_item(db_app, book_id, "0", first, '{"question": "b"}')
+    add_quiz_item(db_app, book_id, "1", first, '{"question": "other chapter"}')
+    record_quiz_answers(db_app, [(asked.id, [0], True)])
+
+    pool = load_quiz_pool(db_app, book_id, "0", first)
+    assert [item.content for item in pool] == ['{"question": "b"}', '{"question": "a"}']
+
+    # the chapter was generated again: its questions are about text gone
+    regenerated = content_hash("Bread is a dough, baked.")
+    assert load_quiz_pool(db_app, book_id, "0", regenerated) == []
+    assert load_quiz_pool(db_app, book_id, "0", first) == []
+    assert len(load_quiz_pool(db_app, book_id, "1", first)) == 1
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from nohow.llm.backends import LLMSpec, create_llm
+from nohow.llm.fake import FakeStreamingChatModel
+from nohow.llm.replay import ReplayChatModel, StreamRecorder, load_recordings
+from nohow.llm.telemetry import request_config
+
+
+async def _stream(llm, prompt: str) -> list[str]:
+    return [
+        str(c.content)
+        async for c in llm.astream(prompt, config=request_config("chat"))
+        if c.content
+    ]
+
+
+def test_record_then_replay(tmp_path) -> None:
+    path = tmp_path / "session.jsonl"
+    llm = FakeStreamingChatModel(
+        responses=["one two three", "four five"],
+        tokens_per_sec=200,
+        ttft=0.05,
+        callbacks=[StreamRecorder(path)],
+    )
+    recorded = [asyncio.run(_stream(llm, p)) for p in ("first", "second")]
+
+    recordings = load_recordings(path)
+    assert [r.request_kind for r in recordings] == ["chat", "chat"]
+    assert [r.text for r in recordings] == ["one two three", "four five"]
+    assert recordings[0].chunks[0][0] >= 0.05  # ttft kept as first delay
+
+    replay = create_llm(
+        LLMSpec(backend="replay", options={"path": str(path), "timing": "none"})
+    )
+    assert isinstance(replay, ReplayChatModel)
+    # matched by request messages, not by order
+    assert asyncio.run(_stream(replay, "second")) == recorded[1]
+    assert asyncio.run(_stream(replay, "first")) == recorded[0]
+    assert replay.invoke("first").content == "one two three"
+
+
+def test_replay_strict_and_timing(tmp_path) -> None:
+    path = tmp_path / "session.jsonl"
+    llm = FakeStreamingChatModel(
+        text="a b", tokens_per_sec=0, ttft=0.2, callbacks=[StreamRecorder(path)]
+    )
+    asyncio.run(_stream(llm, "known"))
+
+    replay = ReplayChatModel(path=str(path), timing="scaled", speed=10)
+    assert replay._delay(0.2) == pytest.approx(0.02)
+    assert ReplayChatModel(path=str(path))._delay(0.2) == 0.2
+    # unknown requests fall back to file order, unless strict
+    assert asyncio.run(_stream(replay, "unknown")) == ["a", " b"]
+    strict = ReplayChatModel(path=str(path), timing="none", strict=True)
+    with pytest.raises(KeyError):
+        asyncio.run(_stream(strict, "unknown"))
+    with pytest.raises(ValueError):
+        ReplayChatModel(path=str(path), timing="later")
@@ -0,0 +1,70 @@
+import asyncio
+
+import numpy as np
+from langchain.messages import HumanMessage, SystemMessage
+
+from nohow.db.models import save_chapter_content
+from nohow.llm.fake import FakeStreamingChatModel
+from nohow.prompts.chat_gen import ChatSession
+from nohow.retrieval.embedding import HashingEmbedder
+from nohow.retrieval.index import BookIndex, chunk_text
+from nohow.retrieval.service import ChapterRetrieval, RetrievalConfig
+
+
+def test_chunk_text_respects_size() -> None:
+    text = "\n\n".join(" ".join(f"w{p}_{i}" for i in range(30)) for p in range(10))
+    chunks = chunk_text(text, max_words=100, overlap=10)
+    assert all(len(c.split()) <= 100 for c in chunks)
+    assert " ".join(chunks).split() == text.split()
+    long = " ".join(str(i) for i in range(250))
+    assert len(chunk_text(long, max_words=100, overlap=20)) == 3
+
+
+def test_book_index_top_k_and_update() -> None:
+    embedder = HashingEmbedder(dim=256)
+    index = BookIndex()
+    texts = ["bread dough yeast flour", "knife sharpening stone", "yeast proofing"]
+    index.update_chapter("1", texts[:2], embedder.embed_array(texts[:2]))
+    index.update_chapter("2", texts[2:], embedder.embed_array(texts[2:]))
+    query = embedder.embed_array(["how does yeast work in dough"])[0]
+    hits = index.search(query, k=2)
+    assert [h.toc_address for h in hits] == ["1", "2"]
+    assert hits[0].score >= hits[1].score
+    assert [h.toc_address for h in index.search(query, k=2, exclude_address="1")] == [
+        "2"
+    ]
+    index.update_chapter("1", [], np.zeros((0, 256), dtype=np.float32))
+    assert len(index) == 1
+
+
+def test_retrieval_is_persisted_and_incremental(db_app, book_id) -> None:
+    app = db_app
+    config = RetrievalConfig(top_k=2, min_score=0.0)
+    save_chapter_content(app, book_id, "1", "Sourdough needs a starter of wild yeast.")
+    retrieval = ChapterRetrieval(config)
+    # saved before the index existed: indexed on first use
+    assert retrieval.retrieve(app, book_id, "wild yeast starter")[0].toc_address == "1"
+
+    retrieval.index_chapter(app, book_id, "2", "Sharpen a knife on a whetstone.")
+    # a fresh instance loads the vectors back from the database
+    reloaded = ChapterRetrieval(config)
+    hits = reloaded.retrieve(app, book_id, "whetstone knife", exclude_address="1")
+    assert [h.toc_address for h in hits] == ["2"]
+
+
+def test_chat_session_injects_retrieved_passages() -> None:
+    class Hit:
+        toc_address = "2.1"
+        text = "Knives are sharpened on stones."
+
+    session = ChatSession(
+        llm=FakeStreamingChatModel(tokens_per_sec=0, ttft=0),
+        conversation=[SystemMessage(content="chapter")],
+        retriever=lambda question: [Hit()],
+    )
+    session.append_user("How do I sharpen?")
+    messages = asyncio.run(session.request_messages())
+    assert "[2.1] Knives are sharpened on stones." in messages[-1].content
+    assert messages[-1].content.rstrip().endswith("How do I sharpen?")
+    # the conversation itself keeps the plain question
+    assert session.conversation[-1] == HumanMessage(content="How do I sharpen?")
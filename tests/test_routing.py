@@ -0,0 +1,47 @@
+import pytest
+
+from nohow.llm.backends import LLMSpec
+from nohow.llm.routing import LLMRouter, parse_routes
+
+
+def test_routes_override_default_and_share_clients() -> None:
+    router = LLMRouter(
+        LLMSpec(backend="fake", model_name="strong", options={"ttft": 0}),
+        routes={
+            "mcq": {"model": "cheap", "temperature": 0.2, "max_tokens": 500},
+            "summary": {"model_name": "cheap", "temperature": 0.2, "max_tokens": 500},
+            "chat": {"options": {"tokens_per_sec": 0}},
+        },
+    )
+    mcq = router.spec_for("mcq")
+    assert (mcq.model_name, mcq.temperature, mcq.max_tokens) == ("cheap", 0.2, 500)
+    assert router.spec_for("chapter") == router.default
+    assert router.spec_for("chat").options == {"ttft": 0, "tokens_per_sec": 0}
+
+    assert router.llm_for("mcq") is router.llm_for("summary")
+    assert router.llm_for("chapter") is router.default_llm
+    assert router.llm_for("mcq") is not router.llm_for("chapter")
+    assert router.llm_for("mcq").model_name == "cheap"
+
+
+def test_invalid_routes() -> None:
+    with pytest.raises(ValueError):
+        parse_routes({"poetry": {"model_name": "x"}})
+    with pytest.raises(ValueError):
+        parse_routes({"chat": {"temprature": 0.1}})
+
+
+def test_invalid_routes_fall_back_to_default() -> None:
+    router = LLMRouter(
+        LLMSpec(backend="fake", model_name="strong"),
+        routes={
+            "poetry": {"model_name": "x"},
+            "chat": {"temprature": 0.1},
+            "summary": "cheap",
+            "mcq": {"model_name": "cheap"},
+        },
+    )
+    assert len(router.errors) == 3
+    assert router.spec_for("chat") == router.default
+    assert router.spec_for("summary") == router.default
+    assert router.spec_for("mcq").model_name == "cheap"
@@ -0,0 +1,97 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from nohow.db.models import delete_source_document, list_source_documents
+from nohow.main import AppContext
+from nohow.prompts.chap_gen import ChapterInputs, build_prompt
+from nohow.retrieval.bm25 import iter_passages, tokenize, weighted_query
+from nohow.retrieval.sources import SourceLibrary, SourcesConfig
+
+
+SOURCE = """Sourdough bread relies on a starter, a culture of wild yeast.
+
+Feed the starter with flour and water every day to keep the yeast active.
+
+Knives should be sharpened on a whetstone at a constant angle.
+
+Croissant dough is laminated: butter is folded into the dough many times.
+"""
+
+
+def test_iter_passages_streams_paragraph_groups(tmp_path) -> None:
+    path = tmp_path / "src.md"
+    path.write_text(SOURCE)
+    assert len(list(iter_passages(path, max_words=1))) == 4
+    assert len(list(iter_passages(path, max_words=1000))) == 1
+    assert tokenize("The Art of the Starter") == ["art", "starter"]
+    assert weighted_query(["Starter", "Bread basics"]) == {
+        "starter": 1.0,
+        "bread": 0.5,
+        "basics": 0.5,
+    }
+
+
+def test_library_ranks_and_reindexes_incrementally(tmp_path, db_app, book_id) -> None:
+    app = db_app
+    path = tmp_path / "src.md"
+    path.write_text(SOURCE)
+    library = SourceLibrary(SourcesConfig(passage_words=1, top_k=2))
+
+    document = library.attach(app, book_id, path)
+    assert document.passage_count == 4
+    hits = library.search(app, book_id, weighted_query(["How to feed a starter"]), 2)
+    assert "Feed the starter" in hits[0].text
+    assert hits[0].document == "src.md"
+
+    assert library.sync(app, book_id) == 0  # unchanged on disk
+    path.write_text(SOURCE + "\nRye flour ferments faster than wheat flour.\n")
+    os.utime(path, (1, 1))
+    assert library.sync(app, book_id) == 1
+    assert list_source_documents(app, book_id)[0].passage_count == 5
+    assert library.search(app, book_id, {"rye": 1.0}, 2)[0].text.startswith("Rye")
+
+    delete_source_document(app, document.id)
+    assert library.search(app, book_id, {"rye": 1.0}, 2) == []
+
+
+def test_documents_attached_concurrently_get_distinct_passages(tmp_path, db_app, book_id) -> None:
+    app = db_app
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"src{i}.md"
+        path.write_text(SOURCE * 20)
+        paths.append(path)
+    # as the SourcesWidget workers do: each one reads the app's library
+    context = AppContext()
+    context.sources = {"passage_words": 1}
+
+    libraries = []
+
+    def attach(path):
+        libraries.append(context.source_library)
+        return libraries[-1].attach(app, book_id, path)
+
+    with ThreadPoolExecutor(len(paths)) as pool:
+        documents = list(pool.map(attach, paths))
+    library = context.source_library
+    assert all(other is library for other in libraries)  # one lock for all
+
+    assert [d.passage_count for d in documents] == [80] * 4
+    assert len(library.search(app, book_id, {"starter": 1.0}, 1000)) == 4 * 40
+
+
+def test_chapter_material_respects_budget(tmp_path, db_app, book_id) -> None:
+    app = db_app
+    path = tmp_path / "src.md"
+    path.write_text(SOURCE)
+    library = SourceLibrary(SourcesConfig(passage_words=1, token_budget=30))
+    library.attach(app, book_id, path)
+
+    material = library.chapter_material(app, book_id, ["Yeast starter", "Bread"])
+    assert material.count("[src.md]") == 1  # a second passage would not fit
+
+    inputs = ChapterInputs(
+        "Book", "Starter", "- Starter", 500, source_passages=material
+    )
+    prompt = build_prompt().format_messages(**inputs.to_dict())[-1].content
+    assert prompt.rstrip().endswith(material.splitlines()[-1])
@@ -0,0 +1,39 @@
+import asyncio
+import json
+
+from nohow.llm.fake import FakeStreamingChatModel
+from nohow.prompts.summary import (
+    ChapterSummaryGen,
+    asummarize_chapter,
+    format_chapter_summaries,
+    parse_summary,
+)
+
+
+def test_parse_summary_formats() -> None:
+    reply = (
+        '```json\n[{"summary": "About yeast.", "key_terms": ["yeast", "dough"]}]\n```'
+    )
+    assert parse_summary(reply) == ChapterSummaryGen(
+        summary="About yeast.", key_terms=["yeast", "dough"]
+    )
+    assert parse_summary('{"summary": "Bare object."}').summary == "Bare object."
+    fenced = '```json\n{"summary": "Fenced object.", "key_terms": ["crumb"]}\n```'
+    assert parse_summary(fenced) == ChapterSummaryGen(
+        summary="Fenced object.", key_terms=["crumb"]
+    )
+    assert parse_summary("Just prose.") == ChapterSummaryGen(summary="Just prose.")
+    assert parse_summary("  ") is None
+
+
+def test_summarize_chapter_with_cheap_model() -> None:
+    llm = FakeStreamingChatModel(
+        text=json.dumps([{"summary": "Starters.", "key_terms": ["starter"]}]),
+        tokens_per_sec=0,
+        ttft=0,
+    )
+    summary = asyncio.run(asummarize_chapter(llm, "Baking", "Starters", "..."))
+    assert summary == ChapterSummaryGen(summary="Starters.", key_terms=["starter"])
+
+    context = format_chapter_summaries({"1.1": summary}, ["1", "1.1"])
+    assert context == "[1.1] Starters. (key terms: starter)"
@@ -0,0 +1,53 @@
+import asyncio
+
+from nohow.llm.fake import FakeStreamingChatModel
+from nohow.llm.telemetry import (
+    ModelPrice,
+    TelemetryCallback,
+    percentile,
+    request_config,
+    summarize,
+)
+
+
+def test_percentile_nearest_rank() -> None:
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([3.0], 90) == 3.0
+    assert percentile([], 50) is None
+
+
+def test_callback_records_streamed_call() -> None:
+    records = []
+    telemetry = TelemetryCallback(
+        sink=records.append,
+        prices={"fake-small": ModelPrice(input=1.0, output=2.0)},
+    )
+    llm = FakeStreamingChatModel(
+        model_name="fake-small",
+        text="one two three",
+        tokens_per_sec=0,
+        ttft=0,
+        callbacks=[telemetry],
+    )
+
+    async def run() -> None:
+        async for _ in llm.astream("hello", config=request_config("chat")):
+            pass
+
+    asyncio.run(run())
+    assert len(records) == 1
+    record = records[0]
+    assert record.request_kind == "chat"
+    assert record.model == "fake-small"
+    assert record.status == "ok"
+    assert record.chunk_count == 3
+    assert record.ttft is not None and record.ttft <= record.duration
+    assert record.completion_tokens > 0
+    assert record.cost is not None and record.cost > 0
+
+    (summary,) = summarize(records, lambda r: r.request_kind)
+    assert summary.group == "chat"
+    assert summary.count == 1
+    assert summary.errors == 0